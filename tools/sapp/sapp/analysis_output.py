@@ -10,6 +10,7 @@ import os
 from glob import glob
 from typing import IO, Any, Dict, Iterable, NamedTuple, Optional
 
+from .compressed_files import open_file
 from .sharded_files import ShardedFile
 
 
@@ -147,7 +148,7 @@ class AnalysisOutput(object):
             self.file_handle = None
         else:
             for name in self.file_names():
-                with open(name, "r") as f:
+                with open_file(name) as f:
                     yield f
 
     def file_names(self) -> Iterable[str]:
@@ -8,32 +8,46 @@
 import logging
 import os
 import pprint
+from array import array
 from collections import defaultdict
+from contextlib import nullcontext
 from enum import Enum
-from typing import Any, Dict, Iterable, List, NamedTuple, Set, TextIO, Tuple
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Container,
+    ContextManager,
+    Dict,
+    Iterable,
+    NamedTuple,
+    Set,
+    TextIO,
+    Tuple,
+    Union,
+)
 
 import xxhash
 
+from . import profiler
 from .analysis_output import AnalysisOutput, Metadata
+from .condition_store import Conditions, ConditionStore, count_entries
+from .handle_store import HandleStore
+from .linemap import Linemap
 from .pipeline import DictEntries, InputFiles, Optional, PipelineStep, Summary
 
 
-# if these imports have the same name we get a linter error
-try:
-    import ujson as json
-except ImportError:
-    import json  # noqa
-
-
 log = logging.getLogger("sapp")
 
 
-# The callable's json output can be found at the given sharded file and offset.
+# The callable's json output can be found at the given sharded file and offset,
+# and is length bytes long (including the newline) if the length is known.
 # Used for debugging.
 class EntryPosition(NamedTuple):
     callable: str
     shard: int
     offset: int
+    length: Optional[int] = None
 
 
 class ParseType(Enum):
@@ -42,6 +56,30 @@ class ParseType(Enum):
     POSTCONDITION = "postcondition"
 
 
+class IssueFilter(NamedTuple):
+    """Predicates on the code, callable and filename (relative to the repo)
+    of issues. Parsers skip issues failing any of them before building them,
+    or before decoding them where they can, and don't follow their traces.
+    For ParallelParser, the predicates have to be picklable."""
+
+    code: Optional[Callable[[int], bool]] = None
+    callable: Optional[Callable[[str], bool]] = None
+    filename: Optional[Callable[[str], bool]] = None
+
+    @classmethod
+    def from_codes(cls, codes: Iterable[int]) -> "IssueFilter":
+        return cls(code=frozenset(codes).__contains__)
+
+    def keeps(self, code: int, callable: str, filename: Optional[str]) -> bool:
+        """Whether an issue passes the predicates. A filename of None, when
+        it isn't known yet, passes."""
+        return (
+            (self.code is None or self.code(code))
+            and (self.callable is None or self.callable(callable))
+            and (filename is None or self.filename is None or self.filename(filename))
+        )
+
+
 def log_trace_keyerror(func):
     def wrapper(self, json, *args):
         try:
@@ -80,9 +118,15 @@ class BaseParser(PipelineStep[InputFiles, DictEntries]):
     for the Processor.
     """
 
-    def __init__(self, repo_dir=None):
+    def __init__(self, repo_dir=None, issue_filter: Optional[IssueFilter] = None):
         self.repo_dir = os.path.realpath(repo_dir) if repo_dir else None
         self.version = None
+        self.issue_filter = issue_filter
+        # Entries of other types are skipped by parse() without building them.
+        self.parse_types: Set[ParseType] = set(ParseType)
+        # Parsers that support it skip the pre/postconditions that can't be
+        # reached from the traces of an issue.
+        self.reachable_only = False
 
     def get_version(self):
         return self.version
@@ -106,27 +150,56 @@ class BaseParser(PipelineStep[InputFiles, DictEntries]):
         return
         yield
 
+    def get_first_entry_offset(self, handle: IO[bytes]) -> Optional[int]:
+        """Parsers of line delimited output return the byte offset of the first
+        entry line (i.e. after any header), which allows ParallelParser to split
+        a single file into ranges of lines. None means the file can only be
+        parsed as a whole.
+        """
+        return None
+
+    # @abstractmethod
+    def parse_lines(
+        self, lines: Iterable[Union[str, bytes]]
+    ) -> Iterable[Dict[str, Any]]:
+        """Parses entry lines of line delimited output, without the header.
+        Must return objects with a 'type': ParseType field.
+        """
+        raise NotImplementedError("Abstract method called!")
+        return
+        yield
+
     def _analysis_output_to_parsed_types(
-        self, input: AnalysisOutput
+        self, input: AnalysisOutput, parse_types: Optional[Set[ParseType]] = None
     ) -> Iterable[Tuple[ParseType, Any, Dict[str, Any]]]:
-        entries = self.parse(input)
-
-        for e in entries:
-            typ = e["type"]
-            if typ == ParseType.ISSUE:
-                key = e["handle"]
-            elif e["type"] == ParseType.PRECONDITION:
-                key = (e["caller"], e["caller_port"])
-            elif e["type"] == ParseType.POSTCONDITION:
-                key = (e["caller"], e["caller_port"])
-            yield typ, key, e
+        previous_parse_types = self.parse_types
+        if parse_types is not None:
+            self.parse_types = parse_types
+        try:
+            entries = self.parse(input)
+
+            for e in entries:
+                typ = e["type"]
+                if typ == ParseType.ISSUE:
+                    key = e["handle"]
+                elif e["type"] == ParseType.PRECONDITION:
+                    key = (e["caller"], e["caller_port"])
+                elif e["type"] == ParseType.POSTCONDITION:
+                    key = (e["caller"], e["caller_port"])
+                yield typ, key, e
+        finally:
+            self.parse_types = previous_parse_types
 
     def analysis_output_to_dict_entries(
         self,
         inputfile: AnalysisOutput,
         previous_inputfile: Optional[AnalysisOutput],
-        previous_issue_handles: Optional[AnalysisOutput],
+        previous_issue_handles: Union[AnalysisOutput, HandleStore, None],
         linemapfile: Optional[str],
+        streaming: bool = False,
+        issue_handles: Optional["array[int]"] = None,
+        spill_conditions: bool = False,
+        reachable_only: bool = False,
     ) -> DictEntries:
         """Here we take input generators and return a dict with issues,
         preconditions, and postconditions separated. If there is only a single
@@ -139,68 +212,173 @@ class BaseParser(PipelineStep[InputFiles, DictEntries]):
         filename, each new file line position to a list of old file line
         position. This is used to adjust handles to we can recognize when issues
         moved.
+
+        With streaming, "issues" is a generator instead of a list. The input is
+        then read twice: once to collect the pre/postconditions, and lazily a
+        second time for the issues, so they are never all held in memory.
+
+        If issue_handles is given, the HandleStore hashes of the master and
+        diff handles of every issue (new or not) are appended to it, so they
+        can be stored for the next run.
+
+        With spill_conditions, the pre/postconditions are ConditionStores,
+        which keep the entries in a temporary file instead of in memory.
+
+        With reachable_only, parsers that support it only return the
+        pre/postconditions reachable from the traces of an issue, which are
+        the only ones the ModelGenerator uses unless unused models are stored.
         """
 
         issues = []
-        previous_handles: Set[str] = set()
-        conditions: Dict[ParseType, Dict[str, List[Dict[str, Any]]]] = {
-            ParseType.PRECONDITION: defaultdict(list),
-            ParseType.POSTCONDITION: defaultdict(list),
-        }
-
-        # If we have a mapfile, create the map.
-        if linemapfile:
-            log.info("Parsing linemap file")
-            with open(linemapfile, "r") as f:
-                linemap = json.load(f)
-        else:
-            linemap = None
+        previous_handles: Container[str] = set()
+        conditions: Dict[ParseType, Conditions] = (
+            {
+                ParseType.PRECONDITION: ConditionStore(),
+                ParseType.POSTCONDITION: ConditionStore(),
+            }
+            if spill_conditions
+            else {
+                ParseType.PRECONDITION: defaultdict(list),
+                ParseType.POSTCONDITION: defaultdict(list),
+            }
+        )
 
         # Save entry info from the parent analysis, if there is one.
         # If previous issue handles file is provided, use it over
         # previous_inputfile (contains the full JSON)
-        if previous_issue_handles:
+        if isinstance(previous_issue_handles, HandleStore):
+            log.info("Using %d previous issue handles", len(previous_issue_handles))
+            previous_handles = previous_issue_handles
+        elif previous_issue_handles:
             log.info("Parsing previous issue handles")
             for f in previous_issue_handles.file_handles():
                 handles = f.read().splitlines()
                 previous_handles = {handle for handle in handles}
         elif previous_inputfile:
             log.info("Parsing previous hh_server output")
-            for typ, master_key, e in self._analysis_output_to_parsed_types(
-                previous_inputfile
+            handles: Set[str] = set()
+            with profiler.phase("parse previous input"):
+                for typ, master_key, e in self._analysis_output_to_parsed_types(
+                    previous_inputfile, {ParseType.ISSUE}
+                ):
+                    if typ == ParseType.ISSUE:
+                        diff_handle = BaseParser.compute_diff_handle(
+                            e["filename"], e["line"], e["code"]
+                        )
+                        handles.add(diff_handle)
+                        # Use exact handle match too in case linemap is missing.
+                        handles.add(master_key)
+            previous_handles = handles
+
+        self.reachable_only = reachable_only
+
+        if streaming and inputfile.file_handle is not None:
+            log.warning("Cannot read a file handle twice, not streaming issues")
+            streaming = False
+
+        if streaming:
+            log.info("Parsing hh_server output (conditions only)")
+            for typ, key, e in self._analysis_output_to_parsed_types(
+                inputfile, {ParseType.PRECONDITION, ParseType.POSTCONDITION}
             ):
-                if typ == ParseType.ISSUE:
-                    diff_handle = BaseParser.compute_diff_handle(
-                        e["filename"], e["line"], e["code"]
-                    )
-                    previous_handles.add(diff_handle)
-                    # Use exact handle match too in case linemap is missing.
-                    previous_handles.add(master_key)
+                self._add_condition(conditions[typ], key, e)
 
-        log.info("Parsing hh_server output")
-        for typ, key, e in self._analysis_output_to_parsed_types(inputfile):
-            if typ == ParseType.ISSUE:
-                # We are only interested in issues that weren't in the previous
-                # analysis.
-                if not self._is_existing_issue(linemap, previous_handles, e, key):
-                    issues.append(e)
-            else:
-                conditions[typ][key].append(e)
+            self._finish_conditions(conditions)
+            return {
+                "issues": self._stream_new_issues(
+                    inputfile, linemapfile, previous_handles, issue_handles
+                ),
+                "preconditions": conditions[ParseType.PRECONDITION],
+                "postconditions": conditions[ParseType.POSTCONDITION],
+            }
 
+        log.info("Parsing hh_server output")
+        with self._open_linemap(linemapfile) as linemap:
+            for typ, key, e in self._analysis_output_to_parsed_types(inputfile):
+                if typ == ParseType.ISSUE:
+                    if issue_handles is not None:
+                        self._add_issue_handles(issue_handles, e, key)
+                    # We are only interested in issues that weren't in the
+                    # previous analysis.
+                    if not self._is_existing_issue(linemap, previous_handles, e, key):
+                        issues.append(e)
+                else:
+                    self._add_condition(conditions[typ], key, e)
+
+        profiler.count("issues", len(issues))
+        self._finish_conditions(conditions)
         return {
             "issues": issues,
             "preconditions": conditions[ParseType.PRECONDITION],
             "postconditions": conditions[ParseType.POSTCONDITION],
         }
 
-    def _is_existing_issue(self, linemap, old_handles, new_issue, new_handle):
+    @staticmethod
+    def _open_linemap(linemapfile: Optional[str]) -> ContextManager[Optional[Linemap]]:
+        if not linemapfile:
+            return nullcontext()
+        log.info("Opening linemap file")
+        return Linemap(linemapfile)
+
+    def _stream_new_issues(
+        self,
+        inputfile: AnalysisOutput,
+        linemapfile: Optional[str],
+        previous_handles: Container[str],
+        issue_handles: Optional["array[int]"],
+    ) -> Iterable[Dict[str, Any]]:
+        log.info("Streaming issues from hh_server output")
+        count = 0
+        # Opened here, as the issues are only read once the generator is.
+        with self._open_linemap(linemapfile) as linemap:
+            for _typ, key, e in self._analysis_output_to_parsed_types(
+                inputfile, {ParseType.ISSUE}
+            ):
+                if issue_handles is not None:
+                    self._add_issue_handles(issue_handles, e, key)
+                if not self._is_existing_issue(linemap, previous_handles, e, key):
+                    count += 1
+                    yield e
+        # Counted in the step that consumes the issues.
+        profiler.count("issues", count)
+
+    @staticmethod
+    def _add_condition(conditions: Conditions, key, entry: Dict[str, Any]) -> None:
+        if isinstance(conditions, ConditionStore):
+            conditions.append(key, entry)
+        else:
+            conditions[key].append(entry)
+
+    @staticmethod
+    def _finish_conditions(conditions: Dict[ParseType, Conditions]) -> None:
+        for typ, name in [
+            (ParseType.PRECONDITION, "preconditions"),
+            (ParseType.POSTCONDITION, "postconditions"),
+        ]:
+            profiler.count(name, count_entries(conditions[typ]))
+
+    @staticmethod
+    def _add_issue_handles(
+        issue_handles: "array[int]", issue: Dict[str, Any], master_handle: str
+    ) -> None:
+        issue_handles.append(HandleStore.hash(master_handle))
+        issue_handles.append(
+            HandleStore.hash(
+                BaseParser.compute_diff_handle(
+                    issue["filename"], issue["line"], issue["code"]
+                )
+            )
+        )
+
+    def _is_existing_issue(
+        self, linemap: Optional[Linemap], old_handles, new_issue, new_handle
+    ):
         if new_handle in old_handles:
             return True
         if not linemap:
             return False
         filename = new_issue["filename"]
-        old_map = linemap.get(filename, {})
-        old_lines = old_map.get(str(new_issue["line"]), [])
+        old_lines = linemap.old_lines(filename, int(new_issue["line"]))
         # Once this works, we should remove the "relative" line from the handle
         # and use the absolute one to avoid having to map both the start of the
         # method and the line in the method.
@@ -217,12 +395,21 @@ class BaseParser(PipelineStep[InputFiles, DictEntries]):
     def run(self, input: InputFiles, summary: Summary) -> Tuple[DictEntries, Summary]:
         inputfile, previous_inputfile = input
 
+        if summary.get("issue_handles_directory"):
+            # Filled in while the issues are parsed, stored by DatabaseSaver.
+            summary["issue_handles"] = array("Q")
+
         return (
             self.analysis_output_to_dict_entries(
                 inputfile,
                 previous_inputfile,
                 summary.get("previous_issue_handles"),
                 summary.get("old_linemap_file"),
+                summary.get("streaming", False),
+                summary.get("issue_handles"),
+                summary.get("spill_conditions", False),
+                summary.get("reachable_models_only", False)
+                and not summary.get("store_unused_models", False),
             ),
             summary,
         )
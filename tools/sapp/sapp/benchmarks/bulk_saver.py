@@ -0,0 +1,95 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Compares the rows/s per table of BulkSaver saving to SQLite through
+bulk_insert_mappings, through the DBAPI fast path, and through the fast path
+with fast_sqlite_writes.
+
+    python -m sapp.benchmarks.bulk_saver --issues 50000
+"""
+
+import os
+import tempfile
+import time
+from typing import Dict, Tuple
+
+import click
+
+from ..bulk_saver import BulkSaver
+from ..database_saver import DatabaseSaver
+from ..db import DB, DBType
+from ..model_generator import ModelGenerator
+from ..pysa_taint_parser import Parser
+from ..tests.fake_pysa_output import run_pipeline_on, write_pysa_output
+from .common import measure_in_subprocess
+
+
+class TimedBulkSaver(BulkSaver):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # class name -> (items added, seconds to save them)
+        self.timings: Dict[str, Tuple[int, float]] = {}
+
+    def _save(self, database, cls, pk_gen):
+        self._timed(cls, super()._save, database, cls, pk_gen)
+
+    def _save_sqlite(self, session, cursor, cls, pk_gen):
+        self._timed(cls, super()._save_sqlite, session, cursor, cls, pk_gen)
+
+    def _timed(self, cls, save, *args) -> None:
+        count = len(self.saving[cls.__name__])
+        start = time.perf_counter()
+        save(*args)
+        self.timings[cls.__name__] = (count, time.perf_counter() - start)
+
+
+def save(
+    filename: str, dbname: str, fast_path: bool, fast_sqlite_writes: bool
+) -> Dict[str, Tuple[int, float]]:
+    saver = DatabaseSaver(DB(DBType.SQLITE, dbname))
+    bulk_saver = TimedBulkSaver(
+        saver.primary_key_generator, fast_sqlite_writes=fast_sqlite_writes
+    )
+    bulk_saver.SQLITE_FAST_PATH = fast_path
+    saver.bulk_saver = bulk_saver
+    run_pipeline_on([Parser(), ModelGenerator(), saver], filename)
+    return bulk_saver.timings
+
+
+@click.command()
+@click.option("--issues", type=int, default=20000, show_default=True)
+@click.option("--trace-length", type=int, default=3, show_default=True)
+def main(issues: int, trace_length: int):
+    variants = [
+        ("bulk_insert_mappings", False, False),
+        ("fast path", True, False),
+        ("fast path, tuned", True, True),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        filename = write_pysa_output(directory, issues, trace_length=trace_length)
+        results = {}
+        for name, fast_path, fast_sqlite_writes in variants:
+            dbname = os.path.join(directory, f"{len(results)}.db")
+            results[name] = measure_in_subprocess(
+                save, filename, dbname, fast_path, fast_sqlite_writes
+            ).result
+
+    print(f"{'rows/s':<40}" + "".join(f"{name:>22}" for name, _, _ in variants))
+    for table, (count, _) in results[variants[0][0]].items():
+        rates = [
+            count / max(results[name][table][1], 1e-9) for name, _, _ in variants
+        ]
+        print(f"{table} ({count})".ljust(40) + "".join(f"{r:>22,.0f}" for r in rates))
+    print(
+        f"{'total seconds':<40}"
+        + "".join(
+            f"{sum(seconds for _, seconds in results[name].values()):>22.2f}"
+            for name, _, _ in variants
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Helpers shared by the SAPP benchmarks: measurements taken in a fresh
+process. The synthetic Pysa output they run on is in tests/fake_pysa_output."""
+
+import gc
+import multiprocessing
+import resource
+import time
+from typing import Any, Callable, NamedTuple
+
+
+class Measurement(NamedTuple):
+    wall_time: float
+    cpu_time: float
+    # Peak resident set size of the process, in KiB. The baseline is the peak
+    # before the measured function ran (interpreter, imports, setup).
+    peak_rss_kb: int
+    baseline_rss_kb: int
+    result: Any = None
+
+    @property
+    def peak_rss_delta_kb(self) -> int:
+        return self.peak_rss_kb - self.baseline_rss_kb
+
+
+def measure(func: Callable[..., Any], *args) -> Measurement:
+    gc.collect()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    result = func(*args)
+    wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return Measurement(
+        wall_time=wall,
+        cpu_time=cpu,
+        peak_rss_kb=peak,
+        baseline_rss_kb=baseline,
+        result=result,
+    )
+
+
+def measure_in_subprocess(func: Callable[..., Any], *args) -> Measurement:
+    """Runs func(*args) in a freshly spawned process. The peak RSS of a process
+    never goes down, so every variant that is compared needs its own process.
+    func and its arguments and result must be picklable.
+    """
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(measure, (func, *args))
+
+
+def format_measurement(name: str, measurement: Measurement) -> str:
+    return (
+        f"{name:<24} wall {measurement.wall_time:8.2f}s"
+        f"  cpu {measurement.cpu_time:8.2f}s"
+        f"  peak rss {measurement.peak_rss_kb / 1024:9.1f} MiB"
+        f" (+{measurement.peak_rss_delta_kb / 1024:.1f} MiB)"
+    )
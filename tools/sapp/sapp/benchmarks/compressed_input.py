@@ -0,0 +1,75 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Compares the size on disk, the wall time of parsing and generating the
+trace graph, and the time of offset index lookups, for plain analysis output
+and the same output compressed in blocks with each supported compression.
+
+    python -m sapp.benchmarks.compressed_input --issues 5000 --shards 4
+"""
+
+import glob
+import os
+import random
+import tempfile
+import time
+
+import click
+
+from ..analysis_output import AnalysisOutput
+from ..compressed_files import CODECS, write_blocks
+from ..model_generator import ModelGenerator
+from ..offset_index import OffsetIndex
+from ..pysa_taint_parser import Parser
+from ..tests.fake_pysa_output import run_pipeline_on, write_pysa_output
+from .common import format_measurement, measure_in_subprocess
+
+
+def run_pipeline(spec: str) -> int:
+    graph, _ = run_pipeline_on([Parser(), ModelGenerator()], spec)
+    return len(graph._trace_frames)
+
+
+def time_lookups(spec: str, lookups: int) -> float:
+    """Seconds per lookup of the json of a random callable."""
+    index = OffsetIndex.get_or_build(Parser(), AnalysisOutput.from_file(spec))
+    try:
+        callables = [f"sink_{i}_0" for i in range(lookups)]
+        random.Random(0).shuffle(callables)
+        start = time.perf_counter()
+        for callable in callables:
+            for position in index.lookup(callable):
+                index.get_json(position)
+        return (time.perf_counter() - start) / lookups
+    finally:
+        index.close()
+
+
+@click.command()
+@click.option("--issues", type=int, default=5000, show_default=True)
+@click.option("--shards", type=int, default=4, show_default=True)
+@click.option("--block-size", type=int, default=1 << 20, show_default=True)
+@click.option("--lookups", type=int, default=1000, show_default=True)
+def main(issues: int, shards: int, block_size: int, lookups: int):
+    with tempfile.TemporaryDirectory() as directory:
+        spec = write_pysa_output(directory, issues, shards=shards, trace_length=3)
+        names = sorted(glob.glob(os.path.join(directory, "*.json")))
+        for extension in ["", *CODECS]:
+            if extension:
+                for name in names:
+                    with open(name, "rb") as f:
+                        write_blocks(name + extension, f, block_size)
+            size = sum(os.path.getsize(name + extension) for name in names)
+            measurement = measure_in_subprocess(run_pipeline, spec + extension)
+            lookup = time_lookups(spec + extension, min(lookups, issues))
+            print(
+                format_measurement(extension or "plain", measurement),
+                f"{size / 2 ** 20:8.1f} MiB on disk",
+                f"lookup {lookup * 1e3:.2f} ms",
+            )
+
+
+if __name__ == "__main__":
+    main()
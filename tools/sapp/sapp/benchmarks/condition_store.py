@@ -0,0 +1,55 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Compares peak RSS and wall time of parsing and generating the trace graph
+with the pre/postconditions in memory and in a ConditionStore, on output
+where most models are unused.
+
+    python -m sapp.benchmarks.condition_store --issues 5000 --unused-models 200000
+"""
+
+import tempfile
+
+import click
+
+from ..model_generator import ModelGenerator
+from ..pysa_taint_parser import Parser
+from ..tests.fake_pysa_output import run_pipeline_on, write_pysa_output
+from .common import format_measurement, measure_in_subprocess
+
+
+def write_output(
+    directory: str, issues: int, trace_length: int, unused_models: int
+) -> str:
+    return write_pysa_output(
+        directory, issues, trace_length=trace_length, unused_models=unused_models
+    )
+
+
+def run_pipeline(filename: str, spill_conditions: bool) -> int:
+    graph, _ = run_pipeline_on(
+        [Parser(), ModelGenerator()], filename, spill_conditions=spill_conditions
+    )
+    return len(graph._trace_frames)
+
+
+@click.command()
+@click.option("--issues", type=int, default=5000, show_default=True)
+@click.option("--trace-length", type=int, default=3, show_default=True)
+@click.option("--unused-models", type=int, default=100000, show_default=True)
+def main(issues: int, trace_length: int, unused_models: int):
+    with tempfile.TemporaryDirectory() as directory:
+        # Written in another process, as a process inherits the peak RSS of
+        # the process that started it.
+        filename = measure_in_subprocess(
+            write_output, directory, issues, trace_length, unused_models
+        ).result
+        for name, spill_conditions in [("in memory", False), ("spilled", True)]:
+            measurement = measure_in_subprocess(run_pipeline, filename, spill_conditions)
+            print(format_measurement(name, measurement), f"{measurement.result} frames")
+
+
+if __name__ == "__main__":
+    main()
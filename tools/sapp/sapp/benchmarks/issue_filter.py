@@ -0,0 +1,74 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Compares wall time and peak RSS of ingesting the issues of a few codes
+with WarningCodeFilter after the parser, and with the codes filtered by the
+parser, alone and with only the reachable models parsed.
+
+    python -m sapp.benchmarks.issue_filter --issues 20000 --keep-codes 1
+"""
+
+import tempfile
+from typing import List
+
+import click
+
+from ..base_parser import IssueFilter
+from ..model_generator import ModelGenerator
+from ..pysa_taint_parser import Parser
+from ..tests.fake_pysa_output import run_pipeline_on, write_pysa_output
+from ..warning_code_filter import WarningCodeFilter
+from .common import format_measurement, measure_in_subprocess
+
+
+def write_output(
+    directory: str, issues: int, trace_length: int, unused_models: int
+) -> str:
+    return write_pysa_output(
+        directory, issues, trace_length=trace_length, unused_models=unused_models
+    )
+
+
+def run_pipeline(filename: str, codes: List[int], variant: str) -> int:
+    if variant == "WarningCodeFilter":
+        steps = [Parser(), WarningCodeFilter(set(codes)), ModelGenerator()]
+    else:
+        steps = [Parser(issue_filter=IssueFilter.from_codes(codes)), ModelGenerator()]
+    graph, _ = run_pipeline_on(
+        steps,
+        filename,
+        reachable_models_only=variant == "parser, reachable models",
+    )
+    return len(list(graph.get_issue_instances()))
+
+
+@click.command()
+@click.option("--issues", type=int, default=20000, show_default=True)
+@click.option("--trace-length", type=int, default=3, show_default=True)
+@click.option("--unused-models", type=int, default=0, show_default=True)
+@click.option(
+    "--keep-codes",
+    type=int,
+    default=1,
+    show_default=True,
+    help="number of the 10 synthetic codes to keep",
+)
+def main(issues: int, trace_length: int, unused_models: int, keep_codes: int):
+    codes = [5000 + i for i in range(keep_codes)]
+    with tempfile.TemporaryDirectory() as directory:
+        # Written in another process, as a process inherits the peak RSS of
+        # the process that started it.
+        filename = measure_in_subprocess(
+            write_output, directory, issues, trace_length, unused_models
+        ).result
+        for variant in ["WarningCodeFilter", "parser", "parser, reachable models"]:
+            measurement = measure_in_subprocess(run_pipeline, filename, codes, variant)
+            print(
+                format_measurement(variant, measurement), f"{measurement.result} issues"
+            )
+
+
+if __name__ == "__main__":
+    main()
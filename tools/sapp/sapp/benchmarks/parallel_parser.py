@@ -0,0 +1,59 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Compares parsing a single unsharded Pysa output file with Parser and with
+ParallelParser at different numbers of processes.
+
+    python -m sapp.benchmarks.parallel_parser --issues 50000 -p 1 -p 4 -p 16
+"""
+
+import os
+import tempfile
+from typing import List
+
+import click
+
+from ..analysis_output import AnalysisOutput
+from ..base_parser import BaseParser
+from ..parallel_parser import ParallelParser
+from ..pysa_taint_parser import Parser
+from ..tests.fake_pysa_output import write_pysa_output
+from .common import format_measurement, measure
+
+
+def count_entries(parser: BaseParser, filename: str) -> int:
+    return sum(1 for _ in parser.parse(AnalysisOutput.from_file(filename)))
+
+
+@click.command()
+@click.option("--issues", type=int, default=20000, show_default=True)
+@click.option("--unused-models", type=int, default=0, show_default=True)
+@click.option(
+    "--processes",
+    "-p",
+    type=int,
+    multiple=True,
+    help="process counts to run ParallelParser with (default: 1, 4, #cpus)",
+)
+def main(issues: int, unused_models: int, processes: List[int]):
+    processes = processes or sorted({1, 4, os.cpu_count() or 1})
+    with tempfile.TemporaryDirectory() as directory:
+        filename = write_pysa_output(directory, issues, unused_models=unused_models)
+        print(f"{os.path.getsize(filename) / (1 << 20):.1f} MiB of output")
+
+        measurement = measure(count_entries, Parser(), filename)
+        print(format_measurement("Parser", measurement), measurement.result)
+        for count in processes:
+            measurement = measure(
+                count_entries, ParallelParser(Parser, processes=count), filename
+            )
+            print(
+                format_measurement(f"ParallelParser -p {count}", measurement),
+                measurement.result,
+            )
+
+
+if __name__ == "__main__":
+    main()
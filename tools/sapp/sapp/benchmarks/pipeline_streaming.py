@@ -0,0 +1,60 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Compares peak RSS and wall time of the batch and streaming pipelines
+(parser -> WarningCodeFilter -> ModelGenerator).
+
+    python -m sapp.benchmarks.pipeline_streaming --issues 50000
+"""
+
+import tempfile
+
+import click
+
+from ..model_generator import ModelGenerator
+from ..pysa_taint_parser import Parser
+from ..tests.fake_pysa_output import run_pipeline_on, write_pysa_output
+from ..warning_code_filter import WarningCodeFilter
+from .common import format_measurement, measure_in_subprocess
+
+
+def run_pipeline(filename: str, streaming: bool, codes) -> int:
+    graph, _ = run_pipeline_on(
+        [Parser(), WarningCodeFilter(set(codes)), ModelGenerator()],
+        filename,
+        streaming=streaming,
+    )
+    return len(list(graph.get_issue_instances()))
+
+
+@click.command()
+@click.option("--issues", type=int, default=20000, show_default=True)
+@click.option("--trace-length", type=int, default=3, show_default=True)
+@click.option("--unused-models", type=int, default=0, show_default=True)
+@click.option(
+    "--keep-codes",
+    type=int,
+    default=10,
+    show_default=True,
+    help="number of the 10 synthetic codes that WarningCodeFilter keeps",
+)
+def main(issues: int, trace_length: int, unused_models: int, keep_codes: int):
+    codes = [5000 + i for i in range(keep_codes)]
+    with tempfile.TemporaryDirectory() as directory:
+        filename = write_pysa_output(
+            directory,
+            issues,
+            trace_length=trace_length,
+            unused_models=unused_models,
+        )
+        for name, streaming in [("batch", False), ("streaming", True)]:
+            measurement = measure_in_subprocess(
+                run_pipeline, filename, streaming, codes
+            )
+            print(format_measurement(name, measurement), f"{measurement.result} issues")
+
+
+if __name__ == "__main__":
+    main()
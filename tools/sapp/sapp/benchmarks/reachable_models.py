@@ -0,0 +1,71 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Compares wall time and peak RSS of parsing and generating the trace graph
+when parsing all models and only the models reachable from an issue, for
+increasing numbers of unused models.
+
+    python -m sapp.benchmarks.reachable_models --issues 5000 --unused-models 0,100000
+"""
+
+import tempfile
+
+import click
+
+from ..model_generator import ModelGenerator
+from ..pysa_taint_parser import Parser
+from ..tests.fake_pysa_output import run_pipeline_on, write_pysa_output
+from .common import format_measurement, measure_in_subprocess
+
+
+def write_output(
+    directory: str, issues: int, trace_length: int, unused_models: int
+) -> str:
+    return write_pysa_output(
+        directory, issues, trace_length=trace_length, unused_models=unused_models
+    )
+
+
+def run_pipeline(filename: str, reachable_models_only: bool) -> int:
+    graph, _ = run_pipeline_on(
+        [Parser(), ModelGenerator()],
+        filename,
+        reachable_models_only=reachable_models_only,
+    )
+    return len(graph._trace_frames)
+
+
+@click.command()
+@click.option("--issues", type=int, default=5000, show_default=True)
+@click.option("--trace-length", type=int, default=3, show_default=True)
+@click.option(
+    "--unused-models",
+    default="0,20000,100000",
+    show_default=True,
+    help="comma separated numbers of unused models to measure",
+)
+def main(issues: int, trace_length: int, unused_models: str):
+    for number in [int(number) for number in unused_models.split(",")]:
+        with tempfile.TemporaryDirectory() as directory:
+            # Written in another process, as a process inherits the peak RSS
+            # of the process that started it.
+            filename = measure_in_subprocess(
+                write_output, directory, issues, trace_length, number
+            ).result
+            for name, reachable_models_only in [
+                ("all models", False),
+                ("reachable only", True),
+            ]:
+                measurement = measure_in_subprocess(
+                    run_pipeline, filename, reachable_models_only
+                )
+                print(
+                    format_measurement(f"{number} unused, {name}", measurement),
+                    f"{measurement.result} frames",
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Compares the memory and time used by TraceGraph and CompactTraceGraph to
+build and walk a synthetic graph of chains of trace frames, each starting at
+an issue instance.
+
+    python -m sapp.benchmarks.trace_graph --frames 10000000
+"""
+
+import time
+from typing import Tuple
+
+import click
+
+from ..compact_trace_graph import CompactTraceGraph
+from ..models import (
+    DBID,
+    IssueInstance,
+    SharedText,
+    SharedTextKind,
+    SourceLocation,
+    TraceFrame,
+    TraceKind,
+)
+from ..trace_graph import TraceGraph
+from .common import format_measurement, measure_in_subprocess
+
+
+def _shared_text(graph: TraceGraph, kind: SharedTextKind, contents: str) -> SharedText:
+    shared_text = graph.get_shared_text(kind, contents)
+    if shared_text is None:
+        shared_text = SharedText.Record(id=DBID(), contents=contents, kind=kind)
+        graph.add_shared_text(shared_text)
+    return shared_text
+
+
+def build_graph(compact: bool, num_frames: int, chain_length: int) -> TraceGraph:
+    graph = CompactTraceGraph() if compact else TraceGraph()
+    run_id = DBID()
+    for chain in range(num_frames // chain_length):
+        filename = _shared_text(
+            graph, SharedTextKind.FILENAME, f"module_{chain % 1000}.py"
+        )
+        source = _shared_text(graph, SharedTextKind.SOURCE, f"Source{chain % 10}")
+        callables = [
+            _shared_text(graph, SharedTextKind.CALLABLE, f"chain_{chain}.f_{j}")
+            for j in range(chain_length + 1)
+        ]
+        instance = IssueInstance.Record(
+            id=DBID(), callable_id=callables[0].id, filename_id=filename.id
+        )
+        graph.add_issue_instance(instance)
+        graph.add_issue_instance_shared_text_assoc(instance, source)
+        for j in range(chain_length):
+            # Ports are built like the parser would, as separate strings.
+            trace_frame = TraceFrame.Record(
+                id=DBID(),
+                kind=TraceKind.POSTCONDITION,
+                caller_id=callables[j].id,
+                caller_port="root" if j == 0 else "".join(["res", "ult"]),
+                callee_id=callables[j + 1].id,
+                callee_port="".join(["res", "ult"]),
+                callee_location=SourceLocation(10 + j, 1, 8),
+                filename_id=filename.id,
+                run_id=run_id,
+                preserves_type_context=False,
+                type_interval_lower=None,
+                type_interval_upper=None,
+                migrated_id=None,
+                titos=[],
+            )
+            graph.add_trace_frame_leaf_assoc(trace_frame, source, chain_length - j)
+            graph.add_trace_frame(trace_frame)
+            if j == 0:
+                graph.add_issue_instance_trace_frame_assoc(instance, trace_frame)
+    return graph
+
+
+def walk_graph(graph: TraceGraph) -> int:
+    visited = 0
+    for instance in graph.get_issue_instances():
+        frames = list(graph.get_issue_instance_trace_frames(instance))
+        while frames:
+            frame = frames.pop()
+            visited += 1
+            graph.get_trace_frame_leaf_ids_with_depths(frame)
+            frames.extend(graph.get_next_trace_frames(frame))
+    return visited
+
+
+def build_and_walk(
+    compact: bool, num_frames: int, chain_length: int
+) -> Tuple[float, float, int]:
+    start = time.perf_counter()
+    graph = build_graph(compact, num_frames, chain_length)
+    built = time.perf_counter()
+    visited = walk_graph(graph)
+    return built - start, time.perf_counter() - built, visited
+
+
+@click.command()
+@click.option("--frames", type=int, default=10_000_000, show_default=True)
+@click.option("--chain-length", type=int, default=10, show_default=True)
+def main(frames: int, chain_length: int):
+    for name, compact in [("TraceGraph", False), ("CompactTraceGraph", True)]:
+        measurement = measure_in_subprocess(
+            build_and_walk, compact, frames, chain_length
+        )
+        build_time, walk_time, visited = measurement.result
+        print(
+            format_measurement(name, measurement),
+            f" build {build_time:.1f}s  walk {walk_time:.1f}s ({visited} frames)",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,19 @@
 """
 
 import logging
-from typing import Any, Dict, Optional
+from contextlib import contextmanager
+from itertools import groupby
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
-from .db import DB
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateIndex, DropIndex
+
+from . import profiler
+from .db import DB, DBType
 from .decorators import log_time
 from .iterutil import split_every
 from .models import (
+    CallableLeafDistance,
     Issue,
     IssueInstance,
     IssueInstanceFixInfo,
@@ -43,12 +50,24 @@ class BulkSaver:
         IssueInstanceTraceFrameAssoc,
         TraceFrameAnnotation,
         TraceFrameLeafAssoc,
+        CallableLeafDistance,
     ]
 
     BATCH_SIZE = 30000
 
-    def __init__(self, primary_key_generator: Optional[PrimaryKeyGenerator] = None):
+    # Save to SQLite databases in a single transaction with executemany on the
+    # DBAPI connection, instead of through bulk_insert_mappings.
+    SQLITE_FAST_PATH = True
+
+    def __init__(
+        self,
+        primary_key_generator: Optional[PrimaryKeyGenerator] = None,
+        fast_sqlite_writes: bool = False,
+    ):
         self.primary_key_generator = primary_key_generator or PrimaryKeyGenerator()
+        # Use WAL and don't wait for SQLite to sync to disk while saving. The
+        # database can be corrupted if the machine crashes during the save.
+        self.fast_sqlite_writes = fast_sqlite_writes
         self.saving: Dict[str, Any] = {}
         for cls in self.SAVING_CLASSES_ORDER:
             self.saving[cls.__name__] = []
@@ -69,44 +88,133 @@ class BulkSaver:
     def get_items_to_add(self, cls):
         return self.saving[cls.__name__]
 
-    def save_all(self, database: DB, use_lock=False, dbname=""):
-        saving_classes = [
+    def saving_classes(self) -> List[Any]:
+        """The classes with items to save, in the order they are saved."""
+        return [
             cls
             for cls in self.SAVING_CLASSES_ORDER
-            if len(self.saving[cls.__name__]) is not 0
+            if self.saving[cls.__name__]
         ]
 
-        item_counts = {
-            cls.__name__: len(self.get_items_to_add(cls)) for cls in saving_classes
+    def item_counts(self) -> Dict[str, int]:
+        return {
+            cls.__name__: len(self.get_items_to_add(cls))
+            for cls in self.saving_classes()
         }
 
-        with database.make_session() as session:
+    def save_all(self, database: DB, use_lock=False, dbname=""):
+        """Saves the items. Their primary keys are reserved first, unless the
+        ranges were already reserved (see DatabaseSaver)."""
+        saving_classes = self.saving_classes()
+        item_counts = self.item_counts()
+
+        with profiler.phase("reserve primary keys"), database.make_session() as session:
             pk_gen = self.primary_key_generator.reserve(
                 session, saving_classes, item_counts
             )
 
+        if self.SQLITE_FAST_PATH and database.dbtype in (
+            DBType.SQLITE,
+            DBType.MEMORY,
+        ):
+            self._save_all_sqlite(database, saving_classes, pk_gen)
+            return
+
         for cls in saving_classes:
             log.info("Saving %s...", cls.__name__)
             self._save(database, cls, pk_gen)
 
-    @log_time
-    def _save(self, database: DB, cls, pk_gen: PrimaryKeyGenerator):
+    def _prepare(self, session, cls, pk_gen: PrimaryKeyGenerator) -> List[Dict]:
         # We sort keys because bulk insert uses executemany, but it can only
         # group together sequential items with the same keys. If we are scattered
         # then it does far more executemany calls, and it kills performance.
-        with database.make_session() as session:
-            items = sorted(
+        with profiler.phase(f"prepare {cls.__name__}"):
+            profiler.count("items", len(self.saving[cls.__name__]))
+            return sorted(
                 cls.prepare(session, pk_gen, consume(self.saving[cls.__name__])),
                 key=lambda k: list(k.keys()),
             )
 
+    @log_time
+    def _save(self, database: DB, cls, pk_gen: PrimaryKeyGenerator):
+        with database.make_session() as session:
+            items = self._prepare(session, cls, pk_gen)
+
         # bulk_insert_mappings should only be used for new objects.
         # To update an existing object, just modify its attribute(s)
         # and call session.commit()
-        for group in split_every(self.BATCH_SIZE, items):
-            with database.make_session() as session:
-                session.bulk_insert_mappings(cls, group, render_nulls=True)
-                session.commit()
+        with profiler.phase(f"insert {cls.__name__}"):
+            profiler.count("rows", len(items))
+            for group in split_every(self.BATCH_SIZE, items):
+                with database.make_session() as session:
+                    session.bulk_insert_mappings(cls, group, render_nulls=True)
+                    session.commit()
+
+    def _save_all_sqlite(self, database: DB, saving_classes, pk_gen):
+        with database.make_session() as session:
+            # Merging (in prepare) goes through the session, inserting through
+            # the DBAPI connection underneath it, so both see the same
+            # transaction.
+            connection = session.connection()
+            with self._sqlite_transaction(connection.connection) as cursor:
+                for cls in saving_classes:
+                    log.info("Saving %s...", cls.__name__)
+                    self._save_sqlite(session, cursor, cls, pk_gen)
+
+    @contextmanager
+    def _sqlite_transaction(self, dbapi_connection) -> Iterator[Any]:
+        cursor = dbapi_connection.cursor()
+        previous_pragmas = []
+        if self.fast_sqlite_writes:
+            # These can't be changed within a transaction.
+            for pragma, value in [("journal_mode", "WAL"), ("synchronous", "OFF")]:
+                previous = cursor.execute(f"PRAGMA {pragma}").fetchone()[0]
+                previous_pragmas.append((pragma, previous))
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+
+        # The sqlite3 module only begins transactions implicitly before DML,
+        # which would leave the index DDL and the merge queries outside of it.
+        cursor.execute("BEGIN")
+        try:
+            yield cursor
+            dbapi_connection.commit()
+        except BaseException:
+            dbapi_connection.rollback()
+            raise
+        finally:
+            for pragma, previous in previous_pragmas:
+                cursor.execute(f"PRAGMA {pragma} = {previous}")
+            cursor.close()
+
+    @log_time
+    def _save_sqlite(self, session, cursor, cls, pk_gen: PrimaryKeyGenerator):
+        items = self._prepare(session, cls, pk_gen)
+        dialect = session.bind.dialect
+        table = cls.__table__
+
+        # Building the secondary indexes once after the load is much cheaper
+        # than updating them row by row, unless the table is already bigger
+        # than what we are adding. rowid is a cheap estimate of the row count.
+        deferred_indexes = []
+        if items:
+            table_name = dialect.identifier_preparer.format_table(table)
+            (max_rowid,) = cursor.execute(
+                f"SELECT MAX(rowid) FROM {table_name}"
+            ).fetchone()
+            if (max_rowid or 0) < len(items):
+                deferred_indexes = [
+                    index for index in table.indexes if not index.unique
+                ]
+        with profiler.phase(f"insert {cls.__name__}"):
+            profiler.count("rows", len(items))
+            for index in deferred_indexes:
+                cursor.execute(str(DropIndex(index).compile(dialect=dialect)))
+
+            for statement, rows in _sqlite_inserts(cls, dialect, items):
+                cursor.executemany(statement, rows)
+
+            for index in deferred_indexes:
+                cursor.execute(str(CreateIndex(index).compile(dialect=dialect)))
 
     def add_trace_frame_leaf_assoc(self, message, trace_frame, depth):
         self.add(
@@ -136,6 +244,53 @@ class BulkSaver:
         return stat_str
 
 
+def _sqlite_inserts(cls, dialect, items: List[Dict]) -> Iterable[Any]:
+    """Yields (statement, rows) for each group of items with the same keys,
+    the way bulk_insert_mappings(render_nulls=True) would insert them: keys
+    that aren't columns are ignored, missing columns get their scalar default
+    or are left to the server default, and values go through the bind
+    processors of the column types."""
+    table = cls.__table__
+    preparer = dialect.identifier_preparer
+    columns = {
+        attribute.key: attribute.columns[0] for attribute in inspect(cls).column_attrs
+    }
+    processors = {
+        key: column.type.dialect_impl(dialect).bind_processor(dialect)
+        for key, column in columns.items()
+    }
+
+    for keys, group in groupby(items, key=lambda item: tuple(item.keys())):
+        present = [key for key in keys if key in columns]
+        defaults = []
+        for key, column in columns.items():
+            if key in keys or column.default is None or not column.default.is_scalar:
+                continue
+            processor = processors[key]
+            value = column.default.arg
+            defaults.append((key, processor(value) if processor else value))
+
+        statement = "INSERT INTO {} ({}) VALUES ({})".format(
+            preparer.format_table(table),
+            ", ".join(
+                preparer.format_column(columns[key])
+                for key in present + [key for key, _ in defaults]
+            ),
+            ", ".join("?" * (len(present) + len(defaults))),
+        )
+        # Precompute the (key, processor) pairs of the row tuples.
+        pairs = [(key, processors[key]) for key in present]
+        default_values = tuple(value for _, value in defaults)
+        yield statement, (
+            tuple(
+                processor(item[key]) if processor else item[key]
+                for key, processor in pairs
+            )
+            + default_values
+            for item in group
+        )
+
+
 def consume(lst):
     while len(lst) > 0:
         yield lst.pop()
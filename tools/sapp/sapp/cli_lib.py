@@ -5,8 +5,10 @@
 
 import logging
 import os
+import sys
+from collections import Counter
 from functools import wraps
-from typing import Optional
+from typing import Optional, Tuple
 
 import click
 import click_log
@@ -15,15 +17,20 @@ from click import Parameter, Path, argument, option
 from traitlets.config import Config
 
 from .analysis_output import AnalysisOutput
+from .base_parser import IssueFilter
 from .context import Context, pass_context
-from .database_saver import DatabaseSaver
+from .database_saver import DatabaseSaver, save_run_profile
 from .db import DB
 from .extensions import prompt_extension
 from .filesystem import find_root
+from .handle_store import HandleStore, default_directory, handle_store_path
 from .interactive import Interactive
+from .leaf_distances import ComputeLeafDistances
 from .model_generator import ModelGenerator
 from .models import PrimaryKeyGenerator
 from .pipeline import Pipeline
+from .profiler import Profiler
+from .run_diff import IssueStatus, diff_issues
 from .trim_trace_graph import TrimTraceGraph
 
 
@@ -116,12 +123,20 @@ def explore(ctx: Context):
 @option("--commit-hash", type=str)
 @option("--job-id", type=str)
 @option("--differential-id", type=int)
+@option(
+    "--previous-run-id",
+    type=int,
+    help=(
+        "run whose stored issue handles to compare INPUT_FILE to "
+        "(preferred over --previous-issue-handles and --previous-input)"
+    ),
+)
 @option(
     "--previous-issue-handles",
     type=Path(exists=True),
     help=(
-        "file containing list of issue handles to compare INPUT_FILE to "
-        "(preferred over --previous-input)"
+        "file containing list of issue handles, or issue handle file of a run, "
+        "to compare INPUT_FILE to (preferred over --previous-input)"
     ),
 )
 @option(
@@ -129,6 +144,14 @@ def explore(ctx: Context):
     type=Path(exists=True),
     help="static analysis output to compare INPUT_FILE to",
 )
+@option(
+    "--issue-handles-directory",
+    type=Path(file_okay=False),
+    help=(
+        "directory where the issue handles of each run are stored "
+        "(defaults to next to the SQLite database)"
+    ),
+)
 @option(
     "--linemap",
     type=Path(exists=True),
@@ -139,6 +162,80 @@ def explore(ctx: Context):
     is_flag=True,
     help="store pre/post conditions unrelated to an issue",
 )
+@option(
+    "--streaming",
+    is_flag=True,
+    help="generate issues while parsing to bound memory (reads INPUT_FILE twice)",
+)
+@option(
+    "--spill-conditions",
+    is_flag=True,
+    help=(
+        "keep the parsed pre/postconditions in a temporary file instead of in "
+        "memory (bounds memory by the issues rather than all models)"
+    ),
+)
+@option(
+    "--code",
+    "codes",
+    type=int,
+    multiple=True,
+    help=(
+        "only ingest issues with this code, skipping the others while "
+        "parsing (may be repeated)"
+    ),
+)
+@option(
+    "--reachable-models-only",
+    is_flag=True,
+    help=(
+        "only parse the models reachable from the traces of an issue "
+        "(reads INPUT_FILE twice; ignored with --store-unused-models)"
+    ),
+)
+@option(
+    "--compact-graph",
+    is_flag=True,
+    help="use a trace graph that needs less memory but is slower to build",
+)
+@option(
+    "--fast-sqlite-writes",
+    is_flag=True,
+    help=(
+        "save to SQLite with WAL and without syncing to disk "
+        "(the database may be corrupted if the machine crashes)"
+    ),
+)
+@option(
+    "--index-shared-texts",
+    is_flag=True,
+    help=(
+        "index the callable and filename texts so that substring filters in "
+        "explore are faster (SQLite 3.34 or later; once the database has the "
+        "index, every run keeps it up to date)"
+    ),
+)
+@option(
+    "--leaf-distances",
+    is_flag=True,
+    help=(
+        "store the fewest trace frames from each callable to the sources and "
+        "sinks it reaches (see sapp.models.CallableLeafDistance)"
+    ),
+)
+@option(
+    "--profile",
+    is_flag=True,
+    help=(
+        "store the time, memory and item counts of each step with the run "
+        "(see sapp.models.RunProfile)"
+    ),
+)
+@option(
+    "--profile-trace",
+    type=Path(dir_okay=False),
+    help="write the profile of the steps as Chrome trace events (implies --profile)",
+)
 @argument("input_file", type=Path(exists=True))
 def analyze(
     ctx: Context,
@@ -147,10 +244,22 @@ def analyze(
     commit_hash,
     job_id,
     differential_id,
+    previous_run_id,
     previous_issue_handles,
     previous_input,
+    issue_handles_directory,
     linemap,
     store_unused_models,
+    streaming,
+    spill_conditions,
+    codes,
+    reachable_models_only,
+    compact_graph,
+    fast_sqlite_writes,
+    index_shared_texts,
+    leaf_distances,
+    profile,
+    profile_trace,
     input_file,
 ):
     # Store all options in the right places
@@ -161,13 +270,34 @@ def analyze(
         "commit_hash": commit_hash,
         "old_linemap_file": linemap,
         "store_unused_models": store_unused_models,
+        "streaming": streaming,
+        "spill_conditions": spill_conditions,
+        "reachable_models_only": reachable_models_only,
+        "compact_graph": compact_graph,
+        "issue_handles_directory": (
+            issue_handles_directory or default_directory(ctx.database)
+        ),
     }
 
     if job_id is None and differential_id is not None:
         job_id = "user_input_" + str(differential_id)
     summary_blob["job_id"] = job_id
 
-    if previous_issue_handles:
+    if previous_run_id is not None:
+        directory = summary_blob["issue_handles_directory"]
+        if directory is None or not os.path.exists(
+            handle_store_path(directory, previous_run_id)
+        ):
+            raise click.BadParameter(
+                f"no issue handles stored for run {previous_run_id}",
+                param_hint="--previous-run-id",
+            )
+        summary_blob["previous_issue_handles"] = HandleStore(
+            handle_store_path(directory, previous_run_id)
+        )
+    elif previous_issue_handles and HandleStore.is_handle_store(previous_issue_handles):
+        summary_blob["previous_issue_handles"] = HandleStore(previous_issue_handles)
+    elif previous_issue_handles:
         summary_blob["previous_issue_handles"] = AnalysisOutput.from_file(
             previous_issue_handles
         )
@@ -176,14 +306,69 @@ def analyze(
 
     # Construct pipeline
     input_files = (AnalysisOutput.from_file(input_file), previous_input)
+    issue_filter = IssueFilter.from_codes(codes) if codes else None
     pipeline_steps = [
-        ctx.parser_class(),
+        ctx.parser_class(issue_filter=issue_filter),
         ModelGenerator(),
         TrimTraceGraph(),
-        DatabaseSaver(ctx.database, PrimaryKeyGenerator()),
+        DatabaseSaver(
+            ctx.database,
+            primary_key_generator=PrimaryKeyGenerator(),
+            fast_sqlite_writes=fast_sqlite_writes,
+            index_shared_texts=index_shared_texts,
+        ),
     ]
-    pipeline = Pipeline(pipeline_steps)
-    pipeline.run(input_files, summary_blob)
+    if leaf_distances:
+        pipeline_steps.insert(-1, ComputeLeafDistances())
+    profiler = Profiler() if profile or profile_trace else None
+    pipeline = Pipeline(pipeline_steps, profiler)
+    output = pipeline.run(input_files, summary_blob)
+
+    if profiler is not None:
+        run_summary, _ = output
+        save_run_profile(ctx.database, run_summary.id, profiler)
+        if profile_trace:
+            profiler.write_chrome_trace(profile_trace)
+
+
+@click.command(
+    name="diff-runs",
+    help=(
+        "list the new, fixed and persisting issues of RUN_ID compared to "
+        "BASE_RUN_ID, as lines of JSON"
+    ),
+)
+@pass_context
+@option(
+    "--status",
+    "statuses",
+    type=click.Choice([status.value for status in IssueStatus]),
+    multiple=True,
+    help="only list the issues with this status (can be repeated)",
+)
+@argument("base_run_id", type=int)
+@argument("run_id", type=int)
+def diff_runs(ctx: Context, statuses: Tuple[str, ...], base_run_id: int, run_id: int):
+    counts: Counter = Counter()
+    output = sys.stdout
+    with ctx.database.make_session() as session:
+        try:
+            issues = diff_issues(
+                session,
+                base_run_id,
+                run_id,
+                [IssueStatus(status) for status in statuses],
+            )
+        except ValueError as e:
+            raise click.BadParameter(str(e))
+        for status, issue in issues:
+            counts[status] += 1
+            output.write(issue + "\n")
+    output.flush()
+    logger.info(
+        ", ".join(f"{counts[status]} {status.value}" for status in IssueStatus)
+        + " issues"
+    )
 
 
-commands = [analyze, explore]
+commands = [analyze, explore, diff_runs]
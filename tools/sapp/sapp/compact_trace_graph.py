@@ -0,0 +1,390 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from array import array
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from .bulk_saver import BulkSaver
+from .models import (
+    DBID,
+    IssueInstance,
+    SharedText,
+    SharedTextKind,
+    TraceFrame,
+    TraceKind,
+)
+from .trace_graph import TraceGraph
+
+
+class IntMultimap:
+    """Maps ints to sets of ints, for keys that are (mostly) dense, like the
+    local ids of a run.
+
+    Values are stored CSR style: the values of key k are
+    values[offsets[k - base]:offsets[k - base + 1]], 8 bytes per key and per
+    value instead of a set per key. Values added since the arrays were last
+    built are kept in a dict of lists, which is merged into the arrays once it
+    grows to a fraction of their size, so that building the map stays
+    amortized linear even when adds and lookups are interleaved. Duplicate
+    values are dropped when merging, and the values of a key are sorted.
+    """
+
+    __slots__ = ("_base", "_offsets", "_values", "_recent", "_recent_size")
+
+    MIN_RECENT_SIZE = 1 << 14
+
+    def __init__(self) -> None:
+        self._base = 0
+        self._offsets = array("q", [0])
+        self._values = array("q")
+        self._recent: Dict[int, List[int]] = {}
+        self._recent_size = 0
+
+    def __contains__(self, key: int) -> bool:
+        if key in self._recent:
+            return True
+        index = key - self._base
+        return (
+            0 <= index < len(self._offsets) - 1
+            and self._offsets[index] != self._offsets[index + 1]
+        )
+
+    def get(self, key: int) -> List[int]:
+        index = key - self._base
+        if 0 <= index < len(self._offsets) - 1:
+            values = self._values[
+                self._offsets[index] : self._offsets[index + 1]
+            ].tolist()
+        else:
+            values = []
+        recent = self._recent.get(key)
+        if recent:
+            # Recent values aren't deduplicated until they are compacted.
+            values = list(dict.fromkeys(values + recent))
+        return values
+
+    def add(self, key: int, value: int) -> None:
+        # Checking for duplicates here would cost the number of values of the
+        # key on every add, which is quadratic for keys like the leaf callee
+        # that most trace frames share, so they are only dropped in _compact.
+        recent = self._recent.get(key)
+        if recent is None:
+            self._recent[key] = [value]
+        else:
+            recent.append(value)
+        self._recent_size += 1
+        if self._recent_size > max(self.MIN_RECENT_SIZE, len(self._values) // 4):
+            self._compact()
+
+    def items(self) -> Iterator[Tuple[int, List[int]]]:
+        self._compact()
+        offsets, values = self._offsets, self._values
+        for index in range(len(offsets) - 1):
+            if offsets[index] != offsets[index + 1]:
+                yield self._base + index, values[
+                    offsets[index] : offsets[index + 1]
+                ].tolist()
+
+    def _compact(self) -> None:
+        if not self._recent:
+            return
+        recent = self._recent
+        old_base, old_offsets, old_values = self._base, self._offsets, self._values
+        old_end = old_base + len(old_offsets) - 1
+        keys = sorted(recent)
+
+        if len(old_values) == 0:
+            old_base = old_end = keys[0]
+        if keys[0] >= old_end:
+            # New keys only come after the existing ones (ids are handed out
+            # in increasing order), so the arrays can just be extended.
+            last = old_offsets[-1]
+            for key in range(old_end, keys[-1] + 1):
+                values = recent.get(key)
+                if values:
+                    values = sorted(set(values))
+                    old_values.extend(values)
+                    last += len(values)
+                old_offsets.append(last)
+            self._base = old_base
+        else:
+            base = min(old_base, keys[0])
+            end = max(old_end, keys[-1] + 1)
+            offsets = array("q", [0])
+            values = array("q")
+            old_rows = len(old_offsets) - 1
+            key = base
+            for recent_key in keys + [end]:
+                # The rows up to the next recent key are copied over in bulk:
+                # the empty ones before the old rows, the old ones, and the
+                # empty ones after them.
+                start = min(max(key - old_base, 0), old_rows)
+                stop = min(max(recent_key - old_base, 0), old_rows)
+                offsets.extend(
+                    array("q", [len(values)]) * max(0, min(recent_key, old_base) - key)
+                )
+                shift = len(values) - old_offsets[start]
+                values.extend(old_values[old_offsets[start] : old_offsets[stop]])
+                copied = old_offsets[start + 1 : stop + 1]
+                offsets.extend(array("q", [offset + shift for offset in copied]))
+                offsets.extend(
+                    array("q", [len(values)]) * max(0, recent_key - max(key, old_end))
+                )
+                if recent_key == end:
+                    break
+                row = set(recent[recent_key])
+                index = recent_key - old_base
+                if 0 <= index < old_rows:
+                    row.update(old_values[old_offsets[index] : old_offsets[index + 1]])
+                values.extend(sorted(row))
+                offsets.append(len(values))
+                key = recent_key + 1
+            self._base, self._offsets, self._values = base, offsets, values
+
+        self._recent = {}
+        self._recent_size = 0
+
+
+class Interner:
+    """Assigns consecutive ints to strings, and keeps one copy of each."""
+
+    __slots__ = ("_ids", "_strings")
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+        self._strings: List[str] = []
+
+    def intern(self, string: str) -> int:
+        id = self._ids.get(string)
+        if id is None:
+            id = len(self._strings)
+            self._ids[string] = id
+            self._strings.append(string)
+        return id
+
+    def lookup(self, string: str) -> int:
+        """The id of the string, or -1 if it was never interned."""
+        return self._ids.get(string, -1)
+
+    def __getitem__(self, id: int) -> str:
+        return self._strings[id]
+
+
+# A trace frame's leaves are stored as leaf_id * DEPTH_LIMIT + depth.
+DEPTH_LIMIT = 1 << 20
+# A (callable, port) pair is keyed as callable local id * PORT_LIMIT + port id.
+PORT_LIMIT = 1 << 24
+
+
+class CompactTraceGraph(TraceGraph):
+    """A TraceGraph that uses much less memory for its edges and assocs.
+
+    Ports are interned, (callable, port) pairs are numbered, and the
+    caller/callee edges and the trace frame/leaf/issue instance assocs are
+    IntMultimaps instead of dicts of sets. The issue, issue instance, trace
+    frame and shared text records are the same records as in TraceGraph.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._ports = Interner()
+        # (callable, port) key -> consecutive node id.
+        self._nodes: Dict[int, int] = {}
+
+        self._caller_frames = IntMultimap()  # caller node -> trace frame ids
+        self._callee_frames = IntMultimap()  # callee node -> trace frame ids
+        self._frame_leaves = IntMultimap()  # trace frame id -> encoded leaves
+        self._frame_instances = IntMultimap()
+        self._instance_frames = IntMultimap()
+        self._instance_texts = IntMultimap()
+        self._text_instances = IntMultimap()
+        # Filenames are numbered too, as they are few and far between among the
+        # local ids.
+        self._files: Dict[int, int] = {}
+        self._file_instances = IntMultimap()
+        self._file_frames = IntMultimap()
+
+    def _node(self, callable_id: DBID, port: str) -> int:
+        """The node of (callable_id, port), or -1 if there is none yet."""
+        port_id = self._ports.lookup(port)
+        if port_id == -1:
+            return -1
+        return self._nodes.get(callable_id.local_id * PORT_LIMIT + port_id, -1)
+
+    def _add_node(self, callable_id: DBID, port: str) -> Tuple[int, str]:
+        """Returns the node of (callable_id, port), and the interned port."""
+        port_id = self._ports.intern(port)
+        assert port_id < PORT_LIMIT, f"More than {PORT_LIMIT} distinct ports"
+        key = callable_id.local_id * PORT_LIMIT + port_id
+        node = self._nodes.get(key)
+        if node is None:
+            node = len(self._nodes)
+            self._nodes[key] = node
+        return node, self._ports[port_id]
+
+    def _add_file(self, filename_id: DBID) -> int:
+        file = self._files.get(filename_id.local_id)
+        if file is None:
+            file = len(self._files)
+            self._files[filename_id.local_id] = file
+        return file
+
+    def _frames_of_node(self, frames: IntMultimap, node: int) -> List[TraceFrame]:
+        if node == -1:
+            return []
+        return [self._trace_frames[id] for id in frames.get(node)]
+
+    def add_issue_instance(self, instance: IssueInstance) -> None:
+        assert (
+            instance.id.local_id not in self._issue_instances
+        ), "Instance already exists"
+        self._issue_instances[instance.id.local_id] = instance
+        self._file_instances.add(
+            self._add_file(instance.filename_id), instance.id.local_id
+        )
+
+    def get_issue_instance_ids_in_file(self, filename_id: int) -> Iterable[int]:
+        file = self._files.get(filename_id)
+        return () if file is None else self._file_instances.get(file)
+
+    def get_trace_frame_ids_in_file(self, filename_id: int) -> Iterable[int]:
+        file = self._files.get(filename_id)
+        return () if file is None else self._file_frames.get(file)
+
+    def has_postconditions_with_caller(self, caller_id: DBID, caller_port: str) -> bool:
+        return any(
+            frame.kind == TraceKind.POSTCONDITION
+            for frame in self.get_trace_frames_from_caller(caller_id, caller_port)
+        )
+
+    def has_preconditions_with_caller(self, caller_id: DBID, caller_port: str) -> bool:
+        return any(
+            frame.kind == TraceKind.PRECONDITION
+            for frame in self.get_trace_frames_from_caller(caller_id, caller_port)
+        )
+
+    def add_trace_frame(self, trace_frame: TraceFrame) -> None:
+        id = trace_frame.id.local_id
+        caller, caller_port = self._add_node(
+            trace_frame.caller_id, trace_frame.caller_port
+        )
+        callee, callee_port = self._add_node(
+            trace_frame.callee_id, trace_frame.callee_port
+        )
+        self._caller_frames.add(caller, id)
+        self._callee_frames.add(callee, id)
+        self._file_frames.add(self._add_file(trace_frame.filename_id), id)
+        # Keep a single copy of each port string.
+        if (
+            caller_port is not trace_frame.caller_port
+            or callee_port is not trace_frame.callee_port
+        ):
+            trace_frame = trace_frame._replace(
+                caller_port=caller_port, callee_port=callee_port
+            )
+        self._trace_frames[id] = trace_frame
+
+    def has_trace_frame_with_caller(self, caller_id: DBID, caller_port: str) -> bool:
+        return self._node(caller_id, caller_port) in self._caller_frames
+
+    def get_trace_frames_from_caller(
+        self, caller_id: DBID, caller_port: str
+    ) -> List[TraceFrame]:
+        return self._frames_of_node(
+            self._caller_frames, self._node(caller_id, caller_port)
+        )
+
+    def get_trace_frames_from_callee(
+        self, callee_id: DBID, callee_port: str
+    ) -> List[TraceFrame]:
+        return self._frames_of_node(
+            self._callee_frames, self._node(callee_id, callee_port)
+        )
+
+    def add_trace_frame_leaf_assoc(
+        self, trace_frame: TraceFrame, leaf: SharedText, depth: int
+    ) -> None:
+        assert 0 <= depth < DEPTH_LIMIT, f"Trace length {depth} is too long"
+        self._frame_leaves.add(
+            trace_frame.id.local_id, leaf.id.local_id * DEPTH_LIMIT + depth
+        )
+
+    def get_trace_frame_leaf_ids(self, trace_frame: TraceFrame) -> Set[int]:
+        return {
+            leaf // DEPTH_LIMIT
+            for leaf in self._frame_leaves.get(trace_frame.id.local_id)
+        }
+
+    def get_trace_frame_leaf_ids_with_depths(
+        self, trace_frame: TraceFrame
+    ) -> Set[Tuple[int, int]]:
+        return {
+            divmod(leaf, DEPTH_LIMIT)
+            for leaf in self._frame_leaves.get(trace_frame.id.local_id)
+        }
+
+    def add_issue_instance_trace_frame_assoc(
+        self, instance: IssueInstance, trace_frame: TraceFrame
+    ) -> None:
+        self._instance_frames.add(instance.id.local_id, trace_frame.id.local_id)
+        self._frame_instances.add(trace_frame.id.local_id, instance.id.local_id)
+
+    def get_issue_instance_trace_frame_ids(self, instance_id: int) -> Iterable[int]:
+        return self._instance_frames.get(instance_id)
+
+    def get_trace_frame_issue_instance_ids(self, trace_frame_id: int) -> Iterable[int]:
+        return self._frame_instances.get(trace_frame_id)
+
+    def get_issue_instance_trace_frames(
+        self, instance: IssueInstance
+    ) -> List[TraceFrame]:
+        return [
+            self._trace_frames[id]
+            for id in self._instance_frames.get(instance.id.local_id)
+        ]
+
+    def add_issue_instance_shared_text_assoc(
+        self, instance: IssueInstance, shared_text: SharedText
+    ) -> None:
+        self._instance_texts.add(instance.id.local_id, shared_text.id.local_id)
+        self._text_instances.add(shared_text.id.local_id, instance.id.local_id)
+
+    def get_issue_instance_shared_text_ids(self, instance_id: int) -> Iterable[int]:
+        return self._instance_texts.get(instance_id)
+
+    def get_issue_instance_shared_texts(
+        self, instance_id: int, kind: SharedTextKind
+    ) -> List[SharedText]:
+        return [
+            self._shared_texts[id]
+            for id in self._instance_texts.get(instance_id)
+            if self._shared_texts[id].kind == kind
+        ]
+
+    def _save_issue_instance_trace_frame_assoc(self, bulk_saver: BulkSaver) -> None:
+        for trace_frame_id, instance_ids in self._frame_instances.items():
+            for instance_id in instance_ids:
+                bulk_saver.add_issue_instance_trace_frame_assoc(
+                    self._issue_instances[instance_id],
+                    self._trace_frames[trace_frame_id],
+                )
+
+    def _save_trace_frame_leaf_assoc(self, bulk_saver: BulkSaver) -> None:
+        for trace_frame_id, leaves in self._frame_leaves.items():
+            for leaf in leaves:
+                leaf_id, depth = divmod(leaf, DEPTH_LIMIT)
+                bulk_saver.add_trace_frame_leaf_assoc(
+                    self._shared_texts[leaf_id],
+                    self._trace_frames[trace_frame_id],
+                    depth,
+                )
+
+    def _save_issue_instance_shared_text_assoc(self, bulk_saver: BulkSaver) -> None:
+        for shared_text_id, instance_ids in self._text_instances.items():
+            for instance_id in instance_ids:
+                bulk_saver.add_issue_instance_shared_text_assoc(
+                    self._issue_instances[instance_id],
+                    self._shared_texts[shared_text_id],
+                )
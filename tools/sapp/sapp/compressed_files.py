@@ -0,0 +1,241 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Reading analysis output compressed with gzip, bzip2 or xz, by extension,
+without decompressing it to disk.
+
+Compressed files can only be read from the start. Those made of several
+compressed members (blocks), each starting where the previous one ends, can
+also be read from the start of any member; readers seek through a table of
+the (compressed offset, decompressed offset) of each member. Such files are
+written by write_blocks, bgzip, pbzip2 or `cat`-ing compressed chunks. Offsets
+elsewhere (indexes, byte ranges) are always into the decompressed data.
+"""
+
+import bisect
+import gzip
+import io
+import os
+import zlib
+from typing import IO, Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+try:
+    import bz2
+except ImportError:  # Python built without bzip2
+    bz2 = None
+
+try:
+    import lzma
+except ImportError:  # Python built without liblzma
+    lzma = None
+
+
+# (compressed offset, decompressed offset) of the start of a member.
+Block = Tuple[int, int]
+
+CHUNK_SIZE = 1 << 16
+
+
+def _codecs() -> Dict[str, Tuple[Any, Callable[[], Any], Callable[[bytes], bytes]]]:
+    """The module, a new decompressor, and a compress function of each
+    extension."""
+    codecs: Dict[str, Tuple[Any, Callable[[], Any], Callable[[bytes], bytes]]] = {
+        ".gz": (
+            gzip,
+            lambda: zlib.decompressobj(zlib.MAX_WBITS | 16),
+            gzip.compress,
+        )
+    }
+    if bz2 is not None:
+        codecs[".bz2"] = (bz2, bz2.BZ2Decompressor, bz2.compress)
+    if lzma is not None:
+        codecs[".xz"] = (lzma, lzma.LZMADecompressor, lzma.compress)
+    return codecs
+
+
+CODECS = _codecs()
+
+
+def compression(path: str) -> Optional[str]:
+    """The compressed extension of path, if it has one of the supported ones."""
+    extension = os.path.splitext(path)[1]
+    if extension in CODECS:
+        return extension
+    if extension in [".bz2", ".xz"]:
+        raise ValueError(f"{path}: Python was built without support for {extension}")
+    return None
+
+
+def open_file(path: str, mode: str = "r") -> IO[Any]:
+    """Opens path for streaming, decompressing it if it is compressed. Mode is
+    "r" (text) or "rb"."""
+    extension = compression(path)
+    if extension is None:
+        return open(path, mode)
+    module, _, _ = CODECS[extension]
+    return module.open(path, "rt" if mode == "r" else mode)
+
+
+def open_seekable(path: str, blocks: Optional[List[Block]] = None) -> IO[bytes]:
+    """Opens path in binary mode. For a compressed file, seeking goes through
+    the table of its members, which is found while reading it unless it is
+    given (see BlockReader)."""
+    if compression(path) is None:
+        return open(path, "rb")
+    return io.BufferedReader(BlockReader(path, blocks), CHUNK_SIZE)
+
+
+def blocks_of(handle: IO[bytes]) -> Optional[List[Block]]:
+    """The member table of a handle from open_seekable, None if the file isn't
+    compressed. Complete once the handle was read to the end."""
+    raw = getattr(handle, "raw", None)
+    return raw.blocks if isinstance(raw, BlockReader) else None
+
+
+def find_blocks(path: str) -> Optional[List[Block]]:
+    """The member table of path, None if it isn't compressed. Decompresses the
+    whole file."""
+    if compression(path) is None:
+        return None
+    with open_seekable(path) as handle:
+        while handle.read(CHUNK_SIZE * 16):
+            pass
+        return blocks_of(handle)
+
+
+def write_blocks(
+    path: str, lines: Iterable[bytes], block_size: int = 1 << 20
+) -> List[Block]:
+    """Writes lines compressed by the extension of path, as a member per
+    block_size bytes or so of lines, so that readers can seek to any member.
+    Returns the member table."""
+    extension = compression(path)
+    if extension is None:
+        raise ValueError(f"{path} doesn't have a compressed extension")
+    _, _, compress = CODECS[extension]
+    blocks: List[Block] = []
+    offset = decompressed_offset = 0
+    pending: List[bytes] = []
+    pending_size = 0
+    with open(path, "wb") as f:
+
+        def write_block() -> None:
+            nonlocal offset, decompressed_offset, pending, pending_size
+            blocks.append((offset, decompressed_offset))
+            offset += f.write(compress(b"".join(pending)))
+            decompressed_offset += pending_size
+            pending, pending_size = [], 0
+
+        for line in lines:
+            pending.append(line)
+            pending_size += len(line)
+            if pending_size >= block_size:
+                write_block()
+        if pending or not blocks:
+            write_block()
+    return blocks
+
+
+class BlockReader(io.RawIOBase):
+    """Decompresses a file of one or more compressed members, keeping the
+    table of where each member starts. Seeking goes to the start of the
+    closest member before the offset and decompresses from there. Until the
+    whole table is known (from reading to the end, or given), seeking past
+    the members found so far decompresses up to the offset."""
+
+    def __init__(self, path: str, blocks: Optional[List[Block]] = None) -> None:
+        super().__init__()
+        extension = compression(path)
+        assert extension is not None
+        self.path = path
+        self._new_decompressor: Callable[[], Any] = CODECS[extension][1]
+        self._file: IO[bytes] = open(path, "rb")
+        self.blocks: List[Block] = list(blocks) if blocks else [(0, 0)]
+        self._block_starts: List[int] = [start for _, start in self.blocks]
+        self._start_block(self.blocks[0])
+
+    def _start_block(self, block: Block) -> None:
+        compressed_offset, decompressed_offset = block
+        self._file.seek(compressed_offset)
+        self._file_offset = compressed_offset
+        self._decompressor = self._new_decompressor()
+        self._input = b""
+        self._buffer = b""
+        self._buffer_position = 0
+        # The decompressed offset of the end of the buffer.
+        self._end = decompressed_offset
+
+    def _read_input(self) -> None:
+        self._input = self._file.read(CHUNK_SIZE)
+        self._file_offset += len(self._input)
+
+    def _fill(self) -> bool:
+        """Decompresses more into the (consumed) buffer. False at the end."""
+        while True:
+            if self._decompressor.eof:
+                self._input = self._decompressor.unused_data + self._input
+                if not self._input:
+                    self._read_input()
+                    if not self._input:
+                        return False
+                self._decompressor = self._new_decompressor()
+                block = (self._file_offset - len(self._input), self._end)
+                if block[1] > self._block_starts[-1]:
+                    self.blocks.append(block)
+                    self._block_starts.append(block[1])
+            if not self._input:
+                self._read_input()
+                if not self._input:
+                    raise EOFError(f"{self.path} ended in the middle of a member")
+            data = self._decompressor.decompress(self._input)
+            self._input = b""
+            if data:
+                self._buffer, self._buffer_position = data, 0
+                self._end += len(data)
+                return True
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        if self._buffer_position == len(self._buffer) and not self._fill():
+            return 0
+        size = min(len(buffer), len(self._buffer) - self._buffer_position)
+        buffer[:size] = self._buffer[
+            self._buffer_position : self._buffer_position + size
+        ]
+        self._buffer_position += size
+        return size
+
+    def tell(self) -> int:
+        return self._end - len(self._buffer) + self._buffer_position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.tell()
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("can only seek from the start or current")
+        block = self.blocks[bisect.bisect_right(self._block_starts, offset) - 1]
+        position = self.tell()
+        if offset < position or block[1] > position:
+            self._start_block(block)
+        # Skip forward within the member.
+        while True:
+            start = self._end - len(self._buffer)
+            if offset <= self._end:
+                self._buffer_position = offset - start
+                return offset
+            if not self._fill():
+                self._buffer_position = len(self._buffer)
+                return self.tell()
+
+    def close(self) -> None:
+        if not self.closed:
+            self._file.close()
+        super().close()
@@ -0,0 +1,124 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Parsed pre/postcondition entries kept in a temporary SQLite file instead
+of in memory, so that the memory of ingestion doesn't grow with the number of
+models in the analysis output. Most models are never reached from an issue,
+and are only counted as dropped.
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import weakref
+from itertools import groupby
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+
+
+log: logging.Logger = logging.getLogger("sapp")
+
+Key = Tuple[str, str]  # (caller, caller port)
+Entry = Dict[str, Any]
+
+
+class ConditionStore:
+    """The entries of preconditions or postconditions by (caller, caller
+    port), like the dict of lists the parser builds otherwise. It supports
+    what the pipeline does with those: appending entries while parsing,
+    popping the entries of a key while generating traces, and going over the
+    entries that were never popped.
+
+    Only the entries that are popped are in memory. The file is removed when
+    the store is closed or garbage collected.
+    """
+
+    BATCH_SIZE = 10000
+
+    def __init__(self, directory: Optional[str] = None) -> None:
+        fd, self.path = tempfile.mkstemp(suffix=".conditions", dir=directory)
+        os.close(fd)
+        self._finalizer = weakref.finalize(self, os.remove, self.path)
+        self._connection = sqlite3.connect(self.path, isolation_level=None)
+        # The file is thrown away if anything goes wrong.
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+        self._pending: List[Tuple[str, str, bytes]] = []
+        self._indexed = False
+        self.num_entries = 0
+
+        self._connection.execute(
+            "CREATE TABLE entries (caller TEXT, caller_port TEXT, entry BLOB)"
+        )
+
+    def append(self, key: Key, entry: Entry) -> None:
+        caller, caller_port = key
+        self._pending.append(
+            (caller, caller_port, pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+        )
+        self.num_entries += 1
+        if len(self._pending) >= self.BATCH_SIZE:
+            self._write_pending()
+
+    def _write_pending(self) -> None:
+        self._connection.execute("BEGIN")
+        self._connection.executemany(
+            "INSERT INTO entries VALUES (?, ?, ?)", self._pending
+        )
+        self._connection.execute("COMMIT")
+        self._pending = []
+
+    def _flush(self) -> None:
+        """Writes the appended entries and indexes them, before they are read."""
+        if self._pending:
+            self._write_pending()
+        if not self._indexed:
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_key "
+                "ON entries (caller, caller_port)"
+            )
+            self._indexed = True
+
+    def pop(self, key: Key, default: Any = None) -> Any:
+        self._flush()
+        entries = [
+            pickle.loads(entry)
+            for (entry,) in self._connection.execute(
+                "SELECT entry FROM entries WHERE caller = ? AND caller_port = ? "
+                "ORDER BY rowid",
+                key,
+            )
+        ]
+        if not entries:
+            return default
+        self._connection.execute(
+            "DELETE FROM entries WHERE caller = ? AND caller_port = ?", key
+        )
+        self.num_entries -= len(entries)
+        return entries
+
+    def items(self) -> Iterator[Tuple[Key, List[Entry]]]:
+        """The entries that were not popped, by key, in the order of keys."""
+        self._flush()
+        rows = self._connection.execute(
+            "SELECT caller, caller_port, entry FROM entries "
+            "ORDER BY caller, caller_port, rowid"
+        )
+        for key, group in groupby(rows, key=lambda row: (row[0], row[1])):
+            yield key, [pickle.loads(entry) for _, _, entry in group]
+
+    def close(self) -> None:
+        self._connection.close()
+        self._finalizer()
+
+
+Conditions = Union[Mapping[Key, List[Entry]], ConditionStore]
+
+
+def count_entries(conditions: Conditions) -> int:
+    if isinstance(conditions, ConditionStore):
+        return conditions.num_entries
+    return sum(len(entries) for entries in conditions.values())
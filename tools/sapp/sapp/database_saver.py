@@ -5,24 +5,33 @@
 
 #!/usr/bin/env python3
 
+import json
 import logging
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
+from . import profiler
 from .bulk_saver import BulkSaver
+from .condition_store import count_entries
 from .db import DB
 from .decorators import log_time
+from .handle_store import HandleStore, handle_store_path
 from .models import (
     Issue,
     IssueInstanceSharedTextAssoc,
     PrimaryKeyGenerator,
     Run,
+    RunIssueCounts,
+    RunProfile,
     RunStatus,
     RunSummary,
+    SharedText,
     TraceFrame,
     TraceFrameAnnotation,
     TraceKind,
 )
 from .pipeline import PipelineStep, Summary
+from .profiler import Profiler
+from .shared_text_index import SharedTextIndex
 from .trace_graph import TraceGraph
 
 
@@ -37,13 +46,20 @@ class DatabaseSaver(PipelineStep[TraceGraph, RunSummary]):
         database: DB,
         use_lock: bool = False,
         primary_key_generator: Optional[PrimaryKeyGenerator] = None,
+        fast_sqlite_writes: bool = False,
+        index_shared_texts: bool = False,
     ):
         self.use_lock = use_lock
         self.dbname = database.dbname
         self.database = database
         self.primary_key_generator = primary_key_generator or PrimaryKeyGenerator()
-        self.bulk_saver = BulkSaver(self.primary_key_generator)
+        self.bulk_saver = BulkSaver(
+            self.primary_key_generator, fast_sqlite_writes=fast_sqlite_writes
+        )
         self.summary: Summary
+        # Create the shared text index if the database doesn't have it yet.
+        self.index_shared_texts = index_shared_texts
+        self.new_indexed_texts: List[SharedText] = []
 
     @log_time
     def run(self, input: TraceGraph, summary: Summary) -> Tuple[RunSummary, Summary]:
@@ -60,16 +76,24 @@ class DatabaseSaver(PipelineStep[TraceGraph, RunSummary]):
         """
         log.info("Preparing bulk save.")
         self.graph.update_bulk_saver(self.bulk_saver)
+        # The ids of these are only known to be new once they are saved.
+        self.new_indexed_texts = [
+            text
+            for text in self.bulk_saver.get_items_to_add(SharedText)
+            if text.kind in SharedTextIndex.KINDS
+        ]
+        # Computed by ComputeLeafDistances, if it ran.
+        self.bulk_saver.add_all(self.summary.pop("callable_leaf_distances", []))
 
         log.info(
             "Dropped %d unused preconditions, %d are missing",
-            sum(len(v) for v in self.summary["precondition_entries"].values()),
+            count_entries(self.summary["precondition_entries"]),
             len(self.summary["missing_preconditions"]),
         )
 
         log.info(
             "Dropped %d unused postconditions, %d are missing",
-            sum(len(v) for v in self.summary["postcondition_entries"].values()),
+            count_entries(self.summary["postcondition_entries"]),
             len(self.summary["missing_postconditions"]),
         )
         del self.summary["postcondition_entries"]
@@ -100,10 +124,17 @@ class DatabaseSaver(PipelineStep[TraceGraph, RunSummary]):
             num_post,
         )
 
+        # The ids of the run and of everything saved by the bulk saver are
+        # reserved at once, so that save_all doesn't reserve them again.
+        with profiler.phase("reserve primary keys"):
+            with self.database.make_session() as session:
+                pk_gen = self.primary_key_generator.reserve(
+                    session,
+                    [Run, *self.bulk_saver.saving_classes()],
+                    self.bulk_saver.item_counts(),
+                    use_lock=self.use_lock,
+                )
         with self.database.make_session() as session:
-            pk_gen = self.primary_key_generator.reserve(
-                session, [Run], use_lock=self.use_lock
-            )
             self.summary["run"].id.resolve(id=pk_gen.get(Run), is_new=True)
             session.add(self.summary["run"])
             session.commit()
@@ -113,6 +144,24 @@ class DatabaseSaver(PipelineStep[TraceGraph, RunSummary]):
 
         self.bulk_saver.save_all(self.database, self.use_lock)
 
+        # Count the issues of the run once, so that summaries don't scan them.
+        with profiler.phase("count issues"):
+            with self.database.make_session() as session:
+                RunIssueCounts.compute(session, run_id)
+                session.commit()
+
+        with profiler.phase("index shared texts"):
+            self._index_shared_texts()
+
+        # Store the handles of all issues of the run, so that the next run can
+        # be compared to this one with --previous-run-id.
+        issue_handles_directory = self.summary.get("issue_handles_directory")
+        if issue_handles_directory and self.summary.get("issue_handles") is not None:
+            HandleStore.write(
+                handle_store_path(issue_handles_directory, run_id),
+                self.summary["issue_handles"],
+            )
+
         # Now that the run is finished, fetch it from the DB again and set its
         # status to FINISHED.
         with self.database.make_session() as session:
@@ -131,3 +180,26 @@ class DatabaseSaver(PipelineStep[TraceGraph, RunSummary]):
         )
 
         return run_summary
+
+    def _index_shared_texts(self) -> None:
+        with self.database.make_session() as session:
+            if SharedTextIndex.exists(session):
+                SharedTextIndex.add(
+                    session,
+                    (
+                        (text.id.resolved(), text.contents)
+                        for text in self.new_indexed_texts
+                        if text.id.is_new
+                    ),
+                )
+            elif self.index_shared_texts:
+                SharedTextIndex.create(session)
+            session.commit()
+        self.new_indexed_texts = []
+
+
+def save_run_profile(database: DB, run_id: int, profiler: Profiler) -> None:
+    """Stores the summary of the profile of the pipeline that saved the run."""
+    with database.make_session() as session:
+        session.add(RunProfile(run_id=run_id, profile=json.dumps(profiler.summary())))
+        session.commit()
@@ -8,13 +8,14 @@ This file defines the underlying db used by SAPP library.
 """
 
 import logging
+import time
 from contextlib import contextmanager
-from typing import Iterator
+from typing import Any, Iterator
 
 import sqlalchemy
-from sqlalchemy.exc import OperationalError
-from sqlalchemy.orm import Session, scoped_session, sessionmaker
-from sqlalchemy.pool import AssertionPool
+from sqlalchemy.exc import DisconnectionError, OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AssertionPool, SingletonThreadPool
 
 from . import errors, models
 from .decorators import retryable
@@ -36,6 +37,15 @@ class DB(object):
     """File-based DB when using SQLITE"""
     DEFAULT_DB_FILE = "sapp.db"
 
+    """Connections kept open by the pool; for SQLite, one per thread"""
+    POOL_SIZE = 5
+
+    """Connections idle for longer are pinged before being handed out"""
+    PING_AFTER_IDLE_SECONDS = 30.0
+
+    """Applied to each SQLite connection when it is opened"""
+    SQLITE_PRAGMAS = {"cache_size": -65536, "temp_store": "MEMORY"}
+
     def __init__(
         self, dbtype, dbname=None, debug=False, read_only=False, assertions=False
     ):
@@ -45,31 +55,50 @@ class DB(object):
         self.read_only = read_only
         self.assertions = assertions
 
+        # Sessions opened and closed so far, the seconds spent doing so, and
+        # the idle connections pinged.
+        self.session_count = 0
+        self.session_overhead = 0.0
+        self.ping_count = 0
+
         self.poolclass = assertions and AssertionPool or None
+        self.pool_args = {} if assertions else {"pool_size": self.POOL_SIZE}
+        # SQLite connections are kept per thread (the same connection in-memory
+        # databases always used) rather than reopened for every session.
+        sqlite_poolclass = self.poolclass or SingletonThreadPool
 
         if dbtype == DBType.MEMORY:
             self.engine = sqlalchemy.create_engine(
                 sqlalchemy.engine.url.URL("sqlite", database=":memory:"),
                 echo=debug,
-                poolclass=self.poolclass,
+                poolclass=sqlite_poolclass,
+                **self.pool_args,
             )
         elif dbtype == DBType.SQLITE:
             self.engine = sqlalchemy.create_engine(
                 sqlalchemy.engine.url.URL("sqlite", database=self.dbname),
                 echo=debug,
-                poolclass=self.poolclass,
+                poolclass=sqlite_poolclass,
+                **self.pool_args,
             )
         elif dbtype == DBType.XDB:
             self._create_xdb_engine()
         else:
             raise errors.AIException("Invalid db type: " + dbtype)
 
+        sqlalchemy.event.listen(self.engine, "connect", self._on_connect)
+        sqlalchemy.event.listen(self.engine, "checkin", self._on_checkin)
+        sqlalchemy.event.listen(self.engine, "checkout", self._on_checkout)
+        self.sessionmaker = sessionmaker(bind=self.engine)
+
         try:
             models.create(self.engine)
         except sqlalchemy.exc.NoSuchTableError:
             pass
 
     def _create_xdb_engine(self):
+        """Sets self.engine, created with self.poolclass (the default QueuePool
+        unless assertions are on) and self.pool_args."""
         raise NotImplementedError
 
     @contextmanager
@@ -82,21 +111,54 @@ class DB(object):
 
     @retryable(num_tries=2, retryable_exs=[OperationalError])
     def make_session_object(self, *args, **kwargs):
-        # use scoped_session so sessionmaker generates the same session in
-        # different threads. This is useful for UTs.
-        session = scoped_session(sessionmaker(bind=self.engine))(*args, **kwargs)
-        ping_db(session)
-        if self.dbtype == DBType.XDB:
-            # Make sure SQL doesn't quit on us after 10s. Sometimes merging data takes
-            # longer.
-            session.execute("SET SESSION wait_timeout = %d" % 30)
-
+        start = time.monotonic()
+        session = self.sessionmaker(*args, **kwargs)
+        self.session_count += 1
+        self.session_overhead += time.monotonic() - start
         return session
 
     @retryable(num_tries=2, retryable_exs=[OperationalError])
     def close_session(self, session):
+        start = time.monotonic()
         session.close()
+        self.session_overhead += time.monotonic() - start
 
-
-def ping_db(session):
-    session.execute("SELECT 1")
+    def _on_connect(self, dbapi_connection: Any, _connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            if self.dbtype == DBType.XDB:
+                # Make sure SQL doesn't quit on us after 10s. Sometimes merging
+                # data takes longer.
+                cursor.execute("SET SESSION wait_timeout = %d" % 30)
+            else:
+                for pragma, value in self.SQLITE_PRAGMAS.items():
+                    cursor.execute(f"PRAGMA {pragma} = {value}")
+        finally:
+            cursor.close()
+
+    def _on_checkin(self, _dbapi_connection: Any, connection_record: Any) -> None:
+        if connection_record is not None:
+            connection_record.info["checked_in"] = time.monotonic()
+
+    def _on_checkout(
+        self, dbapi_connection: Any, connection_record: Any, _connection_proxy: Any
+    ) -> None:
+        """Pings connections that were idle for a while, so that one the server
+        dropped is replaced (the pool retries on DisconnectionError) instead of
+        failing the first query of a session."""
+        checked_in = connection_record.info.get("checked_in")
+        if (
+            checked_in is None
+            or time.monotonic() - checked_in <= self.PING_AFTER_IDLE_SECONDS
+        ):
+            return
+        start = time.monotonic()
+        self.ping_count += 1
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except self.engine.dialect.dbapi.Error as e:
+            raise DisconnectionError(f"Idle connection is gone: {e}") from e
+        finally:
+            cursor.close()
+            self.session_overhead += time.monotonic() - start
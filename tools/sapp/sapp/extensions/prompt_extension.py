@@ -49,3 +49,9 @@ class CustomPrompt(Prompts, Magics):
 def load_ipython_extension(ipython: InteractiveShell) -> None:
     # pyre-fixme[16]: `InteractiveShell` has no attribute `prompts`.
     ipython.prompts = CustomPrompt(ipython)
+
+    interactive = ipython.user_ns[Interactive.SELF_SCOPE_KEY]
+    ipython.events.register("pre_run_cell", lambda _info: interactive.start_command())
+    ipython.events.register(
+        "post_run_cell", lambda _result: interactive.finish_command()
+    )
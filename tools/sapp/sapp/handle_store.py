@@ -0,0 +1,99 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""A compact file of the issue handles of a run, so that a later run can tell
+which of its issues are new without re-parsing the previous analysis output.
+
+The file holds the sorted 64 bit hashes of the master handles and the diff
+handles (see BaseParser.compute_diff_handle) of every issue of the run:
+
+    header      MAGIC, number of hashes
+    hashes      sorted unique uint64 hashes
+
+It is read through mmap and searched by bisection, so a membership check
+only touches a few pages of it, and the handles are never loaded into a set.
+"""
+
+import logging
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+import xxhash
+
+from .db import DB, DBType
+
+
+log: logging.Logger = logging.getLogger("sapp")
+
+SUFFIX = ".issue-handles"
+
+MAGIC = b"SAPPHDL1"
+HEADER = struct.Struct("<8sQ")
+
+
+def default_directory(database: DB) -> Optional[str]:
+    """Where the handles of the runs saved to database are stored by default,
+    or None if they aren't (e.g. for an in memory database)."""
+    if database.dbtype == DBType.SQLITE:
+        return database.dbname + SUFFIX
+    return None
+
+
+def handle_store_path(directory: str, run_id: int) -> str:
+    return os.path.join(directory, f"{run_id}{SUFFIX}")
+
+
+class HandleStore:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not an issue handle file")
+        self._hashes = memoryview(self._mmap)[HEADER.size :].cast("Q")
+
+    @staticmethod
+    def hash(handle: str) -> int:
+        return xxhash.xxh64_intdigest(handle.encode())
+
+    @staticmethod
+    def is_handle_store(path: str) -> bool:
+        if not os.path.isfile(path):
+            return False
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+
+    @classmethod
+    def write(cls, path: str, hashes: Iterable[int]) -> None:
+        """Writes the hashes atomically, so that a reader never sees a partial
+        file."""
+        sorted_hashes = array("Q", sorted(set(hashes)))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(sorted_hashes)))
+            f.write(sorted_hashes.tobytes())
+        os.replace(temporary_path, path)
+        log.info("Wrote %d issue handles to %s", len(sorted_hashes), path)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, handle: object) -> bool:
+        if not isinstance(handle, str):
+            return False
+        handle_hash = self.hash(handle)
+        index = bisect_left(self._hashes, handle_hash)
+        return index < self._size and self._hashes[index] == handle_hash
+
+    def close(self) -> None:
+        self._hashes.release()
+        self._mmap.close()
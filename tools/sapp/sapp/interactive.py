@@ -3,16 +3,23 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+import array
 import builtins
+import io
 import itertools
+import json
 import os
+import subprocess
 import sys
-from collections import defaultdict
+import time
+from collections import Counter, defaultdict
 from typing import (
+    Any,
     Callable,
     DefaultDict,
     Dict,
     Iterable,
+    Iterator,
     List,
     NamedTuple,
     Optional,
@@ -38,19 +45,22 @@ from sqlalchemy.orm import Session, aliased
 from sqlalchemy.orm.attributes import InstrumentedAttribute
 from sqlalchemy.orm.query import Query
 from sqlalchemy.sql import func
-from sqlalchemy.sql.expression import or_
+from sqlalchemy.sql.expression import and_, or_
 
 from .analysis_output import AnalysisOutput, AnalysisOutputError
 from .base_parser import BaseParser
 from .db import DB
 from .decorators import UserError, catch_keyboard_interrupt, catch_user_error
 from .models import (
+    CallableLeafDistance,
     DBID,
     Issue,
     IssueInstance,
     IssueInstanceSharedTextAssoc,
+    IssueCountKind,
     IssueInstanceTraceFrameAssoc,
     Run,
+    RunIssueCounts,
     RunStatus,
     SharedText,
     SharedTextKind,
@@ -59,6 +69,12 @@ from .models import (
     TraceFrameLeafAssoc,
     TraceKind,
 )
+from .iterutil import split_every
+from .leaf_distances import callables_near_leaf
+from .lru_cache import LRUCache
+from .offset_index import OffsetIndex
+from .run_diff import IssueStatus, diff_issues
+from .shared_text_index import SharedTextIndex
 
 
 T = TypeVar("T")
@@ -119,10 +135,13 @@ Commands =======================================================================
 help                 show this message
 help COMMAND         more info about a command
 state                show the internal state of the tool for debugging
+timing               toggle showing the time taken by each command
 
 == Display commands ==
 runs                 list all completed static analysis runs
 issues               list all issues for the selected run
+diff_runs BASE_ID    list the new, fixed and persisting issues since a run
+near_leaf LEAF       list the callables closest to a source or sink kind
 frames               show trace frames independently of an issue
 show                 show info about selected issue or trace frame
 
@@ -144,11 +163,20 @@ list                 show source code at the current trace frame
 == Debugging commands ==
 parents              show trace frames that call the current trace frame
 details              show additional information about the current trace frame
+json                 show the analysis output of the current callable
+caches               show the hit rates of the caches of trace frames and files
 """
     welcome_message = "Interactive issue exploration. Type 'help' for help."
 
     LEAF_NAMES = {"source", "sink", "leaf"}
 
+    # Rows fetched at a time by listing commands.
+    FETCH_SIZE = 100
+
+    TRACE_FRAME_CACHE_SIZE = 1024
+    LEAVES_CACHE_SIZE = 4096
+    SOURCE_FILE_CACHE_SIZE = 64
+
     SELF_SCOPE_KEY = "_interactive"
     PARSER_CLASS_SCOPE_KEY = "_parser_class"
 
@@ -165,8 +193,11 @@ details              show additional information about the current trace frame
             "postcondition": TraceKind.POSTCONDITION,
             "help": self.help,
             "state": self.state,
+            "timing": self.timing,
             "runs": self.runs,
             "issues": self.issues,
+            "diff_runs": self.diff_runs,
+            "near_leaf": self.near_leaf,
             "run": self.run,
             "latest_run": self.latest_run,
             "issue": self.issue,
@@ -185,13 +216,30 @@ details              show additional information about the current trace frame
             "details": self.details,
             "analysis_output": self.analysis_output,
             "callable": self.callable,
+            "json": self.json,
+            "caches": self.caches,
             self.SELF_SCOPE_KEY: self,
             self.PARSER_CLASS_SCOPE_KEY: parser_class,
         }
         self.repository_directory = repository_directory or os.getcwd()
+        self.parser_class = parser_class
         self.current_analysis_output: Optional[AnalysisOutput] = None
+        self.current_offset_index: Optional[OffsetIndex] = None
+
+        # Trace frames by id, and their leaves by (id, kind); cleared when the
+        # run changes.
+        self.trace_frame_cache: LRUCache[int, TraceFrameQueryResult] = LRUCache(
+            self.TRACE_FRAME_CACHE_SIZE
+        )
+        self.leaves_cache: LRUCache[Tuple[int, SharedTextKind], Set[str]] = LRUCache(
+            self.LEAVES_CACHE_SIZE
+        )
+        # Line offsets of source files by (path, mtime, size).
+        self.source_file_cache: LRUCache[
+            Tuple[str, int, int], "array.array[int]"
+        ] = LRUCache(self.SOURCE_FILE_CACHE_SIZE)
 
-        self.current_run_id: int = -1
+        self._current_run_id: int = -1
 
         # Trace exploration relies on either of these
         self.current_issue_instance_id: int = -1
@@ -201,6 +249,9 @@ details              show additional information about the current trace frame
         self.sinks: Set[str] = set()
         self.sources_dict: Dict[int, str] = {}
         self.sinks_dict: Dict[int, str] = {}
+        # Whether substring filters on callables and filenames can go through
+        # the shared text index, see setup().
+        self.use_shared_text_index = False
 
         # Tuples representing the trace of the current issue
         self.trace_tuples: List[TraceTuple] = []
@@ -211,6 +262,11 @@ details              show additional information about the current trace frame
         # history_key on self.prompt().
         self.prompt_history: Dict[str, History] = {}
 
+        self.show_timing = False
+        # Time, database session count and session overhead when the current
+        # command started.
+        self.command_start: Optional[Tuple[float, int, float]] = None
+
     def setup(self) -> Dict[str, Callable]:
         with self.db.make_session() as session:
             latest_run_id = (
@@ -221,6 +277,7 @@ details              show additional information about the current trace frame
 
             self.sources_dict = self._all_leaves_by_kind(session, SharedTextKind.SOURCE)
             self.sinks_dict = self._all_leaves_by_kind(session, SharedTextKind.SINK)
+            self.use_shared_text_index = SharedTextIndex.exists(session)
 
         print("=" * len(self.welcome_message))
         print(self.welcome_message)
@@ -238,6 +295,17 @@ details              show additional information about the current trace frame
         #  Union[Callable[..., Any], TraceKind]]`.
         return self.scope_vars
 
+    @property
+    def current_run_id(self) -> int:
+        return self._current_run_id
+
+    @current_run_id.setter
+    def current_run_id(self, run_id: int) -> None:
+        if run_id != self._current_run_id:
+            self.trace_frame_cache.clear()
+            self.leaves_cache.clear()
+        self._current_run_id = run_id
+
     def help(self, object=None):
         if object is None:
             print(self.help_message)
@@ -255,21 +323,76 @@ details              show additional information about the current trace frame
         print(f"        Sources filter: {self.sources}")
         print(f"          Sinks filter: {self.sinks}")
 
+    def timing(self, enabled: Optional[bool] = None) -> None:
+        """Toggle showing the time taken by each command, and the number of
+        database sessions it opened and the time spent opening and closing them.
+
+        Parameters (all optional):
+            enabled: bool    turn it on or off (default: toggle)
+        """
+        self.show_timing = not self.show_timing if enabled is None else enabled
+        print(f"Timing is {'on' if self.show_timing else 'off'}.")
+
+    def start_command(self) -> None:
+        """Called before each command, see finish_command."""
+        self.command_start = (
+            time.monotonic(),
+            self.db.session_count,
+            self.db.session_overhead,
+        )
+
+    def finish_command(self) -> None:
+        """Called after each command, prints its timing if timing is on."""
+        if self.command_start is None:
+            return
+        start, session_count, session_overhead = self.command_start
+        self.command_start = None
+        if not self.show_timing:
+            return
+        print(
+            f"Time: {time.monotonic() - start:.3f}s, "
+            f"{self.db.session_count - session_count} database sessions "
+            f"({(self.db.session_overhead - session_overhead) * 1000:.1f}ms)"
+        )
+
     @catch_keyboard_interrupt()
-    def runs(self, use_pager=None):
-        pager = self._resolve_pager(use_pager)
+    @catch_user_error()
+    def runs(
+        self,
+        use_pager: bool = None,
+        *,
+        limit: Optional[int] = 100,
+        page: int = 1,
+        offset: int = 0,
+    ):
+        """Lists the completed static analysis runs.
 
+        Parameters (all optional):
+            use_pager: bool    use a unix style pager for output
+            limit: int         how many runs to list per page (default: 100,
+                               specify limit=None for all)
+            page: int          which page of runs to list (default: 1)
+            offset: int        how many runs to skip before the pages (default: 0)
+        """
         with self.db.make_session() as session:
-            runs = session.query(Run).filter(Run.status == RunStatus.FINISHED)
-
-            run_strings = [
-                "\n".join([f"Run {run.id}", f"Date: {run.date}", "-" * 80])
-                for run in runs
-            ]
-        run_output = "\n".join(run_strings)
+            runs = self._paginate(
+                session.query(Run)
+                .filter(Run.status == RunStatus.FINISHED)
+                .order_by(Run.id),
+                limit,
+                page,
+                offset,
+            )
+            shown, more = self._output_page(
+                runs,
+                lambda run: "\n".join([f"Run {run.id}", f"Date: {run.date}", "-" * 80]),
+                use_pager,
+                limit,
+            )
 
-        pager(run_output)
-        print(f"Found {len(run_strings)} runs.")
+        print(f"Found {shown} runs.")
+        if more:
+            print(f"Use 'page={page + 1}' to list more.")
 
     @catch_keyboard_interrupt()
     def run(self, run_id):
@@ -343,10 +466,15 @@ details              show additional information about the current trace frame
                     history_key="analysis_results",
                     completer=PathCompleter(),
                 )
-            self.current_analysis_output = AnalysisOutput.from_str(location)
+            analysis_output = AnalysisOutput.from_str(location)
         except AnalysisOutputError as e:
             raise UserError(f"Error loading results: {e}")
 
+        if self.current_offset_index is not None:
+            self.current_offset_index.close()
+            self.current_offset_index = None
+        self.current_analysis_output = analysis_output
+
     @catch_user_error()
     def latest_run(self, run_kind: str) -> None:
         """Sets the current run to the latest run of a given kind.
@@ -442,6 +570,9 @@ details              show additional information about the current trace frame
         codes: Optional[Union[int, List[int]]] = None,
         callables: Optional[Union[str, List[str]]] = None,
         filenames: Optional[Union[str, List[str]]] = None,
+        limit: Optional[int] = 100,
+        page: int = 1,
+        offset: int = 0,
     ):
         """Lists issues for the selected run.
 
@@ -450,6 +581,11 @@ details              show additional information about the current trace frame
             codes: int or list[int]        issue codes to filter on
             callables: str or list[str]    callables to filter on (supports wildcards)
             filenames: str or list[str]    filenames to filter on (supports wildcards)
+            limit: int                     how many issues to list per page
+                                           (default: 100, limit=None for all)
+            page: int                      which page of issues to list (default: 1)
+            offset: int                    how many issues to skip before the pages
+                                           (default: 0)
 
         String filters support LIKE wildcards (%, _) from SQL:
             % matches anything (like .* in regex)
@@ -463,8 +599,6 @@ details              show additional information about the current trace frame
                 "etc.",
             ])
         """
-        pager = self._resolve_pager(use_pager)
-
         with self.db.make_session() as session:
             query = (
                 session.query(
@@ -487,38 +621,167 @@ details              show additional information about the current trace frame
 
             if callables is not None:
                 query = self._add_list_or_string_filter_to_query(
-                    callables, query, CallableText.contents, "callables"
+                    callables,
+                    query,
+                    CallableText.contents,
+                    "callables",
+                    CallableText.id,
                 )
 
             if filenames is not None:
                 query = self._add_list_or_string_filter_to_query(
-                    filenames, query, FilenameText.contents, "filenames"
+                    filenames,
+                    query,
+                    FilenameText.contents,
+                    "filenames",
+                    FilenameText.id,
                 )
 
-            issues = query.join(Issue, IssueInstance.issue_id == Issue.id).join(
-                MessageText, MessageText.id == IssueInstance.message_id
+            query = self._paginate(
+                query.join(Issue, IssueInstance.issue_id == Issue.id)
+                .join(MessageText, MessageText.id == IssueInstance.message_id)
+                .order_by(IssueInstance.id),
+                limit,
+                page,
+                offset,
             )
 
-            sources_list = [
-                self._get_leaves_issue_instance(
-                    session, int(issue.id), SharedTextKind.SOURCE
-                )
-                for issue in issues
-            ]
-            sinks_list = [
-                self._get_leaves_issue_instance(
-                    session, int(issue.id), SharedTextKind.SINK
+            shown, more = self._output_page(
+                self._with_leaves(session, query),
+                lambda row: self._create_issue_output_string(*row),
+                use_pager,
+                limit,
+                separator="-" * 80,
+            )
+            total = (
+                self._count_issues(session, codes)
+                if more and callables is None and filenames is None
+                else None
+            )
+        print(f"Found {shown} issues with run_id {self.current_run_id}.")
+        if more:
+            if total is not None:
+                print(f"The run has {total} matching issues.")
+            print(f"Use 'page={page + 1}' to list more.")
+
+    @catch_keyboard_interrupt()
+    @catch_user_error()
+    def diff_runs(
+        self,
+        base_run_id: int,
+        run_id: Optional[int] = None,
+        *,
+        statuses: Optional[Union[str, List[str]]] = None,
+        output: Optional[str] = None,
+        use_pager: bool = None,
+    ):
+        """Lists the new, fixed and persisting issues of a run compared to a base
+        run, as lines of JSON (see 'sapp diff-runs').
+
+        Parameters:
+            base_run_id: int               the run to compare to
+            run_id: int                    the run to compare (default: the
+                                           selected run)
+            statuses: str or list[str]     "new", "fixed" and/or "persisting"
+                                           (default: all)
+            output: str                    write the lines to this file instead
+            use_pager: bool                use a unix style pager for output
+        """
+        run_id = self.current_run_id if run_id is None else run_id
+        if statuses is None:
+            statuses = [status.value for status in IssueStatus]
+        elif isinstance(statuses, str):
+            statuses = [statuses]
+        try:
+            selected = [IssueStatus(status) for status in statuses]
+        except ValueError:
+            raise UserError(
+                "'statuses' should be one or a list of "
+                + ", ".join(f"'{status.value}'" for status in IssueStatus)
+                + "."
+            )
+
+        counts: Counter = Counter()
+
+        def lines(issues: Iterable[Tuple[IssueStatus, str]]) -> Iterator[str]:
+            for status, issue in issues:
+                counts[status] += 1
+                yield issue
+
+        with self.db.make_session() as session:
+            try:
+                issues = diff_issues(session, base_run_id, run_id, selected)
+            except ValueError as e:
+                raise UserError(str(e))
+            if output is None:
+                self._output_page(
+                    lines(issues), lambda issue: issue, use_pager, limit=None
                 )
-                for issue in issues
-            ]
+            else:
+                with open(output, "w") as f:
+                    for line in lines(issues):
+                        f.write(line + "\n")
 
-            issue_strings = [
-                self._create_issue_output_string(issue, sources, sinks)
-                for issue, sources, sinks in zip(issues, sources_list, sinks_list)
-            ]
-        issue_output = f"\n{'-' * 80}\n".join(issue_strings)
-        pager(issue_output)
-        print(f"Found {len(issue_strings)} issues with run_id {self.current_run_id}.")
+        print(
+            ", ".join(f"{counts[status]} {status.value}" for status in selected)
+            + f" issues in run {run_id} compared to run {base_run_id}."
+        )
+
+    @catch_keyboard_interrupt()
+    @catch_user_error()
+    def near_leaf(
+        self,
+        leaf: str,
+        max_distance: int = 3,
+        use_pager: bool = None,
+        *,
+        limit: Optional[int] = 100,
+        page: int = 1,
+        offset: int = 0,
+    ):
+        """Lists the callables of the selected run that reach a source or sink
+        kind within a number of trace frames, closest first. Needs a run
+        analyzed with 'sapp analyze --leaf-distances'.
+
+        Parameters:
+            leaf: str                      the source or sink kind
+            max_distance: int              how many trace frames away at most
+                                           (default: 3, 0 for the callables
+                                           that reach the leaf directly)
+            use_pager: bool                use a unix style pager for output
+            limit: int                     how many callables to list per page
+                                           (default: 100, limit=None for all)
+            page: int                      which page of callables to list
+                                           (default: 1)
+            offset: int                    how many callables to skip before the
+                                           pages (default: 0)
+        """
+        with self.db.make_session() as session:
+            has_distances = session.query(
+                session.query(CallableLeafDistance)
+                .filter(CallableLeafDistance.run_id == self.current_run_id)
+                .exists()
+            ).scalar()
+            if not has_distances:
+                raise UserError(
+                    f"Run {self.current_run_id} has no leaf distances. "
+                    "Analyze it with 'sapp analyze --leaf-distances'."
+                )
+            query = self._paginate(
+                callables_near_leaf(session, self.current_run_id, leaf, max_distance),
+                limit,
+                page,
+                offset,
+            )
+            shown, more = self._output_page(
+                query,
+                lambda row: f"{row.distance:>4}  {row.callable}",
+                use_pager,
+                limit,
+            )
+        print(f"Found {shown} callables within {max_distance} of {leaf}.")
+        if more:
+            print(f"Use 'page={page + 1}' to list more.")
 
     @catch_user_error()
     def trace(self):
@@ -556,6 +819,8 @@ details              show additional information about the current trace frame
         callees: Optional[Union[str, List[str]]] = None,
         kind: Optional[TraceKind] = None,
         limit: Optional[int] = 10,
+        page: int = 1,
+        offset: int = 0,
     ):
         """Display trace frames independent of the current issue.
 
@@ -565,6 +830,9 @@ details              show additional information about the current trace frame
             kind: precondition|postcondition    the type of trace frames to show
             limit: int (default: 10)            how many trace frames to display
                                                 (specify limit=None for all)
+            page: int (default: 1)              which page of trace frames to show
+            offset: int (default: 0)            how many trace frames to skip
+                                                before the pages
 
         Sample usage:
             frames callers="module.function", kind=postcondition
@@ -589,12 +857,12 @@ details              show additional information about the current trace frame
 
             if callers is not None:
                 query = self._add_list_or_string_filter_to_query(
-                    callers, query, CallerText.contents, "callers"
+                    callers, query, CallerText.contents, "callers", CallerText.id
                 )
 
             if callees is not None:
                 query = self._add_list_or_string_filter_to_query(
-                    callees, query, CalleeText.contents, "callees"
+                    callees, query, CalleeText.contents, "callees", CalleeText.id
                 )
 
             if kind is not None:
@@ -605,18 +873,23 @@ details              show additional information about the current trace frame
                     )
                 query = query.filter(TraceFrame.kind == kind)
 
-            if limit is not None and not isinstance(limit, int):
-                raise UserError("'limit' should be an int or None.")
-
-            trace_frames = query.group_by(TraceFrame.id).order_by(
-                CallerText.contents, CalleeText.contents
+            trace_frames = list(
+                self._paginate(
+                    query.group_by(TraceFrame.id).order_by(
+                        CallerText.contents, CalleeText.contents
+                    ),
+                    limit,
+                    page,
+                    offset,
+                )
             )
-
-            total_trace_frames = trace_frames.count()
-            limit = limit or total_trace_frames
+            more = limit is not None and len(trace_frames) > limit
 
             self._output_trace_frames(
-                self._group_trace_frames(trace_frames, limit), limit, total_trace_frames
+                self._group_trace_frames(trace_frames, limit or len(trace_frames)),
+                limit,
+                page,
+                more,
             )
 
     @catch_keyboard_interrupt()
@@ -735,26 +1008,7 @@ details              show additional information about the current trace frame
 
     def _generate_trace_from_frame(self) -> None:
         with self.db.make_session() as session:
-            trace_frame = (
-                session.query(
-                    TraceFrame.id,
-                    TraceFrame.caller_id,
-                    CallerText.contents.label("caller"),
-                    TraceFrame.caller_port,
-                    TraceFrame.callee_id,
-                    CalleeText.contents.label("callee"),
-                    TraceFrame.callee_port,
-                    TraceFrame.callee_location,
-                    TraceFrame.kind,
-                    FilenameText.contents.label("filename"),
-                )
-                .filter(TraceFrame.id == self.current_frame_id)
-                .join(CallerText, CallerText.id == TraceFrame.caller_id)
-                .join(CalleeText, CalleeText.id == TraceFrame.callee_id)
-                .join(FilenameText, FilenameText.id == TraceFrame.filename_id)
-                .one()
-            )
-
+            trace_frame = self._get_trace_frame(session, self.current_frame_id)
             navigation = self._navigate_trace_frames(session, [trace_frame])
 
         first_trace_frame = navigation[0][0]
@@ -927,18 +1181,58 @@ details              show additional information about the current trace frame
         ].trace_frame
 
         filename = os.path.join(self.repository_directory, current_trace_frame.filename)
-        file_lines: List[str] = []
+        assert current_trace_frame.callee_location is not None
+        # pyre-fixme[16]: `Optional` has no attribute `line_no`.
+        center_line_number = current_trace_frame.callee_location.line_no
 
         try:
-            # Use readlines instead of enumerate(file) because mock_open
-            # doesn't support __iter__ until python 3.7.1.
-            with open(filename, "r") as file:
-                file_lines = file.readlines()
+            line_offsets = self._get_line_offsets(filename)
+            begin_lineno = max(center_line_number - context, 1)
+            end_lineno = min(center_line_number + context, len(line_offsets) - 1)
+            file_lines = self._read_lines(
+                filename, line_offsets, begin_lineno, end_lineno
+            )
         except FileNotFoundError:
             self.warning(f"Couldn't open {filename}.")
             return
 
-        self._output_file_lines(current_trace_frame, file_lines, context)
+        self._output_file_lines(current_trace_frame, file_lines, begin_lineno)
+
+    def _get_line_offsets(self, filename: str) -> "array.array[int]":
+        """The offset of the start of each line of the file, and of its end.
+        Cached, so that only the first listing of a file reads all of it."""
+        stat = os.stat(filename)
+
+        def read_line_offsets() -> "array.array[int]":
+            offsets = array.array("q", [0])
+            with open(filename, "rb") as file:
+                for line in file:
+                    offsets.append(offsets[-1] + len(line))
+            return offsets
+
+        return self.source_file_cache.lookup(
+            (filename, stat.st_mtime_ns, stat.st_size), read_line_offsets
+        )
+
+    def _read_lines(
+        self,
+        filename: str,
+        line_offsets: "array.array[int]",
+        begin_lineno: int,
+        end_lineno: int,
+    ) -> List[str]:
+        if begin_lineno > end_lineno:
+            return []
+        with open(filename, "rb") as file:
+            file.seek(line_offsets[begin_lineno - 1])
+            data = file.read(line_offsets[end_lineno] - line_offsets[begin_lineno - 1])
+        # Split on "\n" only, like the offsets: str.splitlines also splits on
+        # form feeds and other separators that can be in source files. Windows
+        # line endings are read as "\n", as text mode would.
+        return [
+            line.decode(errors="replace").replace("\r\n", "\n")
+            for line in io.BytesIO(data)
+        ]
 
     def details(
         self, *, limit: Optional[int] = 5, kind: Optional[TraceKind] = None
@@ -1034,11 +1328,36 @@ details              show additional information about the current trace frame
         query: Query,
         column: InstrumentedAttribute,
         argument_name: str,
+        id_column: Optional[InstrumentedAttribute] = None,
     ):
+        """Filters on the contents of callable or filename shared texts, whose
+        id_column is given, go through the shared text index if there is one."""
+        if id_column is None or not self.use_shared_text_index:
+            like = column.like
+        else:
+
+            def like(pattern: str) -> Any:
+                if SharedTextIndex.can_match(pattern):
+                    return SharedTextIndex.like(id_column, pattern)
+                return column.like(pattern)
+
         return self._add_list_or_element_filter_to_query(
-            filter, query, column, argument_name, str
+            filter, query, column, argument_name, str, like
         )
 
+    def _count_issues(
+        self, session: Session, codes: Optional[Union[int, List[int]]]
+    ) -> Optional[int]:
+        """The number of issues of the current run with the codes, from the
+        counts saved with the run. None if the run has none."""
+        counts = RunIssueCounts.get(session, self.current_run_id, IssueCountKind.CODE)
+        if not counts:
+            return None
+        if codes is None:
+            return sum(total for total, _ in counts.values())
+        codes = [codes] if isinstance(codes, int) else codes
+        return sum(counts.get(code, (0, 0))[0] for code in set(codes))
+
     def _add_list_or_int_filter_to_query(
         self,
         filter: Union[int, List[int]],
@@ -1057,20 +1376,30 @@ details              show additional information about the current trace frame
         column: InstrumentedAttribute,
         argument_name: str,
         element_type: Type,
+        like: Optional[Callable[[T], Any]] = None,
     ) -> Query:
         if isinstance(filter, element_type):
-            return query.filter(column.like(filter))
-        if isinstance(filter, list):
+            filters = [filter]
+        elif isinstance(filter, list):
             if not filter:
                 raise UserError(f"'{argument_name}' should be non-empty.")
-            return query.filter(or_(*[column.like(item) for item in filter]))
-        raise UserError(
-            f"'{argument_name}' should be {element_type} or " f"list of {element_type}."
-        )
+            filters = filter
+        else:
+            raise UserError(
+                f"'{argument_name}' should be {element_type} or "
+                f"list of {element_type}."
+            )
+        like = like or column.like
+        return query.filter(or_(*[like(item) for item in filters]))
 
     def _output_file_lines(
-        self, trace_frame: TraceFrameQueryResult, file_lines: List[str], context: int
+        self,
+        trace_frame: TraceFrameQueryResult,
+        lines_to_show: List[str],
+        begin_lineno: int,
     ) -> None:
+        """Prints the lines of the file starting at line number begin_lineno,
+        pointing at the location of the trace frame."""
         print(
             f"In {trace_frame.caller or trace_frame.callee} "
             f"[{trace_frame.filename}:{trace_frame.callee_location}]"
@@ -1079,12 +1408,9 @@ details              show additional information about the current trace frame
         location = trace_frame.callee_location
         # pyre-fixme[16]: `Optional` has no attribute `line_no`.
         center_line_number = location.line_no
-        begin_lineno = max(center_line_number - context, 1)
-        end_lineno = min(center_line_number + context, len(file_lines))
+        end_lineno = begin_lineno + len(lines_to_show) - 1
         lineno_width = len(str(end_lineno))
 
-        lines_to_show = file_lines[begin_lineno - 1 : end_lineno]
-
         # In both cases this removes trailing newlines on each line.
         if sys.stdout.isatty():
             lines_to_show = highlight(
@@ -1124,8 +1450,9 @@ details              show additional information about the current trace frame
     def _output_trace_frames(
         self,
         trace_buckets: Dict[Tuple[str, str], List[TraceFrameQueryResult]],
-        limit: int,
-        total_trace_frames: int,
+        limit: Optional[int],
+        page: int,
+        more: bool,
     ) -> None:
         if not trace_buckets:
             print("No trace frames found.")
@@ -1151,10 +1478,10 @@ details              show additional information about the current trace frame
                     f"    {trace_frame.callee}:{trace_frame.callee_port}"
                 )
 
-        if limit < total_trace_frames:
+        if more:
             print(
-                f"...\nShowing {limit}/{total_trace_frames} matching frames. "
-                "To see more, call 'frames' with the 'limit' argument."
+                f"...\nShowing {limit} matching frames. To see more, call 'frames' "
+                f"with 'page={page + 1}' or a larger 'limit'."
             )
 
     def _output_trace_tuples(self, trace_tuples):
@@ -1276,11 +1603,18 @@ details              show additional information about the current trace frame
 
         trace_frames = [(initial_trace_frames[index], len(initial_trace_frames))]
         visited_ids: Set[int] = {int(initial_trace_frames[index].id)}
+        next_trace_frames = self._reachable_trace_frames(
+            session, initial_trace_frames[index]
+        )
         while not self._is_leaf(trace_frames[-1][0]):
             trace_frame, branches = trace_frames[-1]
-            next_nodes = self._next_forward_trace_frames(
-                session, trace_frame, visited_ids
-            )
+            next_nodes = [
+                frame
+                for frame in next_trace_frames.get(
+                    (int(trace_frame.callee_id), trace_frame.callee_port), []
+                )
+                if int(frame.id) not in visited_ids
+            ]
 
             if len(next_nodes) == 0:
                 # Denote a missing frame by setting caller to None
@@ -1337,7 +1671,66 @@ details              show additional information about the current trace frame
         When backwards=True, the result will include the parameter trace_frame,
         since we are filtering on the parameter's callee.
         """
-        query = (
+        query = self._trace_frames_query(session, trace_frame.kind)
+        if backwards:
+            query = query.filter(TraceFrame.callee_id == trace_frame.caller_id).filter(
+                TraceFrame.callee_port == trace_frame.caller_port
+            )
+        else:
+            query = query.filter(TraceFrame.caller_id == trace_frame.callee_id).filter(
+                TraceFrame.caller_port == trace_frame.callee_port
+            )
+
+        return [frame for frame in query if int(frame.id) not in visited_ids]
+
+    def _reachable_trace_frames(
+        self, session: Session, trace_frame: TraceFrameQueryResult
+    ) -> Dict[Tuple[int, str], List[TraceFrameQueryResult]]:
+        """Finds all trace frames that _next_forward_trace_frames can reach from
+        the given trace_frame, with one recursive query rather than one query
+        per hop. Returns them by (caller_id, caller_port), each list in the
+        order _next_trace_frames returns it.
+        """
+        NextFrame = aliased(TraceFrame)
+        # The (callee_id, callee_port) of the frames reached so far.
+        reachable = (
+            session.query(TraceFrame.callee_id, TraceFrame.callee_port)
+            .filter(TraceFrame.id == trace_frame.id)
+            .cte("reachable", recursive=True)
+        )
+        reachable = reachable.union(
+            session.query(NextFrame.callee_id, NextFrame.callee_port)
+            .join(
+                reachable,
+                and_(
+                    NextFrame.caller_id == reachable.c.callee_id,
+                    NextFrame.caller_port == reachable.c.callee_port,
+                ),
+            )
+            .filter(NextFrame.run_id == self.current_run_id)
+            .filter(NextFrame.kind == trace_frame.kind)
+            .filter(NextFrame.caller_id != NextFrame.callee_id)
+            .filter(self._has_filtered_leaf(session, NextFrame, trace_frame.kind))
+        )
+
+        next_trace_frames: DefaultDict[
+            Tuple[int, str], List[TraceFrameQueryResult]
+        ] = defaultdict(list)
+        for frame in self._trace_frames_query(session, trace_frame.kind).join(
+            reachable,
+            and_(
+                TraceFrame.caller_id == reachable.c.callee_id,
+                TraceFrame.caller_port == reachable.c.callee_port,
+            ),
+        ):
+            next_trace_frames[(int(frame.caller_id), frame.caller_port)].append(frame)
+        return next_trace_frames
+
+    def _trace_frames_query(self, session: Session, kind: TraceKind) -> Query:
+        """Trace frames of the current run and the given kind that have a leaf
+        in the sources (for postconditions) or sinks being filtered on.
+        """
+        return (
             session.query(
                 TraceFrame.id,
                 TraceFrame.caller_id,
@@ -1352,48 +1745,42 @@ details              show additional information about the current trace frame
                 TraceFrameLeafAssoc.trace_length,
             )
             .filter(TraceFrame.run_id == self.current_run_id)
-            .filter(TraceFrame.kind == trace_frame.kind)
+            .filter(TraceFrame.kind == kind)
             .join(CallerText, CallerText.id == TraceFrame.caller_id)
             .join(CalleeText, CalleeText.id == TraceFrame.callee_id)
             .join(FilenameText, FilenameText.id == TraceFrame.filename_id)
             .filter(
                 TraceFrame.caller_id != TraceFrame.callee_id
             )  # skip recursive calls for now
-        )
-        if backwards:
-            query = query.filter(TraceFrame.callee_id == trace_frame.caller_id).filter(
-                TraceFrame.callee_port == trace_frame.caller_port
-            )
-        else:
-            query = query.filter(TraceFrame.caller_id == trace_frame.callee_id).filter(
-                TraceFrame.caller_port == trace_frame.callee_port
-            )
-
-        results = (
-            query.join(
+            .filter(self._has_filtered_leaf(session, TraceFrame, kind))
+            .join(
                 TraceFrameLeafAssoc, TraceFrameLeafAssoc.trace_frame_id == TraceFrame.id
             )
             .group_by(TraceFrame.id)
-            .order_by(TraceFrameLeafAssoc.trace_length, TraceFrame.callee_location)
-        )
-        filter_leaves = (
-            self.sources if trace_frame.kind == TraceKind.POSTCONDITION else self.sinks
+            .order_by(
+                TraceFrameLeafAssoc.trace_length,
+                TraceFrame.callee_location,
+                TraceFrame.id,
+            )
         )
 
-        filtered_results = []
-        for frame in results:
-            if int(frame.id) not in visited_ids and filter_leaves.intersection(
-                set(
-                    self._get_leaves_trace_frame(
-                        session,
-                        int(frame.id),
-                        self._trace_kind_to_shared_text_kind(frame.kind),
-                    )
-                )
-            ):
-                filtered_results.append(frame)
-
-        return filtered_results
+    def _has_filtered_leaf(self, session: Session, frame, kind: TraceKind):
+        """Whether the frame (TraceFrame or an alias of it) has one of the
+        sources (for postconditions) or sinks being filtered on as a leaf.
+        """
+        if kind == TraceKind.POSTCONDITION:
+            leaf_dict, filter_leaves = self.sources_dict, self.sources
+        else:
+            leaf_dict, filter_leaves = self.sinks_dict, self.sinks
+        leaf_ids = [id for id, leaf in leaf_dict.items() if leaf in filter_leaves]
+        Leaf = aliased(TraceFrameLeafAssoc)
+        return (
+            session.query(Leaf)
+            .filter(Leaf.trace_frame_id == frame.id)
+            .filter(Leaf.leaf_id.in_(leaf_ids))
+            .correlate(frame)
+            .exists()
+        )
 
     def _create_issue_output_string(
         self, issue: IssueQueryResult, sources: Set[str], sinks: Set[str]
@@ -1491,9 +1878,72 @@ details              show additional information about the current trace frame
         )
         self.current_trace_frame_index = 0
 
-    def _resolve_pager(self, use_pager):
+    def _paginate(
+        self, query: Query, limit: Optional[int], page: int, offset: int
+    ) -> Query:
+        """Restricts the query of a listing command to the given page of limit
+        results, after skipping offset results, plus one more result to tell
+        whether there is a next page. The results are fetched as they are
+        consumed, in batches of FETCH_SIZE."""
+        if limit is not None and not isinstance(limit, int):
+            raise UserError("'limit' should be an int or None.")
+        if not isinstance(page, int) or page < 1:
+            raise UserError("'page' should be a positive int.")
+        if not isinstance(offset, int) or offset < 0:
+            raise UserError("'offset' should be a non-negative int.")
+        if not limit and page > 1:
+            raise UserError("'page' needs a 'limit'.")
+
+        query = query.offset(offset + (page - 1) * (limit or 0))
+        if limit:
+            query = query.limit(limit + 1)
+        return query.yield_per(self.FETCH_SIZE)
+
+    def _output_page(
+        self,
+        rows: Iterable[T],
+        format_row: Callable[[T], str],
+        use_pager: Optional[bool],
+        limit: Optional[int],
+        separator: Optional[str] = None,
+    ) -> Tuple[int, bool]:
+        """Outputs the first limit rows, formatted, as they are fetched. Returns
+        how many were output, and whether there were more."""
+        shown = 0
+        more = False
+
+        def lines() -> Iterator[str]:
+            nonlocal shown, more
+            for row in rows:
+                if limit and shown == limit:
+                    more = True
+                    return
+                if shown and separator is not None:
+                    yield separator
+                shown += 1
+                yield format_row(row)
+
         use_pager = sys.stdin.isatty() if use_pager is None else use_pager
-        return page.page if use_pager else page.display_page
+        if use_pager:
+            self._stream_to_pager(lines())
+        else:
+            for line in lines():
+                print(line)
+        return shown, more
+
+    def _stream_to_pager(self, lines: Iterable[str]) -> None:
+        """Pipes lines into the pager as they are produced, so that it shows the
+        first screen while the rest is fetched. Stops when the pager is quit."""
+        pager = subprocess.Popen(
+            page.get_pager_cmd(), shell=True, stdin=subprocess.PIPE, text=True
+        )
+        try:
+            for line in lines:
+                pager.stdin.write(line + "\n")
+            pager.stdin.close()
+        except BrokenPipeError:
+            pass
+        pager.wait()
 
     def _get_current_issue(self, session: Session) -> IssueQueryResult:
         return (
@@ -1529,18 +1979,69 @@ details              show additional information about the current trace frame
         ]
         return self._leaf_dict_lookups(message_ids, kind)
 
+    def _get_leaves_issue_instances(
+        self, session: Session, issue_instance_ids: List[int]
+    ) -> DefaultDict[Tuple[int, SharedTextKind], Set[str]]:
+        """The sources and sinks of the issue instances by (issue instance id,
+        kind), in one query rather than two _get_leaves_issue_instance per
+        instance."""
+        leaves: DefaultDict[Tuple[int, SharedTextKind], Set[str]] = defaultdict(set)
+        for issue_instance_id, message_id, kind in (
+            session.query(
+                IssueInstanceSharedTextAssoc.issue_instance_id,
+                IssueInstanceSharedTextAssoc.shared_text_id,
+                SharedText.kind,
+            )
+            .join(
+                SharedText, SharedText.id == IssueInstanceSharedTextAssoc.shared_text_id
+            )
+            .filter(
+                IssueInstanceSharedTextAssoc.issue_instance_id.in_(issue_instance_ids)
+            )
+            .filter(SharedText.kind.in_([SharedTextKind.SOURCE, SharedTextKind.SINK]))
+            .distinct()
+        ):
+            leaves[(int(issue_instance_id), kind)] |= self._leaf_dict_lookups(
+                [int(message_id)], kind
+            )
+        return leaves
+
+    def _with_leaves(
+        self, session: Session, issues: Iterable[IssueQueryResult]
+    ) -> Iterator[Tuple[IssueQueryResult, Set[str], Set[str]]]:
+        """The issues with their sources and sinks, looked up for FETCH_SIZE
+        issues at a time as the issues are fetched."""
+        for batch in split_every(self.FETCH_SIZE, issues):
+            leaves = self._get_leaves_issue_instances(
+                session, [int(issue.id) for issue in batch]
+            )
+            for issue in batch:
+                yield (
+                    issue,
+                    leaves[(int(issue.id), SharedTextKind.SOURCE)],
+                    leaves[(int(issue.id), SharedTextKind.SINK)],
+                )
+
     def _get_leaves_trace_frame(
         self, session: Session, trace_frame_id: int, kind: SharedTextKind
     ) -> Set[str]:
-        message_ids = [
-            int(id)
-            for id, in session.query(SharedText.id)
-            .distinct(SharedText.id)
-            .join(TraceFrameLeafAssoc, SharedText.id == TraceFrameLeafAssoc.leaf_id)
-            .filter(TraceFrameLeafAssoc.trace_frame_id == trace_frame_id)
-            .filter(SharedText.kind == kind)
-        ]
-        return self._leaf_dict_lookups(message_ids, kind)
+        return self.leaves_cache.lookup(
+            (int(trace_frame_id), kind),
+            lambda: self._leaf_dict_lookups(
+                [
+                    int(id)
+                    for id, in session.query(SharedText.id)
+                    .distinct(SharedText.id)
+                    .join(
+                        TraceFrameLeafAssoc,
+                        SharedText.id == TraceFrameLeafAssoc.leaf_id,
+                    )
+                    .filter(TraceFrameLeafAssoc.trace_frame_id == trace_frame_id)
+                    .filter(SharedText.kind == kind)
+                ],
+                kind,
+            ),
+        )
 
     def _leaf_dict_lookups(
         self, message_ids: List[int], kind: SharedTextKind
@@ -1560,26 +2061,34 @@ details              show additional information about the current trace frame
 
     def _show_current_trace_frame(self):
         with self.db.make_session() as session:
-            trace_frame = (
-                session.query(
-                    TraceFrame.id,
-                    CallerText.contents.label("caller"),
-                    TraceFrame.caller_port,
-                    CalleeText.contents.label("callee"),
-                    TraceFrame.callee_port,
-                    TraceFrame.kind,
-                    FilenameText.contents.label("filename"),
-                    TraceFrame.callee_location,
-                )
-                .filter(TraceFrame.id == self.current_frame_id)
-                .join(CallerText, CallerText.id == TraceFrame.caller_id)
-                .join(CalleeText, CalleeText.id == TraceFrame.callee_id)
-                .join(FilenameText, FilenameText.id == TraceFrame.filename_id)
-                .one()
-            )
+            trace_frame = self._get_trace_frame(session, self.current_frame_id)
 
         page.display_page(self._create_trace_frame_output_string(trace_frame))
 
+    def _get_trace_frame(
+        self, session: Session, trace_frame_id: int
+    ) -> TraceFrameQueryResult:
+        return self.trace_frame_cache.lookup(
+            int(trace_frame_id),
+            lambda: session.query(
+                TraceFrame.id,
+                TraceFrame.caller_id,
+                CallerText.contents.label("caller"),
+                TraceFrame.caller_port,
+                TraceFrame.callee_id,
+                CalleeText.contents.label("callee"),
+                TraceFrame.callee_port,
+                TraceFrame.callee_location,
+                TraceFrame.kind,
+                FilenameText.contents.label("filename"),
+            )
+            .filter(TraceFrame.id == trace_frame_id)
+            .join(CallerText, CallerText.id == TraceFrame.caller_id)
+            .join(CalleeText, CalleeText.id == TraceFrame.callee_id)
+            .join(FilenameText, FilenameText.id == TraceFrame.filename_id)
+            .one(),
+        )
+
     def callable(self) -> Optional[str]:
         """Show the name of the current callable in the trace"""
         if self.current_trace_frame_index != -1:
@@ -1588,6 +2097,50 @@ details              show additional information about the current trace frame
             )[0]
         return None
 
+    @catch_keyboard_interrupt()
+    @catch_user_error()
+    def json(self, callable: Optional[str] = None) -> None:
+        """Show the entries of a callable in the analysis output, as json.
+        The first lookup indexes the analysis output, later ones (in this or
+        another session) read the entries directly.
+
+        Parameters (all optional):
+            callable: str    the callable to show (default: the current one)
+        """
+        if self.current_analysis_output is None:
+            raise UserError(
+                "Use 'analysis_output DIR' to set the analysis output first."
+            )
+        if callable is None:
+            callable = self.callable()
+            if callable is None:
+                raise UserError("Select a trace frame or pass in a callable.")
+
+        if self.current_offset_index is None:
+            try:
+                self.current_offset_index = OffsetIndex.get_or_build(
+                    self.parser_class(), self.current_analysis_output
+                )
+            except (NotImplementedError, ValueError) as e:
+                raise UserError(f"Can't index the analysis output: {e}")
+
+        positions = self.current_offset_index.lookup(callable)
+        if not positions:
+            raise UserError(f"No entries for '{callable}' in the analysis output.")
+        page.display_page(
+            "\n".join(
+                json.dumps(self.current_offset_index.get_json(position), indent=2)
+                for position in positions
+            )
+        )
+
+    def caches(self) -> None:
+        """Show the hit rates of the caches of trace frames, their leaves and
+        the line offsets of source files."""
+        print(f"Trace frames: {self.trace_frame_cache}")
+        print(f"      Leaves: {self.leaves_cache}")
+        print(f"Source files: {self.source_file_cache}")
+
     def _verify_entrypoint_selected(self) -> None:
         assert self.current_issue_instance_id == -1 or self.current_frame_id == -1
 
@@ -0,0 +1,113 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import logging
+from collections import defaultdict
+from typing import DefaultDict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.orm.query import Query
+
+from .models import CallableLeafDistance, SharedText, SharedTextKind, TraceFrame
+from .pipeline import PipelineStep, Summary
+from .trace_graph import TraceGraph
+
+
+log = logging.getLogger("sapp")
+
+CallableText = aliased(SharedText)
+LeafText = aliased(SharedText)
+
+
+class ComputeLeafDistances(PipelineStep[TraceGraph, TraceGraph]):
+    """Computes the fewest trace frames from each callable to each leaf it
+    reaches, for DatabaseSaver to save as CallableLeafDistances.
+
+    This is a breadth-first search from the trace frames that lead to a leaf
+    directly (with a trace length of 0 to it), through the trace frames calling
+    their callers that lead to the same leaf. Unlike the trace lengths of the
+    analysis, which can be off, the distances follow the trace frames that are
+    saved. Callables further than max_distance from a leaf are left out."""
+
+    def __init__(self, max_distance: Optional[int] = None) -> None:
+        super().__init__()
+        self.max_distance = max_distance
+
+    def run(self, input: TraceGraph, summary: Summary) -> Tuple[TraceGraph, Summary]:
+        graph = input
+
+        # Leaf id -> the trace frames leading to it directly.
+        leaf_frames: DefaultDict[int, List[TraceFrame]] = defaultdict(list)
+        for trace_frame in graph.get_trace_frames():
+            for leaf_id, depth in graph.get_trace_frame_leaf_ids_with_depths(
+                trace_frame
+            ):
+                if depth == 0:
+                    leaf_frames[leaf_id].append(trace_frame)
+
+        run_id = summary["run"].id
+        distances: List[CallableLeafDistance] = []
+        for leaf_id, frames in leaf_frames.items():
+            leaf = graph.get_shared_text_by_local_id(leaf_id)
+            # Searched a level of frames at a time, so that the first distance
+            # of a callable is the smallest. Only local ids are kept in the
+            # sets, as tuples would keep the garbage collector busy.
+            visited: Set[int] = {trace_frame.id.local_id for trace_frame in frames}
+            callable_ids: Set[int] = set()
+            distance = 0
+            while frames:
+                for trace_frame in frames:
+                    if trace_frame.caller_id.local_id not in callable_ids:
+                        callable_ids.add(trace_frame.caller_id.local_id)
+                        distances.append(
+                            CallableLeafDistance.Record(
+                                run_id=run_id,
+                                leaf_id=leaf.id,
+                                callable_id=trace_frame.caller_id,
+                                distance=distance,
+                            )
+                        )
+                if distance == self.max_distance:
+                    break
+                previous_frames = []
+                for trace_frame in frames:
+                    for previous_frame in graph.get_trace_frames_from_callee(
+                        trace_frame.caller_id, trace_frame.caller_port
+                    ):
+                        previous_id = previous_frame.id.local_id
+                        if (
+                            previous_frame.kind != trace_frame.kind
+                            or previous_id in visited
+                        ):
+                            continue
+                        if leaf_id in graph.get_trace_frame_leaf_ids(previous_frame):
+                            visited.add(previous_id)
+                            previous_frames.append(previous_frame)
+                frames = previous_frames
+                distance += 1
+
+        log.info("Computed %d callable to leaf distances", len(distances))
+        summary["callable_leaf_distances"] = distances
+        return graph, summary
+
+
+def callables_near_leaf(
+    session: Session, run_id: int, leaf: str, max_distance: int
+) -> Query:
+    """The (callable, distance) of the callables of the run at most
+    max_distance trace frames away from the leaf (a source or sink kind),
+    closest first."""
+    return (
+        session.query(
+            CallableText.contents.label("callable"), CallableLeafDistance.distance
+        )
+        .join(LeafText, LeafText.id == CallableLeafDistance.leaf_id)
+        .join(CallableText, CallableText.id == CallableLeafDistance.callable_id)
+        .filter(CallableLeafDistance.run_id == run_id)
+        .filter(LeafText.contents == leaf)
+        .filter(LeafText.kind.in_([SharedTextKind.SOURCE, SharedTextKind.SINK]))
+        .filter(CallableLeafDistance.distance <= max_distance)
+        .order_by(CallableLeafDistance.distance, CallableText.contents)
+    )
@@ -0,0 +1,131 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Maps the lines of files in the analyzed revision to their lines in the
+previous revision, so that issues that only moved are not reported as new.
+
+Two formats are supported:
+
+    json        {"path": {"new line": [old lines, ...]}, ...}
+                The whole file is loaded when it is opened.
+    jsonlines   ["path", {"new line": [old lines, ...]}] on each line.
+                The file is read through mmap and only indexed by path when it
+                is opened. The mapping of a file is decoded the first time
+                one of its lines is looked up, so only files with new issues
+                are ever decoded.
+
+The mapping of a file is stored as sorted integer arrays rather than as a
+dict of strings to lists.
+"""
+
+import json
+import logging
+import mmap
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+log: logging.Logger = logging.getLogger("sapp")
+
+# A path is expected to be decodable from this many bytes at the start of its
+# line, otherwise the whole line is decoded.
+PATH_PREFIX_SIZE = 4096
+
+
+class FileLinemap:
+    __slots__ = ("_new_lines", "_offsets", "_old_lines")
+
+    def __init__(self, lines: Dict[str, List[int]]) -> None:
+        items = sorted((int(new_line), old) for new_line, old in lines.items())
+        self._new_lines = array("l", [new_line for new_line, _ in items])
+        self._offsets = array("l", [0])
+        self._old_lines = array("l")
+        for _, old_lines in items:
+            self._old_lines.extend(old_lines)
+            self._offsets.append(len(self._old_lines))
+
+    def old_lines(self, line: int) -> Sequence[int]:
+        index = bisect_left(self._new_lines, line)
+        if index == len(self._new_lines) or self._new_lines[index] != line:
+            return ()
+        return self._old_lines[self._offsets[index] : self._offsets[index + 1]]
+
+
+class Linemap:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._files: Dict[str, Optional[FileLinemap]] = {}
+        # json: path -> raw mapping, jsonlines: path -> (start, end) of its line
+        self._json: Dict[str, Dict[str, List[int]]] = {}
+        self._positions: Dict[str, Tuple[int, int]] = {}
+        self._mmap: Optional[mmap.mmap] = None
+
+        with open(path, "rb") as f:
+            first = f.read(PATH_PREFIX_SIZE).lstrip()
+            if not first:
+                return
+            if first[:1] != b"[":
+                f.seek(0)
+                self._json = json.load(f)
+                return
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index(self._mmap)
+
+    def _index(self, contents: mmap.mmap) -> None:
+        decoder = json.JSONDecoder()
+        start, size = 0, len(contents)
+        while start < size:
+            end = contents.find(b"\n", start)
+            if end == -1:
+                end = size
+            prefix = contents[start : min(end, start + PATH_PREFIX_SIZE)]
+            if prefix.strip():
+                path = self._decode_path(decoder, prefix.decode(errors="ignore"))
+                if path is None:
+                    path = json.loads(contents[start:end])[0]
+                self._positions[path] = (start, end)
+            start = end + 1
+        log.info("Indexed linemap of %d files in %s", len(self._positions), self.path)
+
+    @staticmethod
+    def _decode_path(decoder: json.JSONDecoder, prefix: str) -> Optional[str]:
+        try:
+            path, _ = decoder.raw_decode(prefix, prefix.index('"'))
+        except ValueError:
+            return None
+        return path
+
+    def _load(self, path: str) -> Optional[FileLinemap]:
+        lines: Optional[Dict[str, Any]]
+        if self._mmap is not None:
+            position = self._positions.get(path)
+            if position is None:
+                return None
+            start, end = position
+            lines = json.loads(self._mmap[start:end])[1]
+        else:
+            lines = self._json.pop(path, None)
+        return None if lines is None else FileLinemap(lines)
+
+    def old_lines(self, path: str, line: int) -> Sequence[int]:
+        """Lines of the previous revision that the line of path was at."""
+        if path not in self._files:
+            self._files[path] = self._load(path)
+        file_linemap = self._files[path]
+        if file_linemap is None:
+            return ()
+        return file_linemap.old_lines(line)
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self) -> "Linemap":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
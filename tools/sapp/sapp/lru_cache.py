@@ -0,0 +1,52 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, TypeVar
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Holds at most maxsize values, evicting the least recently used one, and
+    counts hits and misses. Unlike functools.lru_cache, it can be cleared and
+    inspected per instance, and looked up with arguments (like sessions) that
+    aren't part of the key."""
+
+    def __init__(self, maxsize: int) -> None:
+        assert maxsize > 0
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._values: "OrderedDict[K, V]" = OrderedDict()
+
+    def lookup(self, key: K, compute: Callable[[], V]) -> V:
+        """The value of key, computed and stored if it isn't cached."""
+        if key in self._values:
+            self.hits += 1
+            self._values.move_to_end(key)
+            return self._values[key]
+        self.misses += 1
+        value = compute()
+        self._values[key] = value
+        if len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        self._values.clear()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __str__(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (
+            f"{len(self)}/{self.maxsize} entries, "
+            f"{self.hits} hits, {self.misses} misses ({hit_rate:.0%} hit rate)"
+        )
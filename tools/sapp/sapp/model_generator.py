@@ -6,8 +6,8 @@
 import datetime
 import logging
 import os
-from collections import defaultdict
-from typing import Any, Dict, List, Optional, Tuple
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
 
 import ujson as json
 
@@ -28,6 +28,7 @@ from .models import (
     TraceFrameAnnotation,
     TraceKind,
 )
+from .compact_trace_graph import CompactTraceGraph
 from .pipeline import DictEntries, PipelineStep, Summary
 from .trace_graph import TraceGraph
 
@@ -54,17 +55,19 @@ class ModelGenerator(PipelineStep[DictEntries, TraceGraph]):
         self.summary["missing_postconditions"] = set()  # Set[Tuple[str, str]]
         self.summary["big_tito"] = set()  # Set[Tuple[str, str, int]]
 
-        self.graph = TraceGraph()
+        self.graph = (
+            CompactTraceGraph() if self.summary.get("compact_graph") else TraceGraph()
+        )
         self.summary["run"] = self._create_empty_run(status=RunStatus.INCOMPLETE)
         self.summary["run"].id = DBID()
 
         self.summary["precondition_entries"] = input["preconditions"]
         self.summary["postcondition_entries"] = input["postconditions"]
-        callables = self._compute_callables_count(input)
 
         log.info("Generating instances")
         for entry in input["issues"]:
-            self._generate_issue(self.summary["run"], entry, callables)
+            self._generate_issue(self.summary["run"], entry)
+        self._update_callables_count()
 
         if self.summary.get("store_unused_models"):
             for _key, entries in self.summary["postcondition_entries"].items():
@@ -77,14 +80,16 @@ class ModelGenerator(PipelineStep[DictEntries, TraceGraph]):
 
         return self.graph, self.summary
 
-    def _compute_callables_count(self, iters: Dict[str, Any]):
-        """Iterate over all issues and count the number of times each callable
-        is seen."""
-        count = dict.fromkeys([issue["callable"] for issue in iters["issues"]], 0)
-        for issue in iters["issues"]:
-            count[issue["callable"]] += 1
-
-        return count
+    def _update_callables_count(self) -> None:
+        """Count the number of times each callable is seen in the generated
+        issue instances. This is done after the fact because the issues may
+        be streamed and can only be iterated over once."""
+        count = Counter(
+            instance.callable_id.local_id
+            for instance in self.graph.get_issue_instances()
+        )
+        for instance in self.graph.get_issue_instances():
+            instance.callable_count = count[instance.callable_id.local_id]
 
     def _create_empty_run(
         self, status=RunStatus.FINISHED, status_description=None
@@ -114,7 +119,7 @@ class ModelGenerator(PipelineStep[DictEntries, TraceGraph]):
             return length
         return 0
 
-    def _generate_issue(self, run, entry, callablesCount):
+    def _generate_issue(self, run, entry):
         """Insert the issue instance into a run. This includes creating (for
         new issues) or finding (for existing issues) Issue objects to associate
         with the instances.
@@ -197,7 +202,7 @@ class ModelGenerator(PipelineStep[DictEntries, TraceGraph]):
             min_trace_length_to_sinks=self._get_minimum_trace_length(
                 entry["preconditions"]
             ),
-            callable_count=callablesCount[callable],
+            callable_count=0,
         )
 
         for sink in final_sinks:
@@ -4,6 +4,7 @@
 # LICENSE file in the root directory of this source tree.
 
 import enum
+import json
 import logging
 from collections import namedtuple
 from itertools import islice, tee
@@ -21,10 +22,13 @@ from sqlalchemy import (
     MetaData,
     String,
     Table,
+    Text,
     and_,
+    case,
     exc,
     func,
     inspect,
+    literal,
     or_,
     types,
 )
@@ -34,6 +38,7 @@ from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session, relationship
 
+from . import profiler
 from .errors import AIException
 from .iterutil import split_every
 
@@ -86,6 +91,12 @@ for t in [
 
 
 class PrepareMixin(object):
+    # Dialects on which _merge_by_keys looks up existing items with a single
+    # join against a temporary table of the keys (SQLITE and MEMORY databases).
+    # The table copies the types of the key columns, Enums included, so other
+    # dialects (XDB) keep the OR filters.
+    TEMPORARY_TABLE_DIALECTS = {"sqlite"}
+
     @classmethod
     def prepare(cls, session, pkgen, items):
         """This is called immediately before the items are written to the
@@ -138,25 +149,20 @@ class PrepareMixin(object):
 
         # Find existing items.
         existing_ids = {}  # map of item_hash -> existing ID
-        cls_attrs = [getattr(cls, attr.key) for attr in attrs]
-        for fetch_keys in split_every(BATCH_SIZE, keys.values()):
-            filters = []
-            for fetch_key in fetch_keys:
-                # Sub-filters for checking if item with fetch_key is in the DB
-                # Example: [
-                #   SharedText.kind.__eq__("feature"),
-                #   SharedText.contents.__eq__("via tito"),
-                # ]
-                subfilter = [
-                    getattr(cls, attr).__eq__(val) for attr, val in fetch_key.items()
-                ]
-                filters.append(and_(*subfilter))
-            existing_items = (
-                session.query(cls.id, *cls_attrs).filter(or_(*(filters))).all()
-            )
+        with profiler.phase(f"merge_by_keys {cls.__name__}"):
+            profiler.count("keys", len(keys))
+            if not keys:
+                existing_items = []
+            elif session.get_bind().dialect.name in cls.TEMPORARY_TABLE_DIALECTS:
+                existing_items = cls._fetch_by_temporary_table(
+                    session, list(keys.values()), attrs
+                )
+            else:
+                existing_items = cls._fetch_by_filters(session, keys.values(), attrs)
             for existing_item in existing_items:
                 item_hash = hash_item(existing_item)
                 existing_ids[item_hash] = existing_item.id
+            profiler.count("existing", len(existing_ids))
 
         # Now see if we can merge
         new_items = {}
@@ -173,6 +179,59 @@ class PrepareMixin(object):
                 new_items[item_hash] = i
                 yield i
 
+    @classmethod
+    def _fetch_by_filters(cls, session, keys, attrs):
+        """Queries the items with the given keys in batches of OR filters."""
+        cls_attrs = [getattr(cls, attr.key) for attr in attrs]
+        for fetch_keys in split_every(BATCH_SIZE, keys):
+            filters = []
+            for fetch_key in fetch_keys:
+                # Sub-filters for checking if item with fetch_key is in the DB
+                # Example: [
+                #   SharedText.kind.__eq__("feature"),
+                #   SharedText.contents.__eq__("via tito"),
+                # ]
+                subfilter = [
+                    getattr(cls, attr).__eq__(val) for attr, val in fetch_key.items()
+                ]
+                filters.append(and_(*subfilter))
+            yield from session.query(cls.id, *cls_attrs).filter(or_(*(filters))).all()
+
+    @classmethod
+    def _fetch_by_temporary_table(cls, session, keys, attrs):
+        """Loads the keys into a temporary table and queries the items with
+        the given keys by joining it against the (indexed) key columns."""
+        keys_table = Table(
+            f"merge_keys_{cls.__tablename__}",
+            MetaData(),
+            *[
+                Column(attr.key, attr.property.columns[0].type.copy())
+                for attr in attrs
+            ],
+            prefixes=["TEMPORARY"],
+        )
+        connection = session.connection()
+        keys_table.create(bind=connection)
+        try:
+            connection.execute(keys_table.insert(), keys)
+            cls_attrs = [getattr(cls, attr.key) for attr in attrs]
+            return (
+                session.query(cls.id, *cls_attrs)
+                .select_from(keys_table)
+                .join(
+                    cls,
+                    and_(
+                        *[
+                            getattr(cls, attr.key) == keys_table.c[attr.key]
+                            for attr in attrs
+                        ]
+                    ),
+                )
+                .all()
+            )
+        finally:
+            keys_table.drop(bind=connection)
+
     @classmethod
     def _merge_assocs(cls, session, items, id1, id2):
         new_items = {}
@@ -227,6 +286,8 @@ class SourceLocation(object):
     begin_column and we have a single point.
     """
 
+    __slots__ = ["line_no", "begin_column", "end_column"]
+
     def __init__(self, line_no, begin_column, end_column=None):
         self.line_no = line_no
         self.begin_column = begin_column
@@ -652,6 +713,9 @@ class IssueInstance(Base, PrepareMixin, MutableRecordMixin):  # noqa
 
     __tablename__ = "issue_instances"
 
+    # Covers looking up the instances of an issue in a run, see sapp.run_diff.
+    __table_args__ = (Index("ix_issue_instances_run_issue", "run_id", "issue_id"),)
+
     id: DBID = Column(BIGDBIDType, primary_key=True)
 
     location = Column(
@@ -963,6 +1027,12 @@ class Run(Base):  # noqa
         backref="run",
     )
 
+    profile = relationship(
+        "RunProfile",
+        primaryjoin="Run.id == foreign(RunProfile.run_id)",
+        uselist=False,
+    )
+
     status = Column(
         Enum(RunStatus), server_default="finished", nullable=False, index=True
     )
@@ -998,6 +1068,19 @@ class Run(Base):  # noqa
     def get_summary(self, **kwargs):
         session = Session.object_session(self)
 
+        code_counts = RunIssueCounts.get(session, self.id, IssueCountKind.CODE)
+        if code_counts:
+            return RunSummary(
+                commit_hash=self.commit_hash,
+                differential_id=self.differential_id,
+                id=self.id.resolved(),
+                job_id=self.job_id,
+                num_new_issues=sum(new for _, new in code_counts.values()),
+                num_total_issues=sum(total for total, _ in code_counts.values()),
+                alarm_counts={code: total for code, (total, _) in code_counts.items()},
+            )
+
+        # Runs without issues, or saved before RunIssueCounts existed.
         return RunSummary(
             commit_hash=self.commit_hash,
             differential_id=self.differential_id,
@@ -1040,6 +1123,121 @@ class Run(Base):  # noqa
         )
 
 
+class RunProfile(Base):  # noqa
+    """The profile of the pipeline that created a run, see sapp.profiler.
+
+    It is kept in its own table rather than in a column of runs, so that
+    existing databases only need the table to be created."""
+
+    __tablename__ = "run_profiles"
+
+    run_id = Column(BIGDBIDType, primary_key=True)
+
+    profile = Column(
+        Text,
+        doc=(
+            "JSON summary of the wall, CPU and GC time, peak RSS growth and "
+            "item counts of each step and its phases"
+        ),
+        nullable=False,
+    )
+
+    def get_profile(self) -> Dict[str, Any]:
+        return json.loads(self.profile)
+
+
+class IssueCountKind(enum.Enum):
+    # Do NOT reorder the enums, see RunStatus.
+    code = enum.auto()
+    filename = enum.auto()
+    callable = enum.auto()
+
+    @classproperty
+    def CODE(cls):
+        return cls.code
+
+    @classproperty
+    def FILENAME(cls):
+        return cls.filename
+
+    @classproperty
+    def CALLABLE(cls):
+        return cls.callable
+
+
+class RunIssueCounts(Base):  # noqa
+    """The number of issue instances of a run, and of new ones, by code,
+    filename or callable. Computed once when the run is saved, so that run
+    summaries read a row per code instead of scanning the instances.
+
+    Runs saved before the table existed have no counts, and Run.get_summary
+    scans their instances instead."""
+
+    __tablename__ = "run_issue_counts"
+
+    run_id = Column(BIGDBIDType, primary_key=True)
+
+    kind = Column(Enum(IssueCountKind), primary_key=True)
+
+    key = Column(
+        types.BigInteger,
+        primary_key=True,
+        doc="The code, or the id of the filename or callable SharedText",
+    )
+
+    num_issues = Column(Integer, nullable=False)
+
+    num_new_issues = Column(Integer, nullable=False)
+
+    @classmethod
+    def compute(cls, session, run_id) -> None:
+        """Counts the issue instances of the run, which must not have been
+        counted yet."""
+        for kind, key in [
+            (IssueCountKind.CODE, Issue.code),
+            (IssueCountKind.FILENAME, IssueInstance.filename_id),
+            (IssueCountKind.CALLABLE, IssueInstance.callable_id),
+        ]:
+            counts = (
+                session.query(
+                    IssueInstance.run_id,
+                    literal(kind.name),
+                    key,
+                    func.count(),
+                    func.sum(case([(IssueInstance.is_new_issue, 1)], else_=0)),
+                )
+                .filter(IssueInstance.run_id == run_id)
+                .group_by(IssueInstance.run_id, key)
+            )
+            if kind == IssueCountKind.CODE:
+                counts = counts.join(Issue, Issue.id == IssueInstance.issue_id)
+            session.execute(
+                cls.__table__.insert().from_select(
+                    [
+                        cls.run_id,
+                        cls.kind,
+                        cls.key,
+                        cls.num_issues,
+                        cls.num_new_issues,
+                    ],
+                    counts.subquery().select(),
+                )
+            )
+
+    @classmethod
+    def get(cls, session, run_id, kind: IssueCountKind) -> Dict[int, Tuple[int, int]]:
+        """(Number of instances, of new instances) by key, empty if the run has
+        no counts."""
+        return {
+            key: (num_issues, num_new_issues)
+            for key, num_issues, num_new_issues in session.query(
+                cls.key, cls.num_issues, cls.num_new_issues
+            )
+            .filter(cls.run_id == run_id)
+            .filter(cls.kind == kind)
+        }
+
+
 class RunSummary:
     def __init__(
         self,
@@ -1104,6 +1302,29 @@ class TraceFrameLeafAssoc(Base, PrepareMixin, RecordMixin):  # noqa
         return cls._merge_assocs(session, items, cls.trace_frame_id, cls.leaf_id)
 
 
+# pyre-fixme[11]: Type `Base` is not defined.
+class CallableLeafDistance(Base, PrepareMixin, RecordMixin):  # noqa
+    """The fewest trace frames from a callable to a leaf (a source or sink
+    kind) in a run: 0 if a trace frame of the callable leads to the leaf
+    directly, 1 if it leads to a callable at distance 0, and so on. Computed by
+    ComputeLeafDistances, for the runs analyzed with --leaf-distances, so that
+    finding the callables near a leaf is a lookup instead of a traversal."""
+
+    __tablename__ = "callable_leaf_distances"
+
+    __table_args__ = (
+        Index("ix_callable_leaf_distances_distance", "run_id", "leaf_id", "distance"),
+    )
+
+    run_id = Column(BIGDBIDType, primary_key=True)
+
+    leaf_id = Column(BIGDBIDType, primary_key=True)
+
+    callable_id = Column(BIGDBIDType, primary_key=True)
+
+    distance = Column(Integer, nullable=False)
+
+
 # pyre-fixme[11]: Type `Base` is not defined.
 class IssueInstanceFixInfo(Base, PrepareMixin, RecordMixin):  # noqa
     __tablename__ = "issue_instance_fix_info"
@@ -1445,8 +1666,19 @@ class PrimaryKeyGenerator:
         TraceFrameAnnotation,
     }
 
-    # Map from class name to an ID range (next_id, max_reserved_id)
-    pks: Dict[str, Tuple[int, int]] = {}
+    # Attempts at the reservation transaction when it fails to lock or insert
+    # rows of primary_keys, e.g. because of concurrent ingestion jobs.
+    RESERVE_ATTEMPTS: int = 3
+
+    def __init__(self, block_size: int = 0) -> None:
+        """block_size - reserve at least this many ids of a class at once, and
+        hand them out to later reservations of this generator, so that
+        processes ingesting many runs into the same database rarely touch
+        the primary_keys table. Ids that end up unused are skipped.
+        """
+        self.block_size = block_size
+        # Map from class name to an ID range (next_id, max_reserved_id)
+        self.pks: Dict[str, Tuple[int, int]] = {}
 
     def reserve(
         self,
@@ -1460,74 +1692,91 @@ class PrimaryKeyGenerator:
         saving_classes - class objects that need to be saved e.g. Issue, Run
         item_counts - map from class name to the number of items, for preallocating
         id ranges
+        use_lock - also skip the ids up to the largest one in the table of each
+        class
+
+        The ranges of all the classes are reserved in a single transaction,
+        unless they are left from an earlier reservation.
         """
-        query_classes = {cls for cls in saving_classes if cls in self.QUERY_CLASSES}
-        for cls in query_classes:
+        counts: Dict[Type, int] = {}
+        for cls in saving_classes:
+            if cls not in self.QUERY_CLASSES:
+                continue
             if item_counts and cls.__name__ in item_counts:
                 count = item_counts[cls.__name__]
             else:
                 count = 1
-            self._reserve_id_range(session, cls, count, use_lock)
+            if not use_lock and self._available(cls) >= count:
+                continue
+            counts[cls] = count
 
+        if counts:
+            self._reserve_id_ranges(session, counts, use_lock)
         return self
 
-    def _lock_pk_with_retries(
-        self, session: Session, cls: Type
-    ) -> Optional[PrimaryKey]:
-        cls_pk: Optional[PrimaryKey] = None
-        retries: int = 3
-        while retries > 0:
-            try:
-                cls_pk = (
-                    session.query(PrimaryKey)
-                    .filter(PrimaryKey.table_name == cls.__name__)
-                    .with_for_update()
-                    .first()
-                )
-                # if we're here, the record has been locked, or there is no record
-                retries = 0
-            except exc.OperationalError as ex:
-                # Failed to get exclusive lock on the record, so we retry
-                retries -= 1
-                # Re-raise the exception if our retries are exhausted
-                if retries == 0:
-                    raise ex
-        return cls_pk
-
-    def _reserve_id_range(
-        self, session: Session, cls: Type, count: int, use_lock: bool
+    def _available(self, cls: Type) -> int:
+        next_id, max_reserved_id = self.pks.get(cls.__name__, (1, 0))
+        return max_reserved_id - next_id + 1
+
+    def _reserve_id_ranges(
+        self, session: Session, counts: Dict[Type, int], use_lock: bool
     ) -> None:
-        cls_pk = self._lock_pk_with_retries(session, cls)
-        if use_lock or not cls_pk:
-            # If cls_pk is None, then we query the data table for the max ID
-            # and use that as the current_id in the primary_keys table. This
-            # should only occur once (the except with a rollback means any
-            # additional attempt will fail to add a row, and use the "current"
-            # id value)
-            row = session.query(cls.id).order_by(cls.id.desc()).first()
+        # Rows are locked in the order of their names, so that concurrent
+        # reservations can't deadlock.
+        classes = sorted(counts, key=lambda cls: cls.__name__)
+        attempts = self.RESERVE_ATTEMPTS
+        while True:
             try:
-                if not cls_pk:
-                    session.execute(
-                        "INSERT INTO primary_keys(table_name, current_id) \
-                        VALUES (:table_name, :current_id)",
-                        {
-                            "table_name": cls.__name__,
-                            "current_id": (row.id) if row else 0,
-                        },
-                    )
-                else:
-                    cls_pk.current_id = row.id if row else 0
+                ranges = self._reserve_id_ranges_once(
+                    session, classes, counts, use_lock
+                )
                 session.commit()
-            except exc.SQLAlchemyError:
+            except (exc.OperationalError, exc.IntegrityError):
+                # Failed to lock the rows, or another job inserted a row at the
+                # same time, so we retry.
                 session.rollback()
-            cls_pk = self._lock_pk_with_retries(session, cls)
-
-        if cls_pk:
-            next_id = cls_pk.current_id + 1
+                attempts -= 1
+                if attempts == 0:
+                    raise
+                continue
+            self.pks.update(ranges)
+            return
+
+    def _reserve_id_ranges_once(
+        self,
+        session: Session,
+        classes: List[Type],
+        counts: Dict[Type, int],
+        use_lock: bool,
+    ) -> Dict[str, Tuple[int, int]]:
+        cls_pks: Dict[str, PrimaryKey] = {
+            cls_pk.table_name: cls_pk
+            for cls_pk in session.query(PrimaryKey)
+            .filter(PrimaryKey.table_name.in_([cls.__name__ for cls in classes]))
+            .order_by(PrimaryKey.table_name)
+            .with_for_update()
+            .populate_existing()
+        }
+        ranges: Dict[str, Tuple[int, int]] = {}
+        for cls in classes:
+            cls_pk = cls_pks.get(cls.__name__)
+            if use_lock or not cls_pk:
+                # If cls_pk is None, then we query the data table for the max ID
+                # and use that as the current_id in the primary_keys table. This
+                # should only occur once per table. With use_lock, current_id
+                # only moves forward, as other jobs may have reserved ids that
+                # they haven't written yet.
+                row = session.query(cls.id).order_by(cls.id.desc()).first()
+                current_id = row.id if row else 0
+                if cls_pk:
+                    cls_pk.current_id = max(cls_pk.current_id, current_id)
+                else:
+                    cls_pk = PrimaryKey(table_name=cls.__name__, current_id=current_id)
+                    session.add(cls_pk)
+            count = max(counts[cls], self.block_size)
+            ranges[cls.__name__] = (cls_pk.current_id + 1, cls_pk.current_id + count)
             cls_pk.current_id = cls_pk.current_id + count
-            pk_entry: Tuple[int, int] = (next_id, cls_pk.current_id)
-            session.commit()
-            self.pks[cls.__name__] = pk_entry
+        return ranges
 
     def get(self, cls):
         assert cls in self.QUERY_CLASSES, (
@@ -0,0 +1,212 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""A sidecar index from callable to the positions of its entries in the
+analysis output, so the raw json of a callable can be looked up without
+rescanning the output.
+
+The index is a single file, stored next to the analysis output (and its
+*metadata.json), laid out as:
+
+    header      MAGIC, number of slots, number of records, size of `files`
+    files       json list of [file name, size, mtime_ns] of every shard, and
+                the member table of compressed shards, to seek in them
+    slots       open addressing hash table of absolute record offsets + 1,
+                0 for an empty slot
+    records     [hash, shard, offset, length, key length, key] per entry
+
+It is read through mmap, so a lookup only touches the few pages of the slots
+and records it probes, whatever the size of the output.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+from array import array
+from typing import IO, Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import xxhash
+
+from .analysis_output import AnalysisOutput
+from .base_parser import BaseParser, EntryPosition
+from .compressed_files import compression, find_blocks, open_seekable
+from .sharded_files import ShardedFileComponents
+
+
+log: logging.Logger = logging.getLogger("sapp")
+
+INDEX_SUFFIX = ".callable-index"
+
+MAGIC = b"SAPPIDX1"
+HEADER = struct.Struct("<8sQQQ")
+SLOT = struct.Struct("<Q")
+RECORD = struct.Struct("<QIQII")
+
+
+def _hash(key: bytes) -> int:
+    return xxhash.xxh64_intdigest(key)
+
+
+def index_path(input: AnalysisOutput) -> Optional[str]:
+    """Where the index of input is stored, or None if input isn't backed by
+    files (e.g. it was created from a handle)."""
+    if input.file_handle is not None or not input.filename_spec:
+        return None
+    if input.is_sharded():
+        components = ShardedFileComponents(input.filename_spec)
+        return os.path.join(
+            components.directory,
+            components.stem + components.extension + INDEX_SUFFIX,
+        )
+    return input.filename_spec + INDEX_SUFFIX
+
+
+def _file_stats(file_names: Iterable[str]) -> List[List[Any]]:
+    stats = []
+    for name in file_names:
+        stat = os.stat(name)
+        stats.append([os.path.basename(name), stat.st_size, stat.st_mtime_ns])
+    return stats
+
+
+def _files(file_names: List[str]) -> List[List[Any]]:
+    """The stats of the files, with the member table of compressed ones."""
+    files = _file_stats(file_names)
+    for name, file in zip(file_names, files):
+        if compression(name) is not None:
+            file.append(find_blocks(name))
+    return files
+
+
+class OffsetIndex:
+    def __init__(self, path: str, directory: str) -> None:
+        self.path = path
+        # Shard file names are stored relative to the index.
+        self.directory = directory
+        with open(path, "rb") as f:
+            self._mmap: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._num_slots, self.num_records, files_size = HEADER.unpack_from(
+            self._mmap, 0
+        )
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a callable index")
+        self.files: List[List[Any]] = json.loads(
+            self._mmap[HEADER.size : HEADER.size + files_size]
+        )
+        self._slots_offset: int = HEADER.size + files_size
+        self._shards: Dict[int, Union[mmap.mmap, IO[bytes]]] = {}
+
+    @classmethod
+    def write(
+        cls, path: str, file_names: List[str], positions: Iterable[EntryPosition]
+    ) -> None:
+        """Writes the index atomically, so that a reader never sees a partial
+        index."""
+        files = json.dumps(_files(file_names)).encode()
+
+        records = bytearray()
+        record_offsets: List[Tuple[int, int]] = []
+        for position in positions:
+            key = position.callable.encode()
+            key_hash = _hash(key)
+            record_offsets.append((key_hash, len(records)))
+            records += RECORD.pack(
+                key_hash, position.shard, position.offset, position.length, len(key)
+            )
+            records += key
+
+        # Keep the load factor at or under 1/2 so that probe chains are short.
+        num_slots = 1
+        while num_slots < 2 * len(record_offsets):
+            num_slots <<= 1
+        mask = num_slots - 1
+        records_offset = HEADER.size + len(files) + num_slots * SLOT.size
+        slots = array("Q", bytes(num_slots * SLOT.size))
+        for key_hash, record_offset in record_offsets:
+            slot = key_hash & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = records_offset + record_offset + 1
+
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, num_slots, len(record_offsets), len(files)))
+            f.write(files)
+            f.write(slots.tobytes())
+            f.write(records)
+        os.replace(temporary_path, path)
+        log.info("Wrote index of %d entries to %s", len(record_offsets), path)
+
+    @classmethod
+    def get_or_build(cls, parser: BaseParser, input: AnalysisOutput) -> "OffsetIndex":
+        """Opens the index of input, (re)building it if it doesn't exist yet or
+        the output changed since it was built."""
+        path = index_path(input)
+        if path is None:
+            raise ValueError(f"{input} can not be indexed")
+        file_names = list(input.file_names())
+        directory = os.path.dirname(path)
+        if os.path.exists(path):
+            index = cls(path, directory)
+            if [file[:3] for file in index.files] == _file_stats(file_names):
+                return index
+            log.info("%s is out of date", path)
+            index.close()
+
+        log.info("Indexing %s", input)
+        cls.write(path, file_names, parser.get_json_file_offsets(input))
+        return cls(path, directory)
+
+    def lookup(self, callable: str) -> List[EntryPosition]:
+        """Positions of all entries (models and issues) of the callable."""
+        key = callable.encode()
+        key_hash = _hash(key)
+        mask = self._num_slots - 1
+        slot = key_hash & mask
+        positions = []
+        while True:
+            (record,) = SLOT.unpack_from(
+                self._mmap, self._slots_offset + slot * SLOT.size
+            )
+            if record == 0:
+                return positions
+            record -= 1
+            record_hash, shard, offset, length, key_size = RECORD.unpack_from(
+                self._mmap, record
+            )
+            key_offset = record + RECORD.size
+            if (
+                record_hash == key_hash
+                and self._mmap[key_offset : key_offset + key_size] == key
+            ):
+                positions.append(EntryPosition(callable, shard, offset, length))
+            slot = (slot + 1) & mask
+
+    def get_json(self, position: EntryPosition) -> Dict[str, Any]:
+        shard = self._shards.get(position.shard)
+        if shard is None:
+            file = self.files[position.shard]
+            name = os.path.join(self.directory, file[0])
+            if len(file) > 3:
+                shard = open_seekable(name, file[3])
+            else:
+                with open(name, "rb") as f:
+                    shard = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._shards[position.shard] = shard
+        if isinstance(shard, mmap.mmap):
+            data = shard[position.offset : position.offset + position.length]
+        else:
+            shard.seek(position.offset)
+            data = shard.read(position.length)
+        return json.loads(data)
+
+    def close(self) -> None:
+        for shard in self._shards.values():
+            shard.close()
+        self._shards = {}
+        self._mmap.close()
@@ -4,42 +4,147 @@
 # LICENSE file in the root directory of this source tree.
 
 import logging
+import marshal
+import os
 from multiprocessing import Pool
-from typing import Any, Dict, Iterable
+from typing import IO, Any, Dict, Iterable, List, Optional, Tuple
 
 from .analysis_output import AnalysisOutput
-from .base_parser import BaseParser
+from .base_parser import BaseParser, IssueFilter, ParseType
+from .compressed_files import compression, open_file
 
 
 log: logging.Logger = logging.getLogger("sapp")
 logging.basicConfig(format="%(asctime)s [%(levelname)s] %(message)s")
 
 
+# (path, start, end) of a range of lines to parse. A start of None means the
+# whole file has to be parsed at once.
+ByteRange = Tuple[str, Optional[int], Optional[int]]
+
+
 # We are going to call this per process, so we need to pass in and return
 # serializable data. And as a single arg, as far as I can tell. Which is why the
 # args type looks so silly.
 def parse(args):
-    (base_parser, repo_dir, metadata), path = args
+    (base_parser, repo_dir, issue_filter, metadata, parse_types), byte_range = args
+    path, start, end = byte_range
 
-    parser = base_parser(repo_dir)
+    parser = base_parser(repo_dir, issue_filter)
+    parser.parse_types = parse_types
     parser.initialize(metadata)
 
-    with open(path) as handle:
-        return list(parser.parse_handle(handle))
+    if start is None:
+        with open_file(path) as handle:
+            return _compact(parser.parse_handle(handle))
+
+    with open(path, "rb") as handle:
+        return _compact(parser.parse_lines(_read_lines(handle, start, end)))
+
+
+def _read_lines(handle: IO[bytes], start: int, end: int) -> Iterable[bytes]:
+    """Yields the lines that begin within [start, end). The line straddling
+    start belongs to the previous range."""
+    if start == 0:
+        handle.seek(0)
+        offset = 0
+    else:
+        handle.seek(start - 1)
+        offset = start - 1 + len(handle.readline())
+    while offset < end:
+        line = handle.readline()
+        if not line:
+            return
+        offset += len(line)
+        yield line
+
+
+def _compact(entries: Iterable[Dict[str, Any]]) -> bytes:
+    """marshal is much cheaper than pickle, for both the worker and the parent,
+    but only handles builtin types, so the ParseType is sent as its value."""
+    result = []
+    for entry in entries:
+        entry["type"] = entry["type"].value
+        result.append(entry)
+    return marshal.dumps(result)
+
+
+def _expand(data: bytes) -> List[Dict[str, Any]]:
+    entries = marshal.loads(data)
+    for entry in entries:
+        entry["type"] = ParseType(entry["type"])
+    return entries
 
 
 class ParallelParser(BaseParser):
-    def __init__(self, parser_class, repo_dir=None) -> None:
-        super().__init__(repo_dir)
+    # Line delimited files are split into ranges of about
+    # total size / (processes * RANGES_PER_PROCESS), so that a few slow ranges
+    # don't hold up the whole parse, but not smaller than MIN_RANGE_SIZE.
+    RANGES_PER_PROCESS = 4
+    MIN_RANGE_SIZE = 1 << 20
+
+    def __init__(
+        self,
+        parser_class,
+        repo_dir=None,
+        processes: Optional[int] = None,
+        issue_filter: Optional[IssueFilter] = None,
+    ) -> None:
+        super().__init__(repo_dir, issue_filter)
         self.parser = parser_class
+        self.processes: int = processes or os.cpu_count() or 1
 
     def parse(self, input: AnalysisOutput) -> Iterable[Dict[str, Any]]:
         log.info("Parsing in parallel")
-        files = list(input.file_names())
+        ranges = self._byte_ranges(list(input.file_names()))
 
-        # Pair up the arguments with each file.
-        args = zip([(self.parser, self.repo_dir, input.metadata)] * len(files), files)
+        # Pair up the arguments with each range.
+        args = zip(
+            [
+                (
+                    self.parser,
+                    self.repo_dir,
+                    self.issue_filter,
+                    input.metadata,
+                    self.parse_types,
+                )
+            ]
+            * len(ranges),
+            ranges,
+        )
 
-        with Pool(processes=None) as pool:
+        with Pool(processes=self.processes) as pool:
             for f in pool.imap_unordered(parse, args):
-                yield from f
+                yield from _expand(f)
+
+    def _byte_ranges(self, files: List[str]) -> List[ByteRange]:
+        parser = self.parser(self.repo_dir)
+        first_entry_offsets = {}
+        for path in files:
+            if compression(path) is not None:
+                # Compressed files are parsed as a whole, as they can't be
+                # split without decompressing them first.
+                first_entry_offsets[path] = None
+                continue
+            with open(path, "rb") as handle:
+                first_entry_offsets[path] = parser.get_first_entry_offset(handle)
+
+        total_size = sum(os.path.getsize(path) for path in files)
+        range_size = max(
+            self.MIN_RANGE_SIZE,
+            total_size // (self.processes * self.RANGES_PER_PROCESS) + 1,
+        )
+
+        ranges: List[ByteRange] = []
+        for path in files:
+            first_entry_offset = first_entry_offsets[path]
+            if first_entry_offset is None:
+                ranges.append((path, None, None))
+                continue
+            size = os.path.getsize(path)
+            ranges.extend(
+                (path, start, min(start + range_size, size))
+                for start in range(first_entry_offset, size, range_size)
+            )
+        log.info("Split %d file(s) into %d ranges", len(files), len(ranges))
+        return ranges
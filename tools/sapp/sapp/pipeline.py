@@ -5,10 +5,12 @@
 
 import logging
 from abc import ABCMeta, abstractmethod
+from contextlib import ExitStack
 from datetime import datetime, timedelta
 from typing import Any, Dict, Generic, List, Optional, Tuple, TypeVar
 
 from .analysis_output import AnalysisOutput
+from .profiler import Profiler, phase
 
 
 log = logging.getLogger("sapp")
@@ -19,6 +21,8 @@ T_out = TypeVar("T_out")
 
 Summary = Dict[str, Any]  # blob of objects that gets passed through the pipeline
 InputFiles = Tuple[AnalysisOutput, Optional[AnalysisOutput]]
+# "issues" is a list, or a generator when summary["streaming"] is set. Steps
+# must then consume it only once and should pass it on lazily.
 DictEntries = Dict[str, Any]
 
 
@@ -45,8 +49,14 @@ class PipelineStep(Generic[T_in, T_out], metaclass=ABCMeta):
 
 
 class Pipeline(object):
-    def __init__(self, steps: List[PipelineStep[Any, Any]]):
+    def __init__(
+        self,
+        steps: List[PipelineStep[Any, Any]],
+        profiler: Optional[Profiler] = None,
+    ):
         self.steps: List[PipelineStep[Any, Any]] = steps
+        # Profiles each step, and the phases the steps mark, when set.
+        self.profiler = profiler
 
     def run(
         self, first_input, summary: Optional[Summary] = None
@@ -55,10 +65,15 @@ class Pipeline(object):
             summary = {}
         next_input = first_input
         timing = []
-        for step in self.steps:
-            start_time = datetime.now()
-            next_input, summary = step.run(next_input, summary)
-            timing.append((step.__class__.__name__, datetime.now() - start_time))
+        with ExitStack() as stack:
+            if self.profiler is not None:
+                stack.enter_context(self.profiler.activate())
+            for step in self.steps:
+                name = step.__class__.__name__
+                start_time = datetime.now()
+                with phase(name, category="step"):
+                    next_input, summary = step.run(next_input, summary)
+                timing.append((name, datetime.now() - start_time))
         log.info(
             "Step timing: %s",
             ", ".join([f"{name} took {time_str(delta)}" for name, delta in timing]),
@@ -0,0 +1,193 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Records the wall time, CPU time, GC time, growth of the peak RSS and item
+counts of the pipeline steps, and of named phases within them.
+
+Pipeline steps are profiled by the Pipeline when it is given a Profiler.
+Code further down, which has no access to the profiler, marks phases and
+counts items through the module functions, which do nothing unless a
+profiler is active:
+
+    with profiler.phase("merge SharedText"):
+        ...
+        profiler.count("rows", len(rows))
+
+A profile can be exported as Chrome trace events (chrome://tracing or
+Perfetto) and as a summary of the steps, which is stored with the run.
+"""
+
+import gc
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, DefaultDict, Dict, Iterator, List, Optional
+
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+_active: Optional["Profiler"] = None
+
+
+def _peak_rss() -> int:
+    """Peak resident set size of the process in bytes, or 0 if unknown."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Span:
+    __slots__ = [
+        "name",
+        "category",
+        "start",
+        "wall",
+        "cpu",
+        "gc",
+        "peak_rss_delta",
+        "counts",
+    ]
+
+    def __init__(self, name: str, category: str, start: float) -> None:
+        self.name = name
+        self.category = category
+        self.start = start
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.gc = 0.0
+        self.peak_rss_delta = 0
+        self.counts: DefaultDict[str, int] = defaultdict(int)
+
+    def measurements(self) -> Dict[str, Any]:
+        return {
+            "wall": round(self.wall, 6),
+            "cpu": round(self.cpu, 6),
+            "gc": round(self.gc, 6),
+            "peak_rss_delta": self.peak_rss_delta,
+            "counts": dict(self.counts),
+        }
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+        self._open: List[Span] = []
+        self._origin = time.perf_counter()
+        self._gc_time = 0.0
+        self._gc_start: Optional[float] = None
+
+    @contextmanager
+    def activate(self) -> Iterator["Profiler"]:
+        """Makes this the profiler that phase() and count() record to, and
+        measures the time spent collecting garbage meanwhile."""
+        global _active
+        previous, _active = _active, self
+        gc.callbacks.append(self._on_gc)
+        try:
+            yield self
+        finally:
+            gc.callbacks.remove(self._on_gc)
+            _active = previous
+
+    def _on_gc(self, phase: str, info: Dict[str, int]) -> None:
+        if phase == "start":
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            self._gc_time += time.perf_counter() - self._gc_start
+            self._gc_start = None
+
+    @contextmanager
+    def span(self, name: str, category: str = "phase") -> Iterator[Span]:
+        span = Span(name, category, time.perf_counter())
+        self.spans.append(span)
+        self._open.append(span)
+        cpu, gc_time, peak_rss = time.process_time(), self._gc_time, _peak_rss()
+        try:
+            yield span
+        finally:
+            span.wall = time.perf_counter() - span.start
+            span.cpu = time.process_time() - cpu
+            span.gc = self._gc_time - gc_time
+            span.peak_rss_delta = _peak_rss() - peak_rss
+            self._open.pop()
+
+    def count(self, name: str, number: int = 1) -> None:
+        """Adds to a count of the innermost open span."""
+        if self._open:
+            self._open[-1].counts[name] += number
+
+    def summary(self) -> Dict[str, Any]:
+        """The measurements of each step, with the measurements of the phases
+        within it added up by name."""
+        steps: List[Dict[str, Any]] = []
+        phases: Dict[str, Dict[str, Any]] = {}
+        for span in self.spans:
+            if span.category == "step":
+                phases = {}
+                steps.append({"name": span.name, **span.measurements()})
+                steps[-1]["phases"] = phases
+                continue
+            if not steps:
+                continue
+            phase = phases.setdefault(
+                span.name,
+                {"calls": 0, "wall": 0.0, "cpu": 0.0, "gc": 0.0, "counts": {}},
+            )
+            phase["calls"] += 1
+            for key in ["wall", "cpu", "gc"]:
+                phase[key] = round(phase[key] + getattr(span, key), 6)
+            for key, number in span.counts.items():
+                phase["counts"][key] = phase["counts"].get(key, 0) + number
+        return {"steps": steps}
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """The spans as complete events of the Chrome trace event format."""
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": round((span.start - self._origin) * 1e6),
+                    "dur": round(span.wall * 1e6),
+                    "pid": pid,
+                    "tid": 0,
+                    "args": span.measurements(),
+                }
+                for span in self.spans
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write_chrome_trace(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+@contextmanager
+def phase(name: str, category: str = "phase") -> Iterator[None]:
+    """Profiles the enclosed code as a phase of the active profiler, if any."""
+    if _active is None:
+        yield
+        return
+    with _active.span(name, category):
+        yield
+
+
+def count(name: str, number: int = 1) -> None:
+    """Adds to a count of the innermost phase or step of the active profiler,
+    if any."""
+    if _active is not None:
+        _active.count(name, number)
@@ -6,11 +6,26 @@
 """Parse Pysa/Taint output for Zoncolan processing"""
 
 import logging
-from typing import IO, Any, Dict, Iterable, List, Tuple
+import re
+from collections import defaultdict
+from itertools import groupby
+from typing import (
+    IO,
+    Any,
+    DefaultDict,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+    Union,
+)
 
 import ujson as json
 
-from . import errors
+from . import errors, profiler
 from .analysis_output import AnalysisOutput, Metadata
 from .base_parser import (
     BaseParser,
@@ -18,10 +33,37 @@ from .base_parser import (
     ParseType,
     log_trace_keyerror_in_generator,
 )
+from .compressed_files import Block, blocks_of, open_file, open_seekable
 
 
 log = logging.getLogger("sapp")
 
+# The start of a model or issue line in jsonlines output, up to the callable.
+# Lines that don't start like this are decoded to find out what they are.
+_ENTRY_PREFIX: Pattern[bytes] = re.compile(
+    rb'\{\s*"kind"\s*:\s*"(model|issue)"\s*,\s*"data"\s*:\s*\{\s*'
+    rb'"callable"\s*:\s*"((?:[^"\\]|\\.)*)"'
+)
+
+# The start of an issue line in jsonlines output, up to the code.
+_ISSUE_PREFIX: Pattern[bytes] = re.compile(
+    rb'\{\s*"kind"\s*:\s*"issue"\s*,\s*"data"\s*:\s*\{\s*'
+    rb'"callable"\s*:\s*"((?:[^"\\]|\\.)*)"\s*,\s*'
+    rb'"callable_line"\s*:\s*-?\d+\s*,\s*"code"\s*:\s*(\d+)'
+)
+_ISSUE_PREFIX_TEXT: Pattern[str] = re.compile(_ISSUE_PREFIX.pattern.decode())
+
+ConditionKey = Tuple[ParseType, str, str]  # (type, caller, caller port)
+
+
+def _decode_string(escaped: Union[str, bytes]) -> str:
+    """Decodes the contents of a JSON string."""
+    if isinstance(escaped, str):
+        return json.loads('"' + escaped + '"') if "\\" in escaped else escaped
+    if b"\\" in escaped:
+        return json.loads(b'"' + escaped + b'"')
+    return escaped.decode()
+
 
 class Parser(BaseParser):
     """The parser takes a json file as input, and provides a simplified output
@@ -29,6 +71,13 @@ class Parser(BaseParser):
     """
 
     def parse(self, input: AnalysisOutput) -> Iterable[Dict[str, Any]]:
+        if (
+            self.reachable_only
+            or ParseType.PRECONDITION not in self.parse_types
+            and ParseType.POSTCONDITION not in self.parse_types
+        ) and self._can_scan(input):
+            yield from self._parse_reachable(input)
+            return
         for handle in input.file_handles():
             for entry in self.parse_handle(handle):
                 yield entry
@@ -40,8 +89,8 @@ class Parser(BaseParser):
     # Instead of returning the actual json from the AnalysisOutput, we return
     # location information so it can be retrieved later.
     def get_json_file_offsets(self, input: AnalysisOutput) -> Iterable[EntryPosition]:
-        for handle in input.file_handles():
-            for entry, position in self._parse_v2(handle):
+        for shard, handle in enumerate(input.file_handles()):
+            for entry, position in self._parse_v2(handle, shard):
                 callable = self._get_callable(entry["data"].get("callable")).lstrip(
                     "\\"
                 )
@@ -49,18 +98,52 @@ class Parser(BaseParser):
                     callable=callable,
                     shard=position["shard"],
                     offset=position["offset"],
+                    length=position["length"],
                 )
 
     # Given a path and an offset, return the json in mostly-raw form.
     def get_json_from_file_offset(self, path: str, offset: int) -> Dict[str, Any]:
-        with open(path) as fh:
+        with open_seekable(path) as fh:
             fh.seek(offset)
             return json.loads(fh.readline())
 
+    def get_first_entry_offset(self, handle: IO[bytes]) -> Optional[int]:
+        if self._guess_file_version(handle) != 2:
+            return None
+        handle.readline()
+        return handle.tell()
+
+    def parse_lines(
+        self, lines: Iterable[Union[str, bytes]]
+    ) -> Iterable[Dict[str, Any]]:
+        for line in lines:
+            if self._is_filtered_issue_line(line):
+                continue
+            entry = json.loads(line)
+            if entry:
+                yield from self._parse_by_type(entry)
+
+    def _is_filtered_issue_line(self, line: Union[str, bytes]) -> bool:
+        """Whether the line is an issue failing the issue filter on its code
+        or callable, found out without decoding the line if it starts as
+        expected."""
+        if self.issue_filter is None:
+            return False
+        if isinstance(line, bytes):
+            match = _ISSUE_PREFIX.match(line)
+        else:
+            match = _ISSUE_PREFIX_TEXT.match(line)
+        if match is None or self.issue_filter.keeps(
+            int(match.group(2)), _decode_string(match.group(1)), None
+        ):
+            return False
+        profiler.count("filtered issues")
+        return True
+
     def _parse_basic(self, handle: IO[str]) -> Iterable[Dict[str, Any]]:
         file_version = self._guess_file_version(handle)
         if file_version == 2:
-            for entry, _ in self._parse_v2(handle):
+            for entry, _ in self._parse_v2(handle, filter_issues=True):
                 yield entry
         else:
             yield from self._parse_v1(handle)
@@ -73,26 +156,190 @@ class Parser(BaseParser):
         return results
 
     def _parse_v2(
-        self, handle: IO[str]
+        self, handle: IO[str], shard: int = 0, filter_issues: bool = False
     ) -> Iterable[Tuple[Dict[str, Any], Dict[str, int]]]:
         """Parse analysis in jsonlines format:
             { "file_version": 2, "config": <json> }
             { <error1> }
             { <error2> }
             ...
+
+        With filter_issues, the issue lines that can be seen to fail the issue
+        filter without decoding them are skipped.
         """
         header = json.loads(handle.readline())
         assert header["file_version"] == 2
 
-        shard = 0
-
         offset, line = handle.tell(), handle.readline()
         while line:
+            next_offset = handle.tell()
+            if filter_issues and self._is_filtered_issue_line(line):
+                offset, line = next_offset, handle.readline()
+                continue
             entry = json.loads(line)
             if entry:
-                position = {"shard": shard, "offset": offset}
+                position = {
+                    "shard": shard,
+                    "offset": offset,
+                    "length": next_offset - offset,
+                }
                 yield entry, position
-            offset, line = handle.tell(), handle.readline()
+            offset, line = next_offset, handle.readline()
+
+    def _can_scan(self, input: AnalysisOutput) -> bool:
+        """Whether the output is in files of jsonlines, which can be read
+        again and at offsets."""
+        if input.file_handle is not None:
+            return False
+        for name in input.file_names():
+            with open_file(name, "rb") as handle:
+                if self._guess_file_version(handle) != 2:
+                    return False
+        return True
+
+    def _scan(
+        self, handle: IO[bytes], shard: int = 0
+    ) -> Iterable[Tuple[str, EntryPosition, Optional[Dict[str, Any]]]]:
+        """Goes over the entries of a jsonlines output file without decoding
+        the models. Generates the kind and position of each entry, and the
+        entry if it was decoded."""
+        handle.seek(0)
+        offset = len(handle.readline())
+        for line in handle:
+            position = EntryPosition("", shard, offset, len(line))
+            offset += len(line)
+            match = _ENTRY_PREFIX.match(line)
+            if match and match.group(1) == b"model":
+                callable = _decode_string(match.group(2))
+                yield "model", position._replace(callable=callable), None
+                continue
+            if self._is_filtered_issue_line(line):
+                continue
+            entry = json.loads(line)
+            if entry:
+                callable = entry["data"].get("callable", "")
+                yield entry["kind"], position._replace(callable=callable), entry
+
+    def _parse_reachable(self, input: AnalysisOutput) -> Iterable[Dict[str, Any]]:
+        """Parses the issues, and then only the pre/postconditions reachable
+        from their traces, in two passes over the output.
+
+        The first pass decodes only the issues, and notes where the model of
+        each callable is. The second decodes the models of the callables
+        that the traces reach, transitively. In output where most models are
+        not reached from any issue (so would be dropped by the
+        ModelGenerator), this avoids decoding and building most of it.
+        """
+        names = list(input.file_names())
+        # The member tables of the compressed shards, found in the first pass
+        # so that the second can seek through them.
+        shard_blocks: List[Optional[List[Block]]] = []
+        models: DefaultDict[str, List[EntryPosition]] = defaultdict(list)
+        frontier: List[ConditionKey] = []
+        with profiler.phase("parse issues"):
+            for shard, name in enumerate(names):
+                with open_seekable(name) as handle:
+                    for kind, position, entry in self._scan(handle, shard):
+                        if kind == "model":
+                            models[position.callable].append(position)
+                        elif kind == "issue":
+                            assert entry is not None
+                            yield from self._parse_reachable_issue(
+                                entry["data"], frontier
+                            )
+                    shard_blocks.append(blocks_of(handle))
+        if (
+            ParseType.PRECONDITION not in self.parse_types
+            and ParseType.POSTCONDITION not in self.parse_types
+        ):
+            return
+
+        for name, blocks in zip(names, shard_blocks):
+            if blocks is not None and len(blocks) == 1:
+                log.warning(
+                    "%s is a single compressed member, which is decompressed "
+                    "from the start for every level of the traces. Compress it "
+                    "in blocks (e.g. with bgzip or pbzip2) to read only the "
+                    "reachable models.",
+                    name,
+                )
+        with profiler.phase("parse reachable models"):
+            yield from self._parse_reachable_models(
+                names, shard_blocks, models, frontier
+            )
+
+    def _parse_reachable_issue(
+        self, data: Dict[str, Any], frontier: List[ConditionKey]
+    ) -> Iterable[Dict[str, Any]]:
+        """Parses the issue, adding the callees of its traces to frontier."""
+        for issue in self._parse_issue(data):
+            for typ, name in [
+                (ParseType.PRECONDITION, "preconditions"),
+                (ParseType.POSTCONDITION, "postconditions"),
+            ]:
+                if typ in self.parse_types:
+                    frontier.extend(
+                        (typ, fragment["callee"], fragment["port"])
+                        for fragment in issue[name]
+                    )
+            if ParseType.ISSUE in self.parse_types:
+                yield issue
+
+    def _parse_reachable_models(
+        self,
+        names: List[str],
+        shard_blocks: List[Optional[List[Block]]],
+        models: Dict[str, List[EntryPosition]],
+        frontier: List[ConditionKey],
+    ) -> Iterable[Dict[str, Any]]:
+        reached: Set[ConditionKey] = set(frontier)
+        # Conditions of the parsed models whose key wasn't reached yet.
+        conditions: Dict[ConditionKey, List[Dict[str, Any]]] = {}
+        num_models = len(models)
+        while frontier:
+            # The models of a level of the traces are read a shard at a time,
+            # in the order of their offsets, so that compressed shards are
+            # decompressed forward rather than from a member start per model.
+            positions = sorted(
+                (
+                    position
+                    for _, callable, _ in frontier
+                    for position in models.pop(callable, [])
+                ),
+                key=lambda position: (position.shard, position.offset),
+            )
+            for shard, shard_positions in groupby(
+                positions, key=lambda position: position.shard
+            ):
+                with open_seekable(names[shard], shard_blocks[shard]) as handle:
+                    for position in shard_positions:
+                        handle.seek(position.offset)
+                        data = json.loads(handle.read(position.length))["data"]
+                        for condition in self._parse_model(data):
+                            conditions.setdefault(
+                                (
+                                    condition["type"],
+                                    position.callable,
+                                    condition["caller_port"],
+                                ),
+                                [],
+                            ).append(condition)
+
+            next_frontier: List[ConditionKey] = []
+            for key in frontier:
+                for condition in conditions.pop(key, []):
+                    yield condition
+                    next_key = (
+                        condition["type"],
+                        condition["callee"],
+                        condition["callee_port"],
+                    )
+                    if next_key not in reached:
+                        reached.add(next_key)
+                        next_frontier.append(next_key)
+            frontier = next_frontier
+        profiler.count("models", num_models - len(models))
+        profiler.count("unreachable models", len(models))
 
     def _guess_file_version(self, handle: IO[str]) -> int:
         first_line = handle.readline()
@@ -114,7 +361,7 @@ class Parser(BaseParser):
     def _parse_by_type(self, entry):
         if entry["kind"] == "model":
             yield from self._parse_model(entry["data"])
-        elif entry["kind"] == "issue":
+        elif entry["kind"] == "issue" and ParseType.ISSUE in self.parse_types:
             yield from self._parse_issue(entry["data"])
 
     @staticmethod
@@ -124,8 +371,10 @@ class Parser(BaseParser):
     @log_trace_keyerror_in_generator
     def _parse_model(self, json):
         callable = json["callable"]
-        yield from self._parse_model_sources(callable, json["sources"])
-        yield from self._parse_model_sinks(callable, json["sinks"])
+        if ParseType.POSTCONDITION in self.parse_types:
+            yield from self._parse_model_sources(callable, json["sources"])
+        if ParseType.PRECONDITION in self.parse_types:
+            yield from self._parse_model_sinks(callable, json["sinks"])
 
     def _parse_model_sources(self, callable, source_traces):
         for source_trace in source_traces:
@@ -170,6 +419,13 @@ class Parser(BaseParser):
 
     @log_trace_keyerror_in_generator
     def _parse_issue(self, json):
+        issue_filter = self.issue_filter
+        if issue_filter is not None and not issue_filter.keeps(
+            json["code"], json["callable"], self._extract_filename(json["filename"])
+        ):
+            profiler.count("filtered issues")
+            return
+
         issue = {}
 
         issue["type"] = ParseType.ISSUE
@@ -0,0 +1,125 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""The new, fixed and persisting issues between two runs, computed in the
+database.
+
+Issues are merged by handle when a run is saved, so the instances of an issue
+in every run point to the same Issue. Diffing two runs only compares the
+issue_id of their instances, with a lookup in the (run_id, issue_id) index of
+issue_instances for each instance.
+"""
+
+import enum
+from typing import Iterable, Iterator, Optional, Tuple
+
+from sqlalchemy import Integer, String, cast, func, type_coerce
+from sqlalchemy.orm import Session, aliased
+
+from .models import Issue, IssueInstance, Run, SharedText
+
+
+FilenameText = aliased(SharedText)
+CallableText = aliased(SharedText)
+MessageText = aliased(SharedText)
+OtherInstance = aliased(IssueInstance)
+
+# Rows fetched at a time.
+FETCH_SIZE = 1000
+
+
+class IssueStatus(enum.Enum):
+    # In the run, not in the base run.
+    new = "new"
+    # In the base run, not in the run.
+    fixed = "fixed"
+    # In both runs.
+    persisting = "persisting"
+
+
+def diff_issues(
+    session: Session,
+    base_run_id: int,
+    run_id: int,
+    statuses: Optional[Iterable[IssueStatus]] = None,
+) -> Iterator[Tuple[IssueStatus, str]]:
+    """The instances of the issues with the statuses (all by default), as lines
+    of JSON built by the database (SQLite's json1 or MySQL 5.7). They come by
+    status and in no particular order, so that the first ones stream out
+    without sorting the rest. Fixed issues are the instances of the base run,
+    the others those of the run. Raises ValueError if a run doesn't exist."""
+    for id in [base_run_id, run_id]:
+        if session.query(Run.id).filter(Run.id == id).scalar() is None:
+            raise ValueError(f"Run {id} doesn't exist.")
+    return _diff_issues(
+        session, base_run_id, run_id, list(statuses or list(IssueStatus))
+    )
+
+
+def _diff_issues(
+    session: Session, base_run_id: int, run_id: int, statuses: Iterable[IssueStatus]
+) -> Iterator[Tuple[IssueStatus, str]]:
+    # Locations are stored as "line|start|end", and casting a string to an
+    # integer reads the number it starts with.
+    location = type_coerce(IssueInstance.location, String)
+    columns = func.substr(location, func.instr(location, "|") + 1)
+    line = cast(location, Integer)
+    start = cast(columns, Integer)
+    end = cast(func.substr(columns, func.instr(columns, "|") + 1), Integer)
+
+    for status in statuses:
+        from_run_id, other_run_id = (
+            (base_run_id, run_id)
+            if status == IssueStatus.fixed
+            else (run_id, base_run_id)
+        )
+        in_other_run = (
+            session.query(OtherInstance.id)
+            .filter(OtherInstance.run_id == other_run_id)
+            .filter(OtherInstance.issue_id == IssueInstance.issue_id)
+            .exists()
+        )
+        query = (
+            session.query(
+                func.json_object(
+                    "status",
+                    status.value,
+                    "handle",
+                    Issue.handle,
+                    "code",
+                    Issue.code,
+                    "run_id",
+                    type_coerce(IssueInstance.run_id, Integer),
+                    "instance_id",
+                    type_coerce(IssueInstance.id, Integer),
+                    "filename",
+                    FilenameText.contents,
+                    "callable",
+                    CallableText.contents,
+                    "line",
+                    line,
+                    "start",
+                    start,
+                    "end",
+                    end,
+                    "message",
+                    MessageText.contents,
+                )
+            )
+            .select_from(IssueInstance)
+            .filter(IssueInstance.run_id == from_run_id)
+            .filter(in_other_run if status == IssueStatus.persisting else ~in_other_run)
+            .join(Issue, Issue.id == IssueInstance.issue_id)
+            .join(FilenameText, FilenameText.id == IssueInstance.filename_id)
+            .join(CallableText, CallableText.id == IssueInstance.callable_id)
+            .join(MessageText, MessageText.id == IssueInstance.message_id)
+        )
+        rows = session.execute(query.statement.execution_options(stream_results=True))
+        while True:
+            batch = rows.fetchmany(FETCH_SIZE)
+            if not batch:
+                break
+            for (issue,) in batch:
+                yield status, issue
@@ -22,7 +22,8 @@ class ShardedFileComponents(object):
 
     def __init__(self, filepattern):
         self.directory, root = os.path.split(filepattern)
-        m = re.match(r"([^@]+)@([^.@]+)(\.[^.@]*)?$", root)
+        # The extension may have several parts, e.g. .json.gz.
+        m = re.match(r"([^@]+)@([^.@]+)(\.[^@]*)?$", root)
         if not m:
             raise ValueError("Not a sharded file: {}".format(filepattern))
 
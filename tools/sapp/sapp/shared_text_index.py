@@ -0,0 +1,108 @@
+# Copyright (c) 2016-present, Facebook, Inc.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""An optional trigram index over the contents of callable and filename
+shared texts, so that substring filters like callables="%foo%" in explore
+don't scan the whole messages table.
+
+The index is a SQLite FTS5 table with the trigram tokenizer (SQLite 3.34 or
+later), which answers LIKE patterns with at least 3 consecutive characters
+that aren't wildcards. It reads the contents from the messages table and only
+holds the trigrams, of the shared texts it was given. DatabaseSaver creates it
+when asked to, and adds the new shared texts of every run once it exists.
+"""
+
+import logging
+import re
+from typing import Any, Iterable, Tuple
+
+from sqlalchemy import column, exc, select, table
+from sqlalchemy.orm import Session
+
+from .models import SharedText, SharedTextKind
+
+
+log = logging.getLogger("sapp")
+
+
+class SharedTextIndex:
+    TABLE_NAME = "messages_trigrams"
+
+    """The kinds of shared texts explore filters on"""
+    KINDS = (SharedTextKind.CALLABLE, SharedTextKind.FILENAME)
+
+    """The first SQLite version with the trigram tokenizer"""
+    MIN_SQLITE_VERSION = (3, 34, 0)
+
+    _table = table(TABLE_NAME, column("rowid"), column("contents"))
+    _literal_trigram = re.compile(r"[^%_]{3}")
+
+    @classmethod
+    def is_supported(cls, session: Session) -> bool:
+        dialect = session.get_bind().dialect
+        return (
+            dialect.name == "sqlite"
+            and dialect.dbapi.sqlite_version_info >= cls.MIN_SQLITE_VERSION
+        )
+
+    @classmethod
+    def exists(cls, session: Session) -> bool:
+        if session.get_bind().dialect.name != "sqlite":
+            return False
+        return (
+            session.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name",
+                {"name": cls.TABLE_NAME},
+            ).scalar()
+            is not None
+        )
+
+    @classmethod
+    def create(cls, session: Session) -> bool:
+        """Creates the index of the existing callable and filename shared
+        texts. False if the database doesn't support it."""
+        if not cls.is_supported(session):
+            log.warning("The shared text index needs SQLite 3.34 or later")
+            return False
+        try:
+            session.execute(
+                f"CREATE VIRTUAL TABLE {cls.TABLE_NAME} USING fts5("
+                f"contents, content='{SharedText.__tablename__}', "
+                "content_rowid='id', tokenize='trigram')"
+            )
+        except exc.OperationalError as e:
+            # E.g. SQLite built without FTS5.
+            log.warning("Unable to create the shared text index: %s", e)
+            return False
+        session.execute(
+            cls._table.insert().from_select(
+                ["rowid", "contents"],
+                select([SharedText.id, SharedText.contents]).where(
+                    SharedText.kind.in_(cls.KINDS)
+                ),
+            )
+        )
+        return True
+
+    @classmethod
+    def add(cls, session: Session, shared_texts: Iterable[Tuple[int, str]]) -> None:
+        """Adds the (id, contents) of new shared texts to the index."""
+        values = [{"rowid": id, "contents": contents} for id, contents in shared_texts]
+        if values:
+            session.execute(cls._table.insert(), values)
+
+    @classmethod
+    def can_match(cls, pattern: str) -> bool:
+        """Whether the index can find the matches of the LIKE pattern, rather
+        than check every indexed text."""
+        return cls._literal_trigram.search(pattern) is not None
+
+    @classmethod
+    def like(cls, id_column: Any, pattern: str) -> Any:
+        """A filter on the shared texts of id_column (callables or filenames)
+        whose contents match the LIKE pattern."""
+        return id_column.in_(
+            select([cls._table.c.rowid]).where(cls._table.c.contents.like(pattern))
+        )
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import os
+import sqlite3
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from ..bulk_saver import BulkSaver
+from ..database_saver import DatabaseSaver
+from ..db import DB, DBType
+from ..model_generator import ModelGenerator
+from ..models import (
+    IssueInstance,
+    IssueInstanceSharedTextAssoc,
+    IssueInstanceTraceFrameAssoc,
+    SharedText,
+    TraceFrame,
+    TraceFrameLeafAssoc,
+)
+from ..pysa_taint_parser import Parser
+from .fake_pysa_output import run_pipeline_on, write_pysa_output
+
+
+TABLES = [
+    cls.__tablename__
+    for cls in [
+        IssueInstance,
+        IssueInstanceSharedTextAssoc,
+        IssueInstanceTraceFrameAssoc,
+        SharedText,
+        TraceFrame,
+        TraceFrameLeafAssoc,
+    ]
+]
+
+
+class BulkSaverTest(TestCase):
+    def _save(self, directory, name, **kwargs):
+        dbname = os.path.join(directory, name)
+        saver = DatabaseSaver(DB(DBType.SQLITE, dbname))
+        saver.bulk_saver = BulkSaver(saver.primary_key_generator, **kwargs)
+        spec = write_pysa_output(directory, 20, unused_models=3)
+        run_pipeline_on([Parser(), ModelGenerator(), saver], spec)
+
+        connection = sqlite3.connect(dbname)
+        try:
+            tables = {
+                table: sorted(connection.execute(f"SELECT * FROM {table}"))
+                for table in TABLES
+            }
+            indexes = sorted(
+                connection.execute(
+                    "SELECT name, sql FROM sqlite_master WHERE type = 'index'"
+                )
+            )
+            journal_mode = connection.execute("PRAGMA journal_mode").fetchone()
+        finally:
+            connection.close()
+        return tables, indexes, journal_mode
+
+    def test_sqlite_fast_path(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with patch.object(BulkSaver, "SQLITE_FAST_PATH", False):
+                expected = self._save(directory, "old.db")
+            actual = self._save(directory, "new.db")
+            tuned = self._save(directory, "tuned.db", fast_sqlite_writes=True)
+
+        self.assertGreater(len(expected[0][TraceFrame.__tablename__]), 0)
+        self.assertEqual(expected, actual)
+        self.assertEqual(expected, tuned)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import contextlib
+import json
 import os
 import unittest
 from unittest import TestCase
@@ -10,6 +11,10 @@ from click.testing import CliRunner
 
 from .. import __name__ as client
 from ..cli import cli
+from ..db import DB, DBType
+from ..handle_store import HandleStore, handle_store_path
+from ..models import RunSummary
+from .fake_object_generator import FakeObjectGenerator
 
 
 PIPELINE_RUN = f"{client}.pipeline.Pipeline.run"
@@ -66,6 +71,8 @@ class TestSappCli(TestCase):
         self.assertEqual(summary_blob["commit_hash"], "abc123")
         self.assertEqual(summary_blob["old_linemap_file"][:4], "/tmp")
         self.assertEqual(summary_blob["store_unused_models"], True)
+        self.assertEqual(summary_blob["streaming"], False)
+        self.assertEqual(summary_blob["compact_graph"], False)
 
     def test_base_summary_blob(self, mock_analysis_output):
         with patch(PIPELINE_RUN, self.verify_base_summary_blob):
@@ -147,3 +154,115 @@ class TestSappCli(TestCase):
                     cli, ["analyze", "--previous-input", path, path]
                 )
                 self.assertEqual(result.exit_code, 0)
+
+    def verify_issue_handles_directory(self, input_files, summary_blob):
+        self.assertEqual(
+            summary_blob["issue_handles_directory"],
+            os.path.join(os.getcwd(), "sapp.db.issue-handles"),
+        )
+
+    def verify_previous_run_id(self, input_files, summary_blob):
+        self.assertIsInstance(summary_blob["previous_issue_handles"], HandleStore)
+        self.assertIn("handle", summary_blob["previous_issue_handles"])
+        summary_blob["previous_issue_handles"].close()
+
+    def test_previous_run_id(self, mock_analysis_output):
+        with patch(PIPELINE_RUN, self.verify_issue_handles_directory):
+            with isolated_fs() as path:
+                result = self.runner.invoke(cli, ["analyze", path])
+                self.assertEqual(result.exit_code, 0)
+
+        with patch(PIPELINE_RUN, self.verify_previous_run_id):
+            with isolated_fs() as path:
+                result = self.runner.invoke(
+                    cli, ["analyze", "--previous-run-id", "1", path]
+                )
+                self.assertNotEqual(result.exit_code, 0)
+                self.assertIn("no issue handles stored for run 1", result.output)
+
+                HandleStore.write(
+                    handle_store_path("handles", 1), [HandleStore.hash("handle")]
+                )
+                result = self.runner.invoke(
+                    cli,
+                    [
+                        "analyze",
+                        "--issue-handles-directory",
+                        "handles",
+                        "--previous-run-id",
+                        "1",
+                        path,
+                    ],
+                )
+                self.assertEqual(result.exit_code, 0)
+
+                result = self.runner.invoke(
+                    cli,
+                    [
+                        "analyze",
+                        "--previous-issue-handles",
+                        handle_store_path("handles", 1),
+                        path,
+                    ],
+                )
+                self.assertEqual(result.exit_code, 0)
+
+    def run_pipeline(self, input_files, summary_blob):
+        return RunSummary(None, None, 7, None, 0, 0), summary_blob
+
+    def test_profile(self, mock_analysis_output):
+        with patch(PIPELINE_RUN, self.run_pipeline), patch(
+            f"{client}.cli_lib.save_run_profile"
+        ) as save_run_profile:
+            with isolated_fs() as path:
+                result = self.runner.invoke(cli, ["analyze", path])
+                self.assertEqual(result.exit_code, 0)
+                save_run_profile.assert_not_called()
+
+                result = self.runner.invoke(
+                    cli, ["analyze", "--profile-trace", "trace.json", path]
+                )
+                self.assertEqual(result.exit_code, 0)
+                self.assertEqual(save_run_profile.call_args[0][1], 7)
+                with open("trace.json") as f:
+                    self.assertEqual(json.load(f)["traceEvents"], [])
+
+    def test_diff_runs(self, mock_analysis_output):
+        with isolated_fs():
+            database = DB(DBType.SQLITE, "sapp.db")
+            fakes = FakeObjectGenerator()
+            issue = fakes.issue()
+            runs = [fakes.run(), fakes.run()]
+            fakes.instance(issue_id=issue.id)
+            fakes.save_all(database)
+            with database.make_session() as session:
+                session.add_all(runs)
+                session.commit()
+
+            result = self.runner.invoke(
+                cli, ["--database-name", "sapp.db", "diff-runs", "1", "2"]
+            )
+            self.assertEqual(result.exit_code, 0)
+            [line] = result.output.splitlines()
+            self.assertEqual(json.loads(line)["status"], "new")
+
+            result = self.runner.invoke(
+                cli,
+                [
+                    "--database-name",
+                    "sapp.db",
+                    "diff-runs",
+                    "--status",
+                    "fixed",
+                    "1",
+                    "2",
+                ],
+            )
+            self.assertEqual(result.exit_code, 0)
+            self.assertEqual(result.output, "")
+
+            result = self.runner.invoke(
+                cli, ["--database-name", "sapp.db", "diff-runs", "1", "3"]
+            )
+            self.assertNotEqual(result.exit_code, 0)
+            self.assertIn("Run 3 doesn't exist.", result.output)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+import random
+import tempfile
+from collections import defaultdict
+from unittest import TestCase
+from unittest.mock import patch
+
+from .. import compact_trace_graph
+from ..compact_trace_graph import CompactTraceGraph, IntMultimap
+from ..models import DBID
+from ..model_generator import ModelGenerator
+from ..pysa_taint_parser import Parser
+from ..trace_graph import TraceGraph
+from ..trimmed_trace_graph import TrimmedTraceGraph
+from .fake_pysa_output import run_pipeline_on, write_pysa_output
+
+
+class IntMultimapTest(TestCase):
+    @patch.object(IntMultimap, "MIN_RECENT_SIZE", 8)
+    def test_matches_dict_of_sets(self):
+        rng = random.Random(0)
+        multimap = IntMultimap()
+        expected = defaultdict(set)
+        for i in range(2000):
+            # Mostly increasing keys, with some going back to earlier ones.
+            key = i // 3 if rng.random() < 0.8 else rng.randrange(i // 3 + 1)
+            value = rng.randrange(50)
+            multimap.add(key, value)
+            expected[key].add(value)
+            probe = rng.randrange(i // 3 + 2)
+            self.assertEqual(set(multimap.get(probe)), expected.get(probe, set()))
+            self.assertEqual(probe in multimap, probe in expected)
+
+        self.assertEqual(
+            {key: set(values) for key, values in multimap.items()}, dict(expected)
+        )
+        for values in expected.values():
+            self.assertTrue(values)
+        self.assertEqual(
+            sum(len(values) for _, values in multimap.items()),
+            sum(len(values) for values in expected.values()),
+        )
+
+    @patch.object(IntMultimap, "MIN_RECENT_SIZE", 8)
+    def test_duplicates(self):
+        multimap = IntMultimap()
+        for i in range(100):
+            multimap.add(1, i % 10)
+            multimap.add(i, 0)
+            self.assertEqual(sorted(multimap.get(1)), list(range(min(i + 1, 10))))
+        self.assertEqual(dict(multimap.items())[1], list(range(10)))
+        self.assertEqual(multimap.get(0), [0])
+
+
+def _frames(graph: TraceGraph):
+    return {
+        (
+            graph.get_text(frame.caller_id),
+            frame.caller_port,
+            graph.get_text(frame.callee_id),
+            frame.callee_port,
+            frame.kind,
+            frozenset(
+                (graph.get_shared_text_by_local_id(leaf).contents, depth)
+                for leaf, depth in graph.get_trace_frame_leaf_ids_with_depths(frame)
+            ),
+            frozenset(
+                graph.get_text(graph._issue_instances[id].callable_id)
+                for id in graph.get_trace_frame_issue_instance_ids(frame.id.local_id)
+            ),
+        )
+        for frame in graph._trace_frames.values()
+    }
+
+
+def _instances(graph: TraceGraph):
+    return {
+        (
+            graph.get_text(instance.callable_id),
+            instance.min_trace_length_to_sources,
+            instance.min_trace_length_to_sinks,
+            frozenset(
+                graph.get_shared_text_by_local_id(id).contents
+                for id in graph.get_issue_instance_shared_text_ids(instance.id.local_id)
+            ),
+            frozenset(
+                graph.get_text(frame.callee_id)
+                for frame in graph.get_issue_instance_trace_frames(instance)
+            ),
+        )
+        for instance in graph.get_issue_instances()
+    }
+
+
+class CompactTraceGraphTest(TestCase):
+    def _generate(self, filename, compact_graph):
+        graph, _ = run_pipeline_on(
+            [Parser(), ModelGenerator()],
+            filename,
+            store_unused_models=True,
+            compact_graph=compact_graph,
+        )
+        return graph
+
+    def test_same_as_trace_graph(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = write_pysa_output(directory, 30, unused_models=5, num_files=4)
+            expected = self._generate(filename, False)
+            actual = self._generate(filename, True)
+        self.assertIsInstance(actual, CompactTraceGraph)
+        self.assertEqual(_frames(expected), _frames(actual))
+        self.assertEqual(_instances(expected), _instances(actual))
+
+        neighbors = []
+        for graph in [expected, actual]:
+            [frame] = [
+                frame
+                for frame in graph._trace_frames.values()
+                if graph.get_text(frame.callee_id) == "source_2_1"
+            ]
+            next_frames = graph.get_next_trace_frames(frame)
+            previous_frames = graph.get_trace_frames_from_callee(
+                frame.caller_id, frame.caller_port
+            )
+            neighbors.append(
+                (
+                    {graph.get_text(f.callee_id) for f in next_frames},
+                    {graph.get_text(f.caller_id) for f in previous_frames},
+                )
+            )
+        self.assertEqual(neighbors[0], ({"source_2_2"}, {"module_2.issue_2"}))
+        self.assertEqual(neighbors[0], neighbors[1])
+
+        trimmed = []
+        for graph in [expected, actual]:
+            trimmed_graph = TrimmedTraceGraph(["module_1.py"])
+            trimmed_graph.populate_from_trace_graph(graph)
+            trimmed.append(trimmed_graph)
+        self.assertGreater(len(trimmed[0]._issue_instances), 0)
+        self.assertEqual(_frames(trimmed[0]), _frames(trimmed[1]))
+        self.assertEqual(_instances(trimmed[0]), _instances(trimmed[1]))
+
+    def test_port_limit(self):
+        graph = CompactTraceGraph()
+        callable_id = DBID()
+        with patch.object(compact_trace_graph, "PORT_LIMIT", 2):
+            self.assertNotEqual(
+                graph._add_node(callable_id, "root")[0],
+                graph._add_node(callable_id, "formal(x)")[0],
+            )
+            with self.assertRaises(AssertionError):
+                graph._add_node(callable_id, "result")
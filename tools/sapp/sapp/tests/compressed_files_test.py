@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import glob
+import gzip
+import io
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from ..analysis_output import AnalysisOutput
+from ..compressed_files import (
+    CODECS,
+    BlockReader,
+    blocks_of,
+    find_blocks,
+    open_file,
+    open_seekable,
+    write_blocks,
+)
+from ..model_generator import ModelGenerator
+from ..offset_index import OffsetIndex
+from ..parallel_parser import ParallelParser
+from ..pysa_taint_parser import Parser
+from .compact_trace_graph_test import _frames, _instances
+from .fake_pysa_output import run_pipeline_on, write_pysa_output
+
+
+LINES = [f"line {i}\n".encode() for i in range(1000)]
+DATA = b"".join(LINES)
+
+
+def _compress_shards(directory, extension, block_size):
+    """Replaces the files in directory by compressed ones."""
+    for name in glob.glob(os.path.join(directory, "*.json")):
+        with open(name, "rb") as f:
+            write_blocks(name + extension, f, block_size)
+        os.remove(name)
+
+
+def _generate(spec, parser, **options):
+    return run_pipeline_on([parser, ModelGenerator()], spec, **options)
+
+
+class CompressedFilesTest(TestCase):
+    def test_blocks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for extension in CODECS:
+                with self.subTest(extension=extension):
+                    path = os.path.join(directory, "lines" + extension)
+                    blocks = write_blocks(path, LINES, block_size=1000)
+                    self.assertGreater(len(blocks), 5)
+                    self.assertEqual(blocks[0], (0, 0))
+                    self.assertEqual(find_blocks(path), blocks)
+                    with open_file(path, "rb") as f:
+                        self.assertEqual(f.read(), DATA)
+                    with open_file(path) as f:
+                        self.assertEqual(f.readline(), "line 0\n")
+
+    def test_seek(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "lines.gz")
+            blocks = write_blocks(path, LINES, block_size=1000)
+            for given in [None, blocks]:
+                with open_seekable(path, given) as f:
+                    for offset in [5000, 10, 7000, 6995, len(DATA) - 3, 0]:
+                        self.assertEqual(f.seek(offset), offset)
+                        self.assertEqual(f.read(20), DATA[offset : offset + 20])
+                    f.seek(-10, io.SEEK_CUR)
+                    self.assertEqual(f.readline(), DATA[10:14])
+                    f.read()
+                    self.assertEqual(blocks_of(f), blocks)
+
+            # A single member can only be read from its start.
+            with open(path, "wb") as f:
+                f.write(gzip.compress(DATA))
+            with open_seekable(path) as f:
+                f.seek(7000)
+                self.assertEqual(f.read(20), DATA[7000:7020])
+                f.seek(10)
+                self.assertEqual(f.read(20), DATA[10:30])
+                self.assertEqual(f.seek(len(DATA) + 10), len(DATA))
+                self.assertEqual(f.read(), b"")
+
+    def test_reachable_models_of_single_members(self):
+        with tempfile.TemporaryDirectory() as directory:
+            spec = write_pysa_output(
+                directory, 20, shards=2, trace_length=3, unused_models=5
+            )
+            expected, _ = _generate(spec, Parser())
+            _compress_shards(directory, ".gz", block_size=1 << 30)
+            with self.assertLogs("sapp", "WARNING") as logs, patch.object(
+                BlockReader, "__init__", autospec=True, side_effect=BlockReader.__init__
+            ) as opens, patch.object(
+                BlockReader,
+                "_start_block",
+                autospec=True,
+                side_effect=BlockReader._start_block,
+            ) as starts:
+                actual, _ = _generate(
+                    spec + ".gz", Parser(), reachable_models_only=True
+                )
+        self.assertEqual(_frames(expected), _frames(actual))
+        self.assertEqual(_instances(expected), _instances(actual))
+        self.assertEqual(
+            sum("is a single compressed member" in line for line in logs.output), 2
+        )
+        # The models are read forward, without going back to the start.
+        self.assertEqual(starts.call_count, opens.call_count)
+
+    def test_compressed_shards(self):
+        with tempfile.TemporaryDirectory() as directory:
+            spec = write_pysa_output(
+                directory, 20, shards=2, trace_length=3, unused_models=5
+            )
+            expected, _ = _generate(spec, Parser())
+            for extension in CODECS:
+                with self.subTest(extension=extension):
+                    for name in glob.glob(os.path.join(directory, "*")):
+                        os.remove(name)
+                    spec = write_pysa_output(
+                        directory, 20, shards=2, trace_length=3, unused_models=5
+                    )
+                    _compress_shards(directory, extension, block_size=2000)
+                    spec += extension
+
+                    for parser, options in [
+                        (Parser(), {}),
+                        (Parser(), {"reachable_models_only": True}),
+                        (ParallelParser(Parser, processes=2), {}),
+                    ]:
+                        actual, _ = _generate(spec, parser, **options)
+                        self.assertEqual(_frames(expected), _frames(actual))
+                        self.assertEqual(_instances(expected), _instances(actual))
+
+                    index = OffsetIndex.get_or_build(
+                        Parser(), AnalysisOutput.from_file(spec)
+                    )
+                    try:
+                        self.assertTrue(all(len(file) == 4 for file in index.files))
+                        for callable in ["unused_3", "sink_4_2", "source_1_0"]:
+                            [position] = index.lookup(callable)
+                            self.assertEqual(
+                                index.get_json(position)["data"]["callable"], callable
+                            )
+                    finally:
+                        index.close()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from ..analysis_output import AnalysisOutput
+from ..condition_store import ConditionStore, count_entries
+from ..pysa_taint_parser import Parser
+from .fake_pysa_output import write_pysa_output
+
+
+def _entry(caller, port, index):
+    return {"caller": caller, "caller_port": port, "titos": [(index, 1)]}
+
+
+class ConditionStoreTest(TestCase):
+    def setUp(self) -> None:
+        self.store = ConditionStore()
+        self.store.append(("b", "root"), _entry("b", "root", 0))
+        self.store.append(("a", "formal(x)"), _entry("a", "formal(x)", 1))
+        self.store.append(("b", "root"), _entry("b", "root", 2))
+
+    def tearDown(self) -> None:
+        self.store.close()
+
+    def test_pop(self):
+        self.assertEqual(count_entries(self.store), 3)
+        self.assertEqual(self.store.pop(("c", "root"), []), [])
+        self.assertEqual(
+            self.store.pop(("b", "root"), []),
+            [_entry("b", "root", 0), _entry("b", "root", 2)],
+        )
+        self.assertEqual(self.store.pop(("b", "root"), []), [])
+        self.assertEqual(count_entries(self.store), 1)
+        self.assertEqual(
+            list(self.store.items()),
+            [(("a", "formal(x)"), [_entry("a", "formal(x)", 1)])],
+        )
+
+    def test_items(self):
+        self.assertEqual(
+            [(key, len(entries)) for key, entries in self.store.items()],
+            [(("a", "formal(x)"), 1), (("b", "root"), 2)],
+        )
+
+    def test_batches(self):
+        with patch.object(ConditionStore, "BATCH_SIZE", 2):
+            store = ConditionStore()
+            for index in range(5):
+                store.append(("a", "root"), _entry("a", "root", index))
+            self.assertEqual(len(store._pending), 1)
+            self.assertEqual(
+                [entry["titos"][0][0] for entry in store.pop(("a", "root"))],
+                list(range(5)),
+            )
+            store.close()
+
+    def test_close(self):
+        path = self.store.path
+        self.assertTrue(os.path.exists(path))
+        self.store.close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_parsed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = write_pysa_output(
+                directory, 20, trace_length=3, unused_models=5, shared_traces=6
+            )
+            expected, actual = [
+                Parser().analysis_output_to_dict_entries(
+                    AnalysisOutput.from_file(filename),
+                    None,
+                    None,
+                    None,
+                    spill_conditions=spill_conditions,
+                )
+                for spill_conditions in [False, True]
+            ]
+        for key in ["preconditions", "postconditions"]:
+            self.assertIsInstance(actual[key], ConditionStore)
+            self.assertEqual(count_entries(actual[key]), count_entries(expected[key]))
+            self.assertEqual(list(actual[key].items()), sorted(expected[key].items()))
+            actual[key].close()
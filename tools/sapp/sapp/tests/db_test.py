@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import threading
+from unittest import TestCase
+
+from sqlalchemy.pool import SingletonThreadPool
+
+from ..db import DB, DBType
+from ..models import Run
+from .fake_object_generator import FakeObjectGenerator
+
+
+class DBTest(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = DB(DBType.SQLITE, os.path.join(self.directory.name, "test.db"))
+
+    def tearDown(self) -> None:
+        self.db.engine.dispose()
+        self.directory.cleanup()
+
+    def _connection(self):
+        with self.db.make_session() as session:
+            return session.connection().connection.connection
+
+    def test_connection_per_thread(self):
+        connection = self._connection()
+        self.assertIs(self._connection(), connection)
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self._connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], connection)
+
+        with self.db.make_session() as session:
+            self.assertEqual(session.execute("PRAGMA cache_size").scalar(), -65536)
+            self.assertEqual(session.query(Run).count(), 0)
+        self.assertEqual(self.db.session_count, 4)
+
+    def test_pools(self):
+        self.assertIsInstance(self.db.engine.pool, SingletonThreadPool)
+        self.assertIsInstance(DB(DBType.MEMORY).engine.pool, SingletonThreadPool)
+        # The server database keeps the default pool of its dialect, sized.
+        self.assertIsNone(self.db.poolclass)
+        self.assertEqual(self.db.pool_args, {"pool_size": DB.POOL_SIZE})
+
+    def test_ping_idle_connections(self):
+        self._connection()
+        self._connection()
+        self.assertEqual(self.db.ping_count, 0)
+
+        self.db.PING_AFTER_IDLE_SECONDS = 0
+        self._connection()
+        self.assertEqual(self.db.ping_count, 1)
+
+    def test_memory(self):
+        db = DB(DBType.MEMORY)
+        with db.make_session() as session:
+            session.add(FakeObjectGenerator().run())
+            session.commit()
+        with db.make_session() as session:
+            self.assertEqual(session.query(Run).count(), 1)
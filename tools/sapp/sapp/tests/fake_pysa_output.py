@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+"""Synthetic Pysa output for the tests and benchmarks, and the pipeline runs
+on it."""
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import ujson as json
+
+from ..analysis_output import AnalysisOutput
+from ..pipeline import Pipeline, PipelineStep, Summary
+from ..profiler import Profiler
+
+
+def _position(filename: str, line: int) -> Dict[str, Any]:
+    return {"filename": filename, "line": line, "start": 1, "end": 8}
+
+
+def _call(
+    filename: str, line: int, port: str, callee: str, length: int, kind: str
+) -> Dict[str, Any]:
+    return {
+        "call": {
+            "position": _position(filename, line),
+            "port": port,
+            "resolves_to": [callee],
+            "length": length,
+        },
+        "leaves": [{"kind": kind, "name": callee}],
+        "features": [{"always-via": "tito"}],
+    }
+
+
+def _root(filename: str, line: int, kind: str) -> Dict[str, Any]:
+    return {
+        "root": _position(filename, line),
+        "leaves": [{"kind": kind}],
+        "features": [],
+    }
+
+
+def synthetic_entries(
+    num_issues: int,
+    trace_length: int = 3,
+    unused_models: int = 0,
+    num_codes: int = 10,
+    num_files: int = 100,
+    shared_traces: int = 0,
+) -> List[Dict[str, Any]]:
+    """Pysa (v2) entries for num_issues issues, each with its own forward and
+    backward trace of trace_length models, plus unused_models models that no
+    issue reaches. With shared_traces, issue i has the traces of issue
+    i % shared_traces instead."""
+    entries = []
+    for i in range(num_issues):
+        filename = f"module_{i % num_files}.py"
+        trace = i % shared_traces if shared_traces else i
+        entries.append(
+            {
+                "kind": "issue",
+                # In the order of Pysa's output.
+                "data": {
+                    "callable": f"module_{i % num_files}.issue_{i}",
+                    "callable_line": 5,
+                    "code": 5000 + i % num_codes,
+                    "line": 10,
+                    "start": 1,
+                    "end": 8,
+                    "filename": filename,
+                    "message": f"Data from [UserControlled] to [RCE] in {i}",
+                    "traces": [
+                        {
+                            "name": "forward",
+                            "roots": [
+                                _call(
+                                    filename,
+                                    10,
+                                    "result",
+                                    f"source_{trace}_0",
+                                    trace_length,
+                                    "UserControlled",
+                                )
+                            ],
+                        },
+                        {
+                            "name": "backward",
+                            "roots": [
+                                _call(
+                                    filename,
+                                    11,
+                                    "formal(x)",
+                                    f"sink_{trace}_0",
+                                    trace_length,
+                                    "RemoteCodeExecution",
+                                )
+                            ],
+                        },
+                    ],
+                },
+            }
+        )
+        for j in range(trace_length if trace == i else 0):
+            last = j == trace_length - 1
+            source_taint = (
+                _root(filename, 20 + j, "UserControlled")
+                if last
+                else _call(
+                    filename,
+                    20 + j,
+                    "result",
+                    f"source_{i}_{j + 1}",
+                    trace_length - j - 1,
+                    "UserControlled",
+                )
+            )
+            sink_taint = (
+                _root(filename, 40 + j, "RemoteCodeExecution")
+                if last
+                else _call(
+                    filename,
+                    40 + j,
+                    "formal(x)",
+                    f"sink_{i}_{j + 1}",
+                    trace_length - j - 1,
+                    "RemoteCodeExecution",
+                )
+            )
+            entries.append(
+                {
+                    "kind": "model",
+                    "data": {
+                        "callable": f"source_{i}_{j}",
+                        "sources": [{"port": "result", "taint": [source_taint]}],
+                        "sinks": [],
+                    },
+                }
+            )
+            entries.append(
+                {
+                    "kind": "model",
+                    "data": {
+                        "callable": f"sink_{i}_{j}",
+                        "sources": [],
+                        "sinks": [{"port": "formal(x)", "taint": [sink_taint]}],
+                    },
+                }
+            )
+    for k in range(unused_models):
+        filename = f"module_{k % num_files}.py"
+        entries.append(
+            {
+                "kind": "model",
+                "data": {
+                    "callable": f"unused_{k}",
+                    "sources": [
+                        {
+                            "port": "result",
+                            "taint": [_root(filename, 60, "UserControlled")],
+                        }
+                    ],
+                    "sinks": [
+                        {
+                            "port": "formal(y)",
+                            "taint": [_root(filename, 61, "RemoteCodeExecution")],
+                        }
+                    ],
+                },
+            }
+        )
+    return entries
+
+
+def write_pysa_output(
+    directory: str, num_issues: int, shards: int = 1, **kwargs
+) -> str:
+    """Writes synthetic Pysa output into directory and returns the filename
+    spec to pass to AnalysisOutput.from_file. See synthetic_entries for the
+    keyword arguments."""
+    entries = synthetic_entries(num_issues, **kwargs)
+    header = json.dumps({"file_version": 2, "config": {"repo": directory}})
+    if shards == 1:
+        names = [os.path.join(directory, "taint-output.json")]
+        spec = names[0]
+    else:
+        names = [
+            os.path.join(directory, f"taint-output@{i:05d}-of-{shards:05d}.json")
+            for i in range(shards)
+        ]
+        spec = os.path.join(directory, f"taint-output@{shards}.json")
+    for index, name in enumerate(names):
+        with open(name, "w") as f:
+            f.write(header + "\n")
+            for entry in entries[index::shards]:
+                f.write(json.dumps(entry) + "\n")
+    return spec
+
+
+def run_pipeline_on(
+    steps: List[PipelineStep[Any, Any]],
+    spec: str,
+    profiler: Optional[Profiler] = None,
+    **options: Any,
+) -> Tuple[Any, Summary]:
+    """Runs the steps on the output at spec (see write_pysa_output) as a run
+    without a repository or run metadata, with the options (e.g. streaming)
+    added to its summary."""
+    summary = {
+        "job_id": None,
+        "repository": None,
+        "branch": None,
+        "commit_hash": None,
+        "run_kind": None,
+        **options,
+    }
+    return Pipeline(steps, profiler).run(
+        (AnalysisOutput.from_file(spec), None), summary
+    )
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+from array import array
+from unittest import TestCase
+
+from ..analysis_output import AnalysisOutput
+from ..database_saver import DatabaseSaver
+from ..db import DB, DBType
+from ..handle_store import HandleStore, handle_store_path
+from ..pysa_taint_parser import Parser
+from ..trace_graph import TraceGraph
+from .fake_object_generator import FakeObjectGenerator
+from .fake_pysa_output import write_pysa_output
+
+
+class HandleStoreTest(TestCase):
+    def test_contains(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "1.issue-handles")
+            handles = [f"module.f:{i}|0|1:5001:{i:016x}" for i in range(1000)]
+            HandleStore.write(path, (HandleStore.hash(h) for h in handles * 2))
+            self.assertTrue(HandleStore.is_handle_store(path))
+            self.assertFalse(HandleStore.is_handle_store(directory))
+
+            store = HandleStore(path)
+            self.assertEqual(len(store), 1000)
+            self.assertTrue(all(handle in store for handle in handles))
+            self.assertNotIn("module.f:1000|0|1:5001:00000000000003e8", store)
+            self.assertNotIn(1, store)
+            store.close()
+
+    def test_empty(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "1.issue-handles")
+            HandleStore.write(path, [])
+            store = HandleStore(path)
+            self.assertEqual(len(store), 0)
+            self.assertNotIn("handle", store)
+            store.close()
+
+    def test_not_a_handle_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "handles")
+            with open(path, "w") as f:
+                f.write("handle_1\nhandle_2\n")
+            self.assertFalse(HandleStore.is_handle_store(path))
+            with self.assertRaises(ValueError):
+                HandleStore(path)
+
+    def test_parsed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = write_pysa_output(directory, 20)
+            issue_handles = array("Q")
+            entries = Parser().analysis_output_to_dict_entries(
+                AnalysisOutput.from_file(filename),
+                None,
+                None,
+                None,
+                issue_handles=issue_handles,
+            )
+            self.assertEqual(len(entries["issues"]), 20)
+            # A master handle and a diff handle per issue.
+            self.assertEqual(len(issue_handles), 40)
+
+            path = os.path.join(directory, "1.issue-handles")
+            HandleStore.write(path, issue_handles)
+            store = HandleStore(path)
+            for streaming in [False, True]:
+                entries = Parser().analysis_output_to_dict_entries(
+                    AnalysisOutput.from_file(filename),
+                    None,
+                    store,
+                    None,
+                    streaming=streaming,
+                )
+                self.assertEqual(list(entries["issues"]), [])
+                self.assertGreater(len(entries["preconditions"]), 0)
+            store.close()
+
+    def test_saved_with_run(self):
+        fakes = FakeObjectGenerator(graph=TraceGraph())
+        run = fakes.run()
+        fakes.instance(issue_id=fakes.issue().id)
+        summary = {
+            "run": run,
+            "issue_handles": array("Q", [HandleStore.hash("handle")]),
+            "precondition_entries": {},
+            "postcondition_entries": {},
+            "missing_preconditions": set(),
+            "missing_postconditions": set(),
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            summary["issue_handles_directory"] = directory
+            run_summary, _ = DatabaseSaver(DB(DBType.MEMORY)).run(fakes.graph, summary)
+            store = HandleStore(handle_store_path(directory, run_summary.id))
+            self.assertEqual(len(store), 1)
+            self.assertIn("handle", store)
+            store.close()
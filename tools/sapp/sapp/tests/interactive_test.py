@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
 
+import json
 import os
 import sys
+import tempfile
 from datetime import datetime
 from io import StringIO
 from typing import List
 from unittest import TestCase
 from unittest.mock import mock_open, patch
 
+from IPython.core import page
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
 from ..db import DB, DBType
@@ -19,12 +23,14 @@ from ..interactive import (
     TraceTuple,
 )
 from ..models import (
+    CallableLeafDistance,
     DBID,
     Issue,
     IssueInstance,
     IssueInstanceSharedTextAssoc,
     IssueInstanceTraceFrameAssoc,
     Run,
+    RunIssueCounts,
     RunStatus,
     SharedText,
     SharedTextKind,
@@ -34,7 +40,9 @@ from ..models import (
     TraceKind,
 )
 from ..pysa_taint_parser import Parser
+from ..shared_text_index import SharedTextIndex
 from .fake_object_generator import FakeObjectGenerator
+from .fake_pysa_output import write_pysa_output
 
 
 class InteractiveTest(TestCase):
@@ -113,6 +121,23 @@ class InteractiveTest(TestCase):
         self.assertIn("Sources filter: {1}", output)
         self.assertIn("Sinks filter: {2}", output)
 
+    def testTiming(self):
+        self.interactive.start_command()
+        self.interactive.runs()
+        self.interactive.finish_command()
+        self.assertNotIn("Time:", self.stdout.getvalue())
+
+        self.interactive.timing()
+        self.assertIn("Timing is on.", self.stdout.getvalue())
+        self.interactive.start_command()
+        self.interactive.runs()
+        self.interactive.run(1)
+        self.interactive.finish_command()
+        self.assertIn("2 database sessions", self.stdout.getvalue())
+
+        self.interactive.timing(False)
+        self.assertFalse(self.interactive.show_timing)
+
     def testListIssuesBasic(self):
         run = self.fakes.run()
         self.fakes.issue()
@@ -135,6 +160,164 @@ class InteractiveTest(TestCase):
         self.assertIn("Callable: module.function1", output)
         self.assertIn("Location: file.py:6|7|8", output)
 
+    def testDiffRuns(self):
+        fixed, persisting = self.fakes.issue(), self.fakes.issue()
+        runs = [self.fakes.run()]
+        self.fakes.instance(callable="fixed", issue_id=fixed.id)
+        self.fakes.instance(callable="persisting", issue_id=persisting.id)
+        runs.append(self.fakes.run())
+        self.fakes.instance(callable="persisting", issue_id=persisting.id)
+        self.fakes.save_all(self.db)
+        with self.db.make_session() as session:
+            self._add_to_session(session, runs)
+            session.commit()
+
+        self.interactive.setup()
+        self._clear_stdout()
+        self.interactive.diff_runs(1, use_pager=False)
+        output = self.stdout.getvalue().strip().split("\n")
+        self.assertEqual(
+            [json.loads(line)["callable"] for line in output[:-1]],
+            ["fixed", "persisting"],
+        )
+        self.assertEqual(
+            output[-1],
+            "0 new, 1 fixed, 1 persisting issues in run 2 compared to run 1.",
+        )
+
+        self._clear_stdout()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "diff.json")
+            self.interactive.diff_runs(2, 1, statuses="new", output=path)
+            with open(path) as f:
+                self.assertEqual([json.loads(line)["status"] for line in f], ["new"])
+        self.assertEqual(
+            self.stdout.getvalue().strip(), "1 new issues in run 1 compared to run 2."
+        )
+
+        self.interactive.diff_runs(1, statuses=["gone"])
+        self.assertIn("'statuses' should be", self.stderr.getvalue())
+        self.interactive.diff_runs(3)
+        self.assertIn("Run 3 doesn't exist.", self.stderr.getvalue())
+
+    def testNearLeaf(self):
+        runs = [self.fakes.run(), self.fakes.run()]
+        source = self.fakes.source("UserControlled")
+        sink = self.fakes.sink("RemoteCodeExecution")
+        self.fakes.saver.add_all(
+            [
+                CallableLeafDistance.Record(
+                    run_id=runs[0].id,
+                    leaf_id=leaf.id,
+                    callable_id=self.fakes.callable(name).id,
+                    distance=distance,
+                )
+                for leaf, name, distance in [
+                    (source, "far", 2),
+                    (source, "near", 0),
+                    (source, "middle", 1),
+                    (sink, "sink", 0),
+                ]
+            ]
+        )
+        self.fakes.save_all(self.db)
+        with self.db.make_session() as session:
+            self._add_to_session(session, runs)
+            session.commit()
+
+        self.interactive.setup()
+        self.interactive.near_leaf("UserControlled")
+        self.assertIn("Run 2 has no leaf distances.", self.stderr.getvalue())
+
+        self.interactive.run(1)
+        self._clear_stdout()
+        self.interactive.near_leaf("UserControlled", 1, use_pager=False)
+        self.assertEqual(
+            self.stdout.getvalue().split("\n"),
+            [
+                "   0  near",
+                "   1  middle",
+                "Found 2 callables within 1 of UserControlled.",
+                "",
+            ],
+        )
+
+        self._clear_stdout()
+        self.interactive.near_leaf("UserControlled", limit=2, use_pager=False)
+        self.assertIn("Use 'page=2' to list more.", self.stdout.getvalue())
+
+    def testListIssuesPaginated(self):
+        run = self.fakes.run()
+        self.fakes.issue()
+        source = self.fakes.source("source1")
+        sink = self.fakes.sink("sink1")
+        for i in range(5):
+            instance = self.fakes.instance()
+            leaf = source if i % 2 else sink
+            self.fakes.saver.add(
+                IssueInstanceSharedTextAssoc.Record(
+                    issue_instance_id=instance.id, shared_text_id=leaf.id
+                )
+            )
+        self.fakes.save_all(self.db)
+
+        with self.db.make_session() as session:
+            session.add(run)
+            session.commit()
+
+        self.interactive.setup()
+        statements = []
+        event.listen(
+            self.db.engine,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+        self.interactive.issues(limit=2, offset=2)
+        output = self.stdout.getvalue().strip()
+
+        # The issues, the sources and sinks of the page and the counts of the run.
+        self.assertEqual(len(statements), 3)
+        self.assertNotIn("OFFSET", statements[1])
+        self.assertNotIn("Issue 2", output)
+        self.assertLess(output.index("Issue 3"), output.index("Sinks: sink1"))
+        self.assertLess(output.index("Sinks: sink1"), output.index("Issue 4"))
+        self.assertLess(output.index("Issue 4"), output.index("Sources: source1"))
+        self.assertNotIn("Issue 5", output)
+        self.assertIn("Use 'page=2' to list more.", output)
+
+        self._clear_stdout()
+        self.interactive.issues(limit=2, page=2, offset=2)
+        output = self.stdout.getvalue().strip()
+        self.assertIn("Issue 5", output)
+        self.assertNotIn("page=", output)
+
+        # The leaves are looked up a batch of issues at a time.
+        self._clear_stdout()
+        statements.clear()
+        with patch.object(self.interactive, "FETCH_SIZE", 2):
+            self.interactive.issues(limit=None)
+        output = self.stdout.getvalue().strip()
+        self.assertEqual(len(statements), 4)
+        self.assertEqual(output.count("Sources: source1"), 2)
+        self.assertEqual(output.count("Sinks: sink1"), 3)
+
+        with self.db.make_session() as session:
+            RunIssueCounts.compute(session, 1)
+            session.commit()
+        self._clear_stdout()
+        self.interactive.issues(limit=2)
+        self.assertIn("The run has 5 matching issues.", self.stdout.getvalue())
+        self._clear_stdout()
+        self.interactive.issues(limit=2, codes=[6015, 6016])
+        self.assertIn("The run has 5 matching issues.", self.stdout.getvalue())
+        # The counts are by code only.
+        self._clear_stdout()
+        self.interactive.issues(limit=2, filenames="%")
+        self.assertNotIn("matching issues", self.stdout.getvalue())
+
+        self.interactive.issues(offset=-1)
+        self.assertIn("non-negative", self.stderr.getvalue())
+
     def testListIssuesFromLatestRun(self):
         self.fakes.issue()
         run1 = self.fakes.run()
@@ -251,6 +434,34 @@ class InteractiveTest(TestCase):
         self.assertNotIn("Issue 2", output)
         self.assertIn("Issue 3", output)
 
+    def testListIssuesFilterWithSharedTextIndex(self):
+        self._list_issues_filter_setup()
+        with self.db.make_session() as session:
+            self.assertTrue(SharedTextIndex.create(session))
+            session.commit()
+
+        self.interactive.setup()
+        self.assertTrue(self.interactive.use_shared_text_index)
+        statements = []
+        event.listen(
+            self.db.engine,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+        self.interactive.issues(callables="%sub%")
+        output = self.stdout.getvalue().strip()
+        self.assertIn("Issue 1", output)
+        self.assertIn("Issue 2", output)
+        self.assertNotIn("Issue 3", output)
+        self.assertIn(SharedTextIndex.TABLE_NAME, statements[0])
+
+        self._clear_stdout()
+        self.interactive.issues(callables=["%function3"], filenames="%__init__.py")
+        output = self.stdout.getvalue().strip()
+        self.assertNotIn("Issue 1", output)
+        self.assertNotIn("Issue 2", output)
+        self.assertIn("Issue 3", output)
+
     def testNoRunsFound(self):
         self.interactive.setup()
         stderr = self.stderr.getvalue().strip()
@@ -473,6 +684,40 @@ class InteractiveTest(TestCase):
             ),
         ]
 
+    def testTraceFrameCaches(self):
+        run = self.fakes.run()
+        frames = self._basic_trace_frames()
+        sink = self.fakes.sink("sink1")
+        self.fakes.saver.add(
+            TraceFrameLeafAssoc.Record(
+                trace_frame_id=frames[1].id, leaf_id=sink.id, trace_length=1
+            )
+        )
+        self.fakes.save_all(self.db)
+        with self.db.make_session() as session:
+            session.add(run)
+            session.commit()
+
+        self.interactive.setup()
+        self.interactive.frame(int(frames[1].id))
+        self.interactive.show()
+        self.interactive.show()
+        self.assertEqual(self.interactive.trace_frame_cache.misses, 1)
+        # frame() shows the frame too.
+        self.assertEqual(self.interactive.trace_frame_cache.hits, 3)
+        self.assertEqual(self.interactive.leaves_cache.misses, 1)
+        self.assertGreater(self.interactive.leaves_cache.hits, 0)
+
+        self._clear_stdout()
+        self.interactive.caches()
+        self.assertIn("Trace frames: 1/1024 entries, 3 hits", self.stdout.getvalue())
+
+        self.interactive.current_run_id = 1
+        self.assertEqual(len(self.interactive.trace_frame_cache), 1)
+        self.interactive.current_run_id = 2
+        self.assertEqual(len(self.interactive.trace_frame_cache), 0)
+        self.assertEqual(len(self.interactive.leaves_cache), 0)
+
     def testNextTraceFrames(self):
         run = self.fakes.run()
         frames = self._basic_trace_frames()
@@ -658,6 +903,66 @@ class InteractiveTest(TestCase):
                 [int(frame.id) for frame in frames],
             )
 
+    def testNavigateTraceFramesInOneQuery(self):
+        run = self.fakes.run()
+        frames = [
+            self.fakes.precondition(
+                caller=f"call{i}",
+                caller_port="param",
+                callee=f"call{i + 1}",
+                callee_port="param",
+            )
+            for i in range(30)
+        ] + [
+            self.fakes.precondition(
+                caller="call30", caller_port="param", callee="leaf", callee_port="sink"
+            )
+        ]
+        other_frame = self.fakes.precondition(
+            caller="call10", caller_port="param", callee="other", callee_port="sink"
+        )
+        sink = self.fakes.sink("sink")
+        other_sink = self.fakes.sink("other_sink")
+        self.fakes.saver.add_all(
+            [
+                TraceFrameLeafAssoc.Record(
+                    trace_frame_id=frame.id, leaf_id=sink.id, trace_length=31 - i
+                )
+                for i, frame in enumerate(frames)
+            ]
+            + [
+                TraceFrameLeafAssoc.Record(
+                    trace_frame_id=other_frame.id, leaf_id=other_sink.id, trace_length=0
+                )
+            ]
+        )
+        self.fakes.save_all(self.db)
+
+        statements = []
+        event.listen(
+            self.db.engine,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+        with self.db.make_session() as session:
+            session.add(run)
+            session.commit()
+
+            self.interactive.setup()
+            self.interactive.sinks = {"sink"}
+            statements.clear()
+            trace = self.interactive._navigate_trace_frames(session, [frames[0]])
+            self.assertEqual(len(statements), 1)
+            self.assertEqual(
+                [int(frame.id) for frame, _branches in trace],
+                [int(frame.id) for frame in frames],
+            )
+            self.assertEqual({branches for _frame, branches in trace}, {1})
+
+            self.interactive.sinks = {"sink", "other_sink"}
+            trace = self.interactive._navigate_trace_frames(session, [frames[0]])
+            self.assertEqual(trace[10][1], 2)
+
     def testCreateTraceTuples(self):
         # reverse order
         postcondition_traces = [
@@ -1637,10 +1942,13 @@ else:
                 placeholder=True,
             )
         ]
-        with patch("builtins.open", mock_open(read_data=mock_data)) as mock_file:
+        with tempfile.TemporaryDirectory() as directory:
+            self.interactive.repository_directory = directory
+            with open(os.path.join(directory, "file.py"), "w") as f:
+                f.write(mock_data)
+
             self._clear_stdout()
             self.interactive.list_source_code(2)
-            mock_file.assert_called_once_with(f"{os.getcwd()}/file.py", "r")
             output = self.stdout.getvalue()
             self.assertEqual(
                 output.split("\n"),
@@ -1655,10 +1963,8 @@ else:
                 ],
             )
 
-            mock_file.reset_mock()
             self._clear_stdout()
             self.interactive.list_source_code(1)
-            mock_file.assert_called_once_with(f"{os.getcwd()}/file.py", "r")
             output = self.stdout.getvalue()
             self.assertEqual(
                 output.split("\n"),
@@ -1671,6 +1977,47 @@ else:
                     "",
                 ],
             )
+            # The line offsets were only found once.
+            self.assertEqual(self.interactive.source_file_cache.hits, 1)
+
+            with open(os.path.join(directory, "file.py"), "w") as f:
+                f.write("# A comment\n" + mock_data)
+            self._clear_stdout()
+            self.interactive.list_source_code(0)
+            self.assertIn(" --> 2  if this_is_true:", self.stdout.getvalue())
+
+            # Lines are only split on "\n", like Python splits source files.
+            with open(os.path.join(directory, "file.py"), "wb") as f:
+                f.write(b"a\n\x0c\nif this_is_true:\n")
+            self._clear_stdout()
+            self.interactive.list_source_code(1)
+            self.assertEqual(
+                self.stdout.getvalue().split("\n"),
+                [
+                    "In callee [file.py:2|10|25]",
+                    "     1  a",
+                    " --> 2  \x0c",
+                    "                  ^^^^^^^^^^^^^^^",
+                    "     3  if this_is_true:",
+                    "",
+                ],
+            )
+
+            with open(os.path.join(directory, "file.py"), "wb") as f:
+                f.write(b"a\r\nb\r\nc\r\n")
+            self._clear_stdout()
+            self.interactive.list_source_code(1)
+            self.assertEqual(
+                self.stdout.getvalue().split("\n"),
+                [
+                    "In callee [file.py:2|10|25]",
+                    "     1  a",
+                    " --> 2  b",
+                    "                  ^^^^^^^^^^^^^^^",
+                    "     3  c",
+                    "",
+                ],
+            )
 
     def testListSourceCodeFileNotFound(self):
         self.interactive.setup()
@@ -1843,12 +2190,29 @@ else:
                 f"{frames[2].id}        call2:param2",
                 f"{frames[1].id}        leaf:source",
                 "...",
-                "Showing 3/6 matching frames. To see more, call 'frames' with "
-                "the 'limit' argument.",
+                "Showing 3 matching frames. To see more, call 'frames' with "
+                "'page=2' or a larger 'limit'.",
                 "",
             ],
         )
 
+        self._clear_stdout()
+        self.interactive.frames(limit=3, page=2)
+        output = self.stdout.getvalue().split("\n")
+        self.assertEqual(
+            [line for line in output if not line[:1].isdigit()],
+            [
+                "[id] [caller:caller_port -> callee:callee_port]",
+                "---- call1:root ->",
+                "---- call2:param2 ->",
+                "",
+            ],
+        )
+        self.assertEqual(
+            {line.split()[0] for line in output if line[:1].isdigit()},
+            {str(frames[i].id) for i in [0, 4, 5]},
+        )
+
     def testSetFrame(self):
         frames = self._basic_trace_frames()
         sink = self.fakes.sink("sink")
@@ -2145,8 +2509,9 @@ else:
             ],
         )
 
-    def mock_pager(self, output_string):
+    def mock_pager(self, lines):
         self.pager_calls += 1
+        self.paged_lines = list(lines)
 
     def testPager(self):
         run = self.fakes.run()
@@ -2160,15 +2525,52 @@ else:
 
         # Default is no pager in tests
         self.pager_calls = 0
-        with patch("IPython.core.page.page", self.mock_pager):
+        with patch.object(self.interactive, "_stream_to_pager", self.mock_pager):
             self.interactive.setup()
             self.interactive.issues(use_pager=False)
             self.interactive.runs(use_pager=False)
         self.assertEqual(self.pager_calls, 0)
 
         self.pager_calls = 0
-        with patch("IPython.core.page.page", self.mock_pager):
+        with patch.object(self.interactive, "_stream_to_pager", self.mock_pager):
             self.interactive.setup()
             self.interactive.issues(use_pager=True)
             self.interactive.runs(use_pager=True)
         self.assertEqual(self.pager_calls, 2)
+        self.assertTrue(self.paged_lines[0].startswith("Run 1\nDate: "))
+
+    def testStreamToPager(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "output")
+            with patch.object(page, "get_pager_cmd", lambda: f"cat > {output}"):
+                self.interactive._stream_to_pager(["a", "b"])
+            with open(output) as f:
+                self.assertEqual(f.read(), "a\nb\n")
+
+            # The pager quitting stops the output.
+            produced = []
+
+            def lines():
+                for i in range(100000):
+                    produced.append(i)
+                    yield "line"
+
+            with patch.object(page, "get_pager_cmd", lambda: "head -n 1 >/dev/null"):
+                self.interactive._stream_to_pager(lines())
+            self.assertLess(len(produced), 100000)
+
+    def testJson(self):
+        self.interactive.json("source_1_0")
+        self.assertIn("analysis_output", self.stderr.getvalue())
+
+        with tempfile.TemporaryDirectory() as directory:
+            spec = write_pysa_output(directory, 3, shards=2)
+            self.interactive.analysis_output(spec)
+            self.interactive.json("source_1_0")
+            output = self.stdout.getvalue()
+            self.assertIn('"callable": "source_1_0"', output)
+            self.assertNotIn('"callable": "source_1_1"', output)
+
+            self.interactive.json("missing")
+            self.assertIn("No entries for 'missing'", self.stderr.getvalue())
+            self.interactive.current_offset_index.close()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+
+from ..db import DB, DBType
+from ..leaf_distances import ComputeLeafDistances, callables_near_leaf
+from ..trace_graph import TraceGraph
+from .fake_object_generator import FakeObjectGenerator
+
+
+class LeafDistancesTest(TestCase):
+    def setUp(self) -> None:
+        self.graph = TraceGraph()
+        self.fakes = FakeObjectGenerator(graph=self.graph)
+        self.run = self.fakes.run()
+        source = self.fakes.source("UserControlled")
+        sink = self.fakes.sink("RemoteCodeExecution")
+
+        # issue calls source_0, which calls source_1, which reaches
+        # UserControlled directly. issue also calls sink_0, which reaches
+        # RemoteCodeExecution directly.
+        for caller, callee, depth in [
+            ("issue", "source_0", 2),
+            ("source_0", "source_1", 1),
+            ("source_1", "source_2", 0),
+        ]:
+            frame = self.fakes.postcondition(
+                caller=caller,
+                caller_port="result",
+                callee=callee,
+                callee_port="result",
+            )
+            self.graph.add_trace_frame_leaf_assoc(frame, source, depth)
+        for caller, callee, depth in [
+            ("issue", "sink_0", 1),
+            ("sink_0", "sink_1", 0),
+        ]:
+            frame = self.fakes.precondition(
+                caller=caller,
+                caller_port="formal(x)",
+                callee=callee,
+                callee_port="formal(x)",
+            )
+            self.graph.add_trace_frame_leaf_assoc(frame, sink, depth)
+        # Calls source_0, but the frame doesn't lead to UserControlled.
+        self.fakes.postcondition(
+            caller="other",
+            caller_port="result",
+            callee="source_0",
+            callee_port="result",
+        )
+        # Leads to UserControlled through source_0, but not as a postcondition.
+        frame = self.fakes.precondition(
+            caller="precondition",
+            caller_port="result",
+            callee="source_0",
+            callee_port="result",
+        )
+        self.graph.add_trace_frame_leaf_assoc(frame, source, 2)
+
+    def _distances(self, step):
+        _, summary = step.run(self.graph, {"run": self.run})
+        return sorted(
+            (
+                self.graph.get_text(distance.leaf_id),
+                distance.distance,
+                self.graph.get_text(distance.callable_id),
+            )
+            for distance in summary["callable_leaf_distances"]
+        )
+
+    def test_distances(self):
+        self.assertEqual(
+            self._distances(ComputeLeafDistances()),
+            [
+                ("RemoteCodeExecution", 0, "sink_0"),
+                ("RemoteCodeExecution", 1, "issue"),
+                ("UserControlled", 0, "source_1"),
+                ("UserControlled", 1, "source_0"),
+                ("UserControlled", 2, "issue"),
+            ],
+        )
+
+    def test_max_distance(self):
+        self.assertEqual(
+            self._distances(ComputeLeafDistances(max_distance=1)),
+            [
+                ("RemoteCodeExecution", 0, "sink_0"),
+                ("RemoteCodeExecution", 1, "issue"),
+                ("UserControlled", 0, "source_1"),
+                ("UserControlled", 1, "source_0"),
+            ],
+        )
+
+    def _near(self, db, leaf, max_distance, run_id=1):
+        with db.make_session() as session:
+            return [
+                (row.callable, row.distance)
+                for row in callables_near_leaf(session, run_id, leaf, max_distance)
+            ]
+
+    def test_callables_near_leaf(self):
+        _, summary = ComputeLeafDistances().run(self.graph, {"run": self.run})
+        db = DB(DBType.MEMORY)
+        self.fakes.saver.add_all(summary["callable_leaf_distances"])
+        self.fakes.save_all(db)
+
+        self.assertEqual(
+            self._near(db, "UserControlled", 10),
+            [("source_1", 0), ("source_0", 1), ("issue", 2)],
+        )
+        self.assertEqual(
+            self._near(db, "UserControlled", 1), [("source_1", 0), ("source_0", 1)]
+        )
+        self.assertEqual(self._near(db, "UserControlled", -1), [])
+        self.assertEqual(self._near(db, "RemoteCodeExecution", 0), [("sink_0", 0)])
+        self.assertEqual(self._near(db, "Unknown", 10), [])
+        self.assertEqual(self._near(db, "UserControlled", 10, run_id=2), [])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from ..analysis_output import AnalysisOutput
+from ..base_parser import BaseParser
+from ..linemap import PATH_PREFIX_SIZE, Linemap
+from ..pysa_taint_parser import Parser
+from .fake_pysa_output import write_pysa_output
+
+
+LINEMAP = {
+    "module/a.py": {"10": [8], "12": [9, 10], "3": [3]},
+    "module/b.py": {"1": [2]},
+    "x" * PATH_PREFIX_SIZE: {"5": [4]},
+}
+
+
+class LinemapTest(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _write(self, name, contents) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as f:
+            f.write(contents)
+        return path
+
+    def _json(self) -> str:
+        return self._write("linemap.json", json.dumps(LINEMAP, indent=2))
+
+    def _jsonlines(self) -> str:
+        return self._write(
+            "linemap.jsonl",
+            "".join(json.dumps([path, lines]) + "\n" for path, lines in LINEMAP.items())
+            + "\n",
+        )
+
+    def test_old_lines(self):
+        for path in [self._json(), self._jsonlines()]:
+            with self.subTest(path=os.path.basename(path)):
+                linemap = Linemap(path)
+                self.assertEqual(list(linemap.old_lines("module/a.py", 10)), [8])
+                self.assertEqual(list(linemap.old_lines("module/a.py", 12)), [9, 10])
+                self.assertEqual(list(linemap.old_lines("module/a.py", 3)), [3])
+                self.assertEqual(list(linemap.old_lines("module/a.py", 11)), [])
+                self.assertEqual(list(linemap.old_lines("module/a.py", 13)), [])
+                self.assertEqual(list(linemap.old_lines("module/c.py", 1)), [])
+                self.assertEqual(
+                    list(linemap.old_lines("x" * PATH_PREFIX_SIZE, 5)), [4]
+                )
+                linemap.close()
+
+    def test_decodes_files_lazily(self):
+        linemap = Linemap(self._jsonlines())
+        self.assertEqual(len(linemap._positions), 3)
+        self.assertEqual(linemap._files, {})
+        linemap.old_lines("module/b.py", 1)
+        self.assertEqual(list(linemap._files), ["module/b.py"])
+        linemap.close()
+
+    def test_empty(self):
+        linemap = Linemap(self._write("linemap.json", ""))
+        self.assertEqual(list(linemap.old_lines("module/a.py", 10)), [])
+
+    def test_moved_issue(self):
+        linemap = Linemap(self._jsonlines())
+        old_handles = {BaseParser.compute_diff_handle("module/a.py", 9, 5001)}
+        issue = {"filename": "module/a.py", "line": 12, "code": 5001}
+        self.assertTrue(
+            BaseParser()._is_existing_issue(linemap, old_handles, issue, "handle")
+        )
+        issue = {"filename": "module/a.py", "line": 10, "code": 5001}
+        self.assertFalse(
+            BaseParser()._is_existing_issue(linemap, old_handles, issue, "handle")
+        )
+        linemap.close()
+
+    def test_parser_closes(self):
+        filename = write_pysa_output(self.directory.name, 3)
+        linemap = self._jsonlines()
+        for streaming in [False, True]:
+            with self.subTest(streaming=streaming), patch.object(
+                Linemap, "close", autospec=True, side_effect=Linemap.close
+            ) as close:
+                entries = Parser().analysis_output_to_dict_entries(
+                    AnalysisOutput.from_file(filename),
+                    None,
+                    None,
+                    linemap,
+                    streaming=streaming,
+                )
+                # Streamed issues are only read once they are consumed.
+                self.assertEqual(close.call_count, 0 if streaming else 1)
+                self.assertEqual(len(list(entries["issues"])), 3)
+                self.assertEqual(close.call_count, 1)
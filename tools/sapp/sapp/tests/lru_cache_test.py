@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+
+from ..lru_cache import LRUCache
+
+
+class LRUCacheTest(TestCase):
+    def test_lookup(self):
+        computed = []
+
+        def compute(key):
+            computed.append(key)
+            return key * 2
+
+        cache = LRUCache(2)
+        self.assertEqual(cache.lookup(1, lambda: compute(1)), 2)
+        self.assertEqual(cache.lookup(2, lambda: compute(2)), 4)
+        self.assertEqual(cache.lookup(1, lambda: compute(1)), 2)
+        # 2 is the least recently used.
+        self.assertEqual(cache.lookup(3, lambda: compute(3)), 6)
+        self.assertEqual(cache.lookup(1, lambda: compute(1)), 2)
+        self.assertEqual(cache.lookup(2, lambda: compute(2)), 4)
+        self.assertEqual(computed, [1, 2, 3, 2])
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(str(cache), "2/2 entries, 2 hits, 4 misses (33% hit rate)")
+
+        cache.clear()
+        self.assertEqual(cache.lookup(1, lambda: compute(1)), 2)
+        self.assertEqual(computed, [1, 2, 3, 2, 1])
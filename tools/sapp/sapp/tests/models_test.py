@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+import datetime
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from sqlalchemy import exc
+
+from ..database_saver import DatabaseSaver
+from ..db import DB, DBType
+from ..model_generator import ModelGenerator
+from ..models import (
+    DBID,
+    Issue,
+    IssueCountKind,
+    PrepareMixin,
+    PrimaryKey,
+    PrimaryKeyGenerator,
+    Run,
+    RunIssueCounts,
+    SharedText,
+    SharedTextKind,
+    TraceFrameLeafAssoc,
+)
+from ..pysa_taint_parser import Parser
+from .fake_object_generator import FakeObjectGenerator
+from .fake_pysa_output import run_pipeline_on, write_pysa_output
+
+
+class MergeByKeysTest(TestCase):
+    def setUp(self) -> None:
+        self.db = DB(DBType.MEMORY)
+        self.fakes = FakeObjectGenerator()
+        self.existing = [
+            self.fakes.feature("via:a"),
+            self.fakes.source("a"),
+            self.fakes.sink("a"),
+        ]
+        self.fakes.issue(handle="existing")
+        self.fakes.save_all(self.db)
+
+    def _merge(self):
+        shared_texts = [
+            SharedText.Record(id=DBID(), contents=contents, kind=kind)
+            for contents, kind in [
+                ("via:a", SharedTextKind.FEATURE),
+                ("a", SharedTextKind.FEATURE),
+                ("a", SharedTextKind.SOURCE),
+                ("b", SharedTextKind.SINK),
+                ("a", SharedTextKind.SOURCE),
+            ]
+        ]
+        issues = [Issue.Record(id=DBID(), handle=h) for h in ["new", "existing"]]
+        with self.db.make_session() as session:
+            new_shared_texts = list(SharedText.merge(session, iter(shared_texts)))
+            new_issues = list(Issue.merge(session, iter(issues)))
+        return shared_texts, new_shared_texts, issues, new_issues
+
+    def _verify(self, shared_texts, new_shared_texts, issues, new_issues):
+        self.assertEqual(new_shared_texts, [shared_texts[1], shared_texts[3]])
+        self.assertEqual(shared_texts[0].id.resolved(), self.existing[0].id.resolved())
+        self.assertEqual(shared_texts[2].id.resolved(), self.existing[1].id.resolved())
+        self.assertEqual(new_issues, [issues[0]])
+        self.assertIsNotNone(issues[1].id.resolved())
+
+    def test_temporary_table(self):
+        self.assertEqual(self.db.engine.dialect.name, "sqlite")
+        with patch.object(
+            PrepareMixin, "_fetch_by_filters", side_effect=AssertionError
+        ):
+            self._verify(*self._merge())
+
+    def test_filters(self):
+        with patch.object(PrepareMixin, "TEMPORARY_TABLE_DIALECTS", set()):
+            self._verify(*self._merge())
+
+
+class PrimaryKeyGeneratorTest(TestCase):
+    def setUp(self) -> None:
+        self.db = DB(DBType.MEMORY)
+        fakes = FakeObjectGenerator()
+        fakes.issue(handle="existing")
+        fakes.save_all(self.db)
+
+    def _current_ids(self):
+        with self.db.make_session() as session:
+            return {row.table_name: row.current_id for row in session.query(PrimaryKey)}
+
+    def test_reserve(self):
+        generator = PrimaryKeyGenerator()
+        with self.db.make_session() as session, patch.object(
+            session, "commit", wraps=session.commit
+        ) as commit:
+            generator.reserve(
+                session,
+                [Issue, SharedText, Run, TraceFrameLeafAssoc],
+                {"Issue": 3, "SharedText": 5},
+            )
+        self.assertEqual(commit.call_count, 1)
+        # Issue ids continue after the existing issue.
+        self.assertEqual(
+            generator.pks, {"Issue": (2, 4), "SharedText": (1, 5), "Run": (1, 1)}
+        )
+        self.assertEqual(self._current_ids(), {"Issue": 4, "SharedText": 5, "Run": 1})
+        self.assertEqual([generator.get(Issue) for _ in range(3)], [2, 3, 4])
+        with self.assertRaises(AssertionError):
+            generator.get(Issue)
+
+    def test_block_size(self):
+        generator = PrimaryKeyGenerator(block_size=100)
+        with self.db.make_session() as session:
+            generator.reserve(session, [Issue], {"Issue": 10})
+            self.assertEqual(
+                [generator.get(Issue) for _ in range(10)], list(range(2, 12))
+            )
+            # Served from the block without touching the database.
+            with patch.object(generator, "_reserve_id_ranges") as reserve:
+                generator.reserve(session, [Issue], {"Issue": 90})
+            reserve.assert_not_called()
+            self.assertEqual(generator.get(Issue), 12)
+
+            # Another job reserves after the block.
+            other = PrimaryKeyGenerator().reserve(session, [Issue], {"Issue": 5})
+            self.assertEqual(other.pks["Issue"], (102, 106))
+
+            generator.reserve(session, [Issue], {"Issue": 200})
+        self.assertEqual(generator.pks["Issue"], (107, 306))
+        self.assertEqual(self._current_ids()["Issue"], 306)
+
+    def test_use_lock(self):
+        with self.db.make_session() as session:
+            first = PrimaryKeyGenerator().reserve(session, [Issue], {"Issue": 5})
+            # Neither generator has written its issues yet.
+            second = PrimaryKeyGenerator().reserve(
+                session, [Issue], {"Issue": 5}, use_lock=True
+            )
+        self.assertEqual(first.pks["Issue"], (2, 6))
+        self.assertEqual(second.pks["Issue"], (7, 11))
+
+        # Issues saved without reserving their ids are skipped.
+        with self.db.make_session() as session:
+            session.add(
+                Issue(
+                    id=20,
+                    handle="unreserved",
+                    code=1,
+                    first_seen=datetime.datetime.now(),
+                )
+            )
+            session.commit()
+            third = PrimaryKeyGenerator().reserve(
+                session, [Issue], {"Issue": 1}, use_lock=True
+            )
+        self.assertEqual(third.pks["Issue"], (21, 21))
+
+    def test_retries(self):
+        generator = PrimaryKeyGenerator()
+        locked = exc.OperationalError("SELECT", {}, Exception("locked"))
+        reserve_once = generator._reserve_id_ranges_once
+        attempts = []
+
+        def fail_once(*args):
+            attempts.append(args)
+            if len(attempts) == 1:
+                raise locked
+            return reserve_once(*args)
+
+        with self.db.make_session() as session:
+            with patch.object(generator, "_reserve_id_ranges_once", fail_once):
+                generator.reserve(session, [Issue, Run])
+            self.assertEqual(len(attempts), 2)
+            self.assertEqual(generator.pks, {"Issue": (2, 2), "Run": (1, 1)})
+
+            generator = PrimaryKeyGenerator()
+            with patch.object(
+                generator, "_reserve_id_ranges_once", side_effect=locked
+            ) as failing:
+                with self.assertRaises(exc.OperationalError):
+                    generator.reserve(session, [Issue])
+            self.assertEqual(failing.call_count, PrimaryKeyGenerator.RESERVE_ATTEMPTS)
+        self.assertEqual(self._current_ids(), {"Issue": 2, "Run": 1})
+
+    def test_database_saver_reserves_once(self):
+        generator = PrimaryKeyGenerator()
+        with tempfile.TemporaryDirectory() as directory, patch.object(
+            generator, "_reserve_id_ranges", wraps=generator._reserve_id_ranges
+        ) as reserve:
+            filename = write_pysa_output(directory, 5, trace_length=2)
+            run_pipeline_on(
+                [
+                    Parser(),
+                    ModelGenerator(),
+                    DatabaseSaver(self.db, primary_key_generator=generator),
+                ],
+                filename,
+            )
+        self.assertEqual(reserve.call_count, 1)
+        self.assertEqual(
+            set(self._current_ids()),
+            {"Issue", "IssueInstance", "Run", "SharedText", "TraceFrame"},
+        )
+
+
+class RunIssueCountsTest(TestCase):
+    def test_counted_when_saved(self):
+        db = DB(DBType.MEMORY)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = write_pysa_output(directory, 20, shards=2, trace_length=2)
+            _, summary = run_pipeline_on(
+                [Parser(), ModelGenerator(), DatabaseSaver(db)], filename
+            )
+        with db.make_session() as session:
+            run = session.query(Run).one()
+            expected = (
+                run._get_num_new_issue_instances(session),
+                run._get_num_total_issues(session),
+                run._get_alarm_counts(session),
+            )
+            self.assertEqual(expected[1], 20)
+            for kind in IssueCountKind:
+                counts = RunIssueCounts.get(session, run.id, kind)
+                self.assertEqual(
+                    sum(total for total, _ in counts.values()), expected[1]
+                )
+                self.assertEqual(sum(new for _, new in counts.values()), expected[0])
+
+            run_summary = run.get_summary()
+            actual = (
+                run_summary.num_new_issues,
+                run_summary.num_total_issues,
+                run_summary.alarm_counts,
+            )
+            self.assertEqual(actual, expected)
+
+            # Runs saved before the counts existed are summarized by scanning.
+            session.query(RunIssueCounts).delete()
+            run_summary = run.get_summary()
+            actual = (
+                run_summary.num_new_issues,
+                run_summary.num_total_issues,
+                run_summary.alarm_counts,
+            )
+            self.assertEqual(actual, expected)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+from unittest import TestCase
+
+from ..analysis_output import AnalysisOutput
+from ..offset_index import OffsetIndex, index_path
+from ..pysa_taint_parser import Parser
+from .fake_pysa_output import write_pysa_output
+
+
+class OffsetIndexTest(TestCase):
+    def test_lookup(self):
+        with tempfile.TemporaryDirectory() as directory:
+            spec = write_pysa_output(directory, 10, shards=3, unused_models=2)
+            input = AnalysisOutput.from_file(spec)
+            index = OffsetIndex.get_or_build(Parser(), input)
+            try:
+                self.assertEqual(
+                    index_path(input),
+                    os.path.join(directory, "taint-output.json.callable-index"),
+                )
+                self.assertEqual(
+                    index.num_records,
+                    len(list(Parser().get_json_file_offsets(input))),
+                )
+
+                positions = index.lookup("unused_1")
+                self.assertEqual(len(positions), 1)
+                # Entry 10 * 7 + 1 of the output, in shard 71 % 3.
+                self.assertEqual(positions[0].shard, 2)
+                self.assertEqual(
+                    index.get_json(positions[0])["data"]["callable"], "unused_1"
+                )
+
+                [position] = index.lookup("sink_4_2")
+                entry = index.get_json(position)
+                self.assertEqual(entry["kind"], "model")
+                self.assertEqual(entry["data"]["callable"], "sink_4_2")
+
+                [position] = index.lookup("module_7.issue_7")
+                self.assertEqual(index.get_json(position)["kind"], "issue")
+
+                self.assertEqual(index.lookup("does_not_exist"), [])
+            finally:
+                index.close()
+
+    def test_rebuilds_stale_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            spec = write_pysa_output(directory, 2)
+            index = OffsetIndex.get_or_build(Parser(), AnalysisOutput.from_file(spec))
+            self.assertEqual(index.lookup("source_3_0"), [])
+            index.close()
+
+            write_pysa_output(directory, 4)
+            index = OffsetIndex.get_or_build(Parser(), AnalysisOutput.from_file(spec))
+            try:
+                [position] = index.lookup("source_3_0")
+                self.assertEqual(
+                    index.get_json(position)["data"]["callable"], "source_3_0"
+                )
+            finally:
+                index.close()
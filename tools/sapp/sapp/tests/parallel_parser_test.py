@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+import tempfile
+from unittest import TestCase
+
+from ..analysis_output import AnalysisOutput
+from ..base_parser import IssueFilter, ParseType
+from ..parallel_parser import ParallelParser
+from ..pysa_taint_parser import Parser
+from .fake_pysa_output import write_pysa_output
+
+
+def _sort_key(entry):
+    return repr(sorted(entry.items(), key=lambda item: item[0]))
+
+
+class ParallelParserTest(TestCase):
+    def _parse_both(self, filename):
+        expected = list(Parser().parse(AnalysisOutput.from_file(filename)))
+
+        parser = ParallelParser(Parser, processes=3)
+        parser.MIN_RANGE_SIZE = 100
+        actual = list(parser.parse(AnalysisOutput.from_file(filename)))
+        return sorted(expected, key=_sort_key), sorted(actual, key=_sort_key)
+
+    def test_splits_single_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = write_pysa_output(directory, 20, unused_models=5)
+            parser = ParallelParser(Parser, processes=3)
+            parser.MIN_RANGE_SIZE = 100
+            self.assertGreater(len(parser._byte_ranges([filename])), 1)
+
+            expected, actual = self._parse_both(filename)
+        self.assertEqual(len(actual), 20 + 20 * 3 * 2 + 5 * 2)
+        self.assertEqual(expected, actual)
+
+    def test_sharded_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = write_pysa_output(directory, 10, shards=3)
+            expected, actual = self._parse_both(filename)
+        self.assertEqual(expected, actual)
+
+    def test_issue_filter(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = write_pysa_output(directory, 20, num_codes=4)
+            parser = ParallelParser(
+                Parser, processes=3, issue_filter=IssueFilter.from_codes([5001])
+            )
+            parser.MIN_RANGE_SIZE = 100
+            parser.parse_types = {ParseType.ISSUE}
+            issues = list(parser.parse(AnalysisOutput.from_file(filename)))
+        self.assertEqual(len(issues), 5)
+        self.assertEqual({issue["code"] for issue in issues}, {5001})
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import tempfile
+from unittest import TestCase
+
+from .. import profiler
+from ..database_saver import DatabaseSaver, save_run_profile
+from ..db import DB, DBType
+from ..model_generator import ModelGenerator
+from ..models import Run
+from ..pipeline import Pipeline, PipelineStep
+from ..profiler import Profiler
+from ..pysa_taint_parser import Parser
+from .fake_pysa_output import run_pipeline_on, write_pysa_output
+
+
+class Phases(PipelineStep[int, int]):
+    def run(self, input, summary):
+        for i in range(input):
+            with profiler.phase("phase"):
+                profiler.count("items", i)
+        profiler.count("inputs")
+        return input + 1, summary
+
+
+class ProfilerTest(TestCase):
+    def test_summary(self):
+        pipeline_profiler = Profiler()
+        output, _ = Pipeline([Phases(), Phases()], pipeline_profiler).run(2)
+        self.assertEqual(output, 4)
+        steps = pipeline_profiler.summary()["steps"]
+        self.assertEqual([step["name"] for step in steps], ["Phases", "Phases"])
+        self.assertEqual(steps[0]["counts"], {"inputs": 1})
+        self.assertEqual(steps[0]["phases"]["phase"]["calls"], 2)
+        self.assertEqual(steps[0]["phases"]["phase"]["counts"], {"items": 1})
+        self.assertEqual(steps[1]["phases"]["phase"]["calls"], 3)
+        self.assertEqual(steps[1]["phases"]["phase"]["counts"], {"items": 3})
+        for step in steps:
+            self.assertGreaterEqual(step["wall"], step["phases"]["phase"]["wall"])
+            self.assertGreaterEqual(step["peak_rss_delta"], 0)
+
+    def test_chrome_trace(self):
+        pipeline_profiler = Profiler()
+        Pipeline([Phases()], pipeline_profiler).run(1)
+        step, phase = pipeline_profiler.chrome_trace()["traceEvents"]
+        self.assertEqual((step["name"], step["cat"]), ("Phases", "step"))
+        self.assertEqual((phase["name"], phase["cat"]), ("phase", "phase"))
+        for event in [step, phase]:
+            self.assertEqual(event["ph"], "X")
+            self.assertEqual(
+                set(event["args"]), {"wall", "cpu", "gc", "peak_rss_delta", "counts"}
+            )
+        self.assertLessEqual(step["ts"], phase["ts"])
+        self.assertLessEqual(phase["ts"] + phase["dur"], step["ts"] + step["dur"])
+
+    def test_inactive(self):
+        output, _ = Pipeline([Phases()]).run(1)
+        self.assertEqual(output, 2)
+        self.assertIsNone(profiler._active)
+
+    def test_saved_with_run(self):
+        database = DB(DBType.MEMORY)
+        pipeline_profiler = Profiler()
+        with tempfile.TemporaryDirectory() as directory:
+            filename = write_pysa_output(directory, 5, trace_length=2)
+            run_summary, _ = run_pipeline_on(
+                [Parser(), ModelGenerator(), DatabaseSaver(database)],
+                filename,
+                pipeline_profiler,
+            )
+        save_run_profile(database, run_summary.id, pipeline_profiler)
+
+        with database.make_session() as session:
+            run = session.query(Run).filter_by(id=run_summary.id).one()
+            steps = run.profile.get_profile()["steps"]
+        self.assertEqual(
+            [step["name"] for step in steps],
+            ["Parser", "ModelGenerator", "DatabaseSaver"],
+        )
+        self.assertEqual(steps[0]["counts"]["issues"], 5)
+        phases = steps[2]["phases"]
+        self.assertEqual(phases["insert Issue"]["counts"], {"rows": 5})
+        self.assertEqual(phases["merge_by_keys SharedText"]["counts"]["existing"], 0)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from ..analysis_output import AnalysisOutput
+from ..base_parser import IssueFilter, ParseType
+from ..condition_store import count_entries
+from ..model_generator import ModelGenerator
+from ..pysa_taint_parser import Parser
+from .compact_trace_graph_test import _frames, _instances
+from .fake_pysa_output import run_pipeline_on, write_pysa_output
+
+
+def _position():
+    return {"filename": "module.py", "line": 1, "start": 0, "end": 1}
+
+
+def _call(callee):
+    return {
+        "call": {
+            "position": _position(),
+            "port": "formal(x)",
+            "resolves_to": [callee],
+            "length": 1,
+        },
+        "leaves": [{"kind": "RCE"}],
+    }
+
+
+def _model(callable, callee=None):
+    taint = _call(callee) if callee else {"root": _position(), "leaves": []}
+    return {
+        "callable": callable,
+        "sources": [],
+        "sinks": [{"port": "formal(x)", "taint": [taint]}],
+    }
+
+
+def _issue(callable, code, callee):
+    return {
+        "callable": callable,
+        "callable_line": 1,
+        "code": code,
+        "line": 2,
+        "start": 0,
+        "end": 1,
+        "filename": "module.py",
+        "message": "",
+        "traces": [
+            {"name": "forward", "roots": []},
+            {"name": "backward", "roots": [_call(callee)]},
+        ],
+    }
+
+
+def _write_output(directory, entries):
+    filename = os.path.join(directory, "taint-output.json")
+    with open(filename, "w") as f:
+        f.write(json.dumps({"file_version": 2, "config": {}}) + "\n")
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+    return AnalysisOutput.from_file(filename)
+
+
+class ParserTest(TestCase):
+    def _generate(self, filename, **options):
+        return run_pipeline_on([Parser(), ModelGenerator()], filename, **options)
+
+    def test_reachable_models_only(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = write_pysa_output(
+                directory,
+                20,
+                shards=2,
+                trace_length=3,
+                unused_models=5,
+                shared_traces=6,
+            )
+            expected, expected_summary = self._generate(filename)
+            for streaming in [False, True]:
+                with self.subTest(streaming=streaming):
+                    actual, actual_summary = self._generate(
+                        filename, reachable_models_only=True, streaming=streaming
+                    )
+                    self.assertEqual(_frames(expected), _frames(actual))
+                    self.assertEqual(_instances(expected), _instances(actual))
+                    for key in ["missing_preconditions", "missing_postconditions"]:
+                        self.assertEqual(expected_summary[key], actual_summary[key])
+                    # Only the unused models are left over, and weren't parsed.
+                    for key in ["precondition_entries", "postcondition_entries"]:
+                        self.assertEqual(count_entries(actual_summary[key]), 0)
+                        self.assertEqual(count_entries(expected_summary[key]), 5)
+
+    def test_unused_models_stored(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = write_pysa_output(directory, 5, unused_models=5)
+            _, summary = self._generate(
+                filename, reachable_models_only=True, store_unused_models=True
+            )
+        self.assertEqual(count_entries(summary["precondition_entries"]), 5)
+
+    def test_scan(self):
+        entries = [
+            {"kind": "model", "data": _model('b"c', callee="d")},
+            # Not matching the expected prefix, so decoded while scanning.
+            {"data": _model("d"), "kind": "model"},
+            {"kind": "model", "data": _model("unused")},
+            {"kind": "issue", "data": _issue("a", 5001, 'b"c')},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            input = _write_output(directory, entries)
+
+            parser = Parser()
+            with open(input.filename_spec, "rb") as handle:
+                scanned = list(parser._scan(handle))
+            self.assertEqual(
+                [(kind, position.callable) for kind, position, _ in scanned],
+                [("model", 'b"c'), ("model", "d"), ("model", "unused"), ("issue", "a")],
+            )
+            self.assertEqual(
+                [entry is None for _, _, entry in scanned], [True, False, True, False]
+            )
+
+            parser.reachable_only = True
+            self.assertEqual(
+                [(e["type"], e.get("caller")) for e in parser.parse(input)],
+                [
+                    (ParseType.ISSUE, None),
+                    (ParseType.PRECONDITION, 'b"c'),
+                    (ParseType.PRECONDITION, "d"),
+                ],
+            )
+            parser.parse_types = {ParseType.ISSUE}
+            self.assertEqual(len(list(parser.parse(input))), 1)
+
+    def test_issue_filter(self):
+        issue = _issue("c", 5002, "unused")
+        entries = [
+            {"kind": "model", "data": _model("b")},
+            {"kind": "model", "data": _model("unused")},
+            {"kind": "issue", "data": _issue("a", 5001, "b")},
+            {"kind": "issue", "data": _issue("b", 5002, "unused")},
+            # Not matching the expected prefix, so filtered after decoding.
+            {"data": issue, "kind": "issue"},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            input = _write_output(directory, entries)
+            for reachable_only in [False, True]:
+                with self.subTest(reachable_only=reachable_only):
+                    parser = Parser(issue_filter=IssueFilter.from_codes([5001]))
+                    parser.reachable_only = reachable_only
+                    entries = list(parser.parse(input))
+                    self.assertEqual(
+                        [
+                            e["callable"]
+                            for e in entries
+                            if e["type"] == ParseType.ISSUE
+                        ],
+                        ["a"],
+                    )
+                    # The traces of filtered issues are not followed.
+                    self.assertEqual(
+                        {e["caller"] for e in entries if e["type"] != ParseType.ISSUE},
+                        {"b"} if reachable_only else {"b", "unused"},
+                    )
+
+            parser = Parser(
+                issue_filter=IssueFilter(
+                    callable=lambda callable: callable != "a",
+                    filename=lambda filename: filename == "module.py",
+                )
+            )
+            parser.parse_types = {ParseType.ISSUE}
+            self.assertEqual([e["callable"] for e in parser.parse(input)], ["b", "c"])
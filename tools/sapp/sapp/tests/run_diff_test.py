@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+import json
+from unittest import TestCase
+
+from ..db import DB, DBType
+from ..run_diff import IssueStatus, diff_issues
+from .fake_object_generator import FakeObjectGenerator
+
+
+class RunDiffTest(TestCase):
+    def setUp(self) -> None:
+        self.db = DB(DBType.MEMORY)
+        fakes = FakeObjectGenerator()
+        fixed, persisting, new = fakes.issue(), fakes.issue(), fakes.issue()
+        runs = [fakes.run()]
+        fakes.instance(callable="fixed", issue_id=fixed.id)
+        fakes.instance(callable="persisting", issue_id=persisting.id)
+        runs.append(fakes.run())
+        fakes.instance(callable="persisting", issue_id=persisting.id)
+        fakes.instance(callable="new", issue_id=new.id, filename="new.py")
+        fakes.save_all(self.db)
+        with self.db.make_session() as session:
+            session.add_all(runs)
+            session.commit()
+
+    def _diff(self, base_run_id, run_id, statuses=None):
+        with self.db.make_session() as session:
+            return [
+                (status, json.loads(issue))
+                for status, issue in diff_issues(session, base_run_id, run_id, statuses)
+            ]
+
+    def test_diff(self):
+        issues = self._diff(1, 2)
+        self.assertEqual(
+            [(status, issue["callable"], issue["run_id"]) for status, issue in issues],
+            [
+                (IssueStatus.new, "new", 2),
+                (IssueStatus.fixed, "fixed", 1),
+                (IssueStatus.persisting, "persisting", 2),
+            ],
+        )
+        _, new = issues[0]
+        self.assertEqual(
+            new,
+            {
+                "status": "new",
+                "handle": "3",
+                "code": 6018,
+                "run_id": 2,
+                "instance_id": new["instance_id"],
+                "filename": "new.py",
+                "callable": "new",
+                "line": 6,
+                "start": 7,
+                "end": 8,
+                "message": "this is bad",
+            },
+        )
+
+        # Fixed issues are new ones the other way around.
+        self.assertEqual(
+            [(status, issue["callable"]) for status, issue in self._diff(2, 1)],
+            [
+                (IssueStatus.new, "fixed"),
+                (IssueStatus.fixed, "new"),
+                (IssueStatus.persisting, "persisting"),
+            ],
+        )
+        self.assertEqual(
+            [
+                issue["callable"]
+                for _, issue in self._diff(1, 2, [IssueStatus.persisting])
+            ],
+            ["persisting"],
+        )
+        self.assertEqual(
+            {(status, issue["callable"]) for status, issue in self._diff(2, 2)},
+            {(IssueStatus.persisting, "persisting"), (IssueStatus.persisting, "new")},
+        )
+
+    def test_missing_run(self):
+        with self.db.make_session() as session:
+            with self.assertRaisesRegex(ValueError, "Run 3 doesn't exist"):
+                diff_issues(session, 1, 3)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import tempfile
+from unittest import TestCase
+
+from ..database_saver import DatabaseSaver
+from ..db import DB, DBType
+from ..model_generator import ModelGenerator
+from ..models import SharedText, SharedTextKind
+from ..pysa_taint_parser import Parser
+from ..shared_text_index import SharedTextIndex
+from .fake_pysa_output import run_pipeline_on, write_pysa_output
+
+
+class SharedTextIndexTest(TestCase):
+    def setUp(self) -> None:
+        self.db = DB(DBType.MEMORY)
+
+    def _matches(self, session, pattern):
+        return {
+            text.contents
+            for text in session.query(SharedText).filter(
+                SharedTextIndex.like(SharedText.id, pattern)
+            )
+        }
+
+    def _like(self, session, pattern):
+        return {
+            text.contents
+            for text in session.query(SharedText)
+            .filter(SharedText.kind.in_(SharedTextIndex.KINDS))
+            .filter(SharedText.contents.like(pattern))
+        }
+
+    def _save(self, num_issues, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = write_pysa_output(directory, num_issues, trace_length=2)
+            run_pipeline_on(
+                [Parser(), ModelGenerator(), DatabaseSaver(self.db, **options)],
+                filename,
+            )
+
+    def test_like(self):
+        with self.db.make_session() as session:
+            for id, (kind, contents) in enumerate(
+                [
+                    (SharedTextKind.CALLABLE, "module.prefix"),
+                    (SharedTextKind.CALLABLE, "module.Prefix_suffix"),
+                    (SharedTextKind.FILENAME, "module/suffix.py"),
+                    (SharedTextKind.FEATURE, "prefix feature"),
+                ],
+                start=1,
+            ):
+                session.add(SharedText(id=id, kind=kind, contents=contents))
+            session.commit()
+
+            self.assertFalse(SharedTextIndex.exists(session))
+            self.assertTrue(SharedTextIndex.create(session))
+            self.assertTrue(SharedTextIndex.exists(session))
+            SharedTextIndex.add(session, [(5, "other.prefix")])
+            session.add(
+                SharedText(id=5, kind=SharedTextKind.CALLABLE, contents="other.prefix")
+            )
+            session.commit()
+
+            for pattern in ["%prefix%", "%PREFIX", "module.%", "%fix_s%", "%.py"]:
+                with self.subTest(pattern=pattern):
+                    self.assertTrue(SharedTextIndex.can_match(pattern))
+                    self.assertEqual(
+                        self._matches(session, pattern), self._like(session, pattern)
+                    )
+            self.assertEqual(
+                self._matches(session, "%prefix%"),
+                {"module.prefix", "module.Prefix_suffix", "other.prefix"},
+            )
+
+        for pattern in ["%", "%ab%", "a_b_c", "%a%b%"]:
+            self.assertFalse(SharedTextIndex.can_match(pattern))
+
+    def test_maintained_by_database_saver(self):
+        self._save(5)
+        with self.db.make_session() as session:
+            self.assertFalse(SharedTextIndex.exists(session))
+
+        # The texts of the earlier runs are indexed when the index is created,
+        # and those of later runs as they are saved.
+        self._save(5, index_shared_texts=True)
+        self._save(20)
+        with self.db.make_session() as session:
+            self.assertTrue(SharedTextIndex.exists(session))
+            for pattern in ["%issue_1%", "module_0%", "%issue_4", "%.py"]:
+                with self.subTest(pattern=pattern):
+                    matches = self._matches(session, pattern)
+                    self.assertTrue(matches)
+                    self.assertEqual(matches, self._like(session, pattern))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+from unittest import TestCase
+
+from ..compact_trace_graph import CompactTraceGraph
+from ..models import SharedTextKind
+from ..trace_graph import TraceGraph
+from ..trimmed_trace_graph import TrimmedTraceGraph
+from .fake_object_generator import FakeObjectGenerator
+
+
+class TrimmedTraceGraphTest(TestCase):
+    def _build(self, graph: TraceGraph) -> TraceGraph:
+        fakes = FakeObjectGenerator(graph=graph)
+        sink = fakes.sink("sink")
+
+        # Issue in an affected file, its trace leaves it.
+        issue = fakes.issue()
+        instance = fakes.instance(filename="lib/a.py", callable="a", issue_id=issue.id)
+        frame = fakes.precondition(
+            caller="a", caller_port="root", callee="b", filename="lib/a.py"
+        )
+        next_frame = fakes.precondition(
+            caller="b", caller_port="at the beginning of time", filename="other/b.py"
+        )
+        graph.add_issue_instance_trace_frame_assoc(instance, frame)
+        graph.add_issue_instance_shared_text_assoc(instance, sink)
+        graph.add_trace_frame_leaf_assoc(frame, sink, 1)
+        graph.add_trace_frame_leaf_assoc(next_frame, sink, 0)
+
+        # Issue in an unaffected file, its trace reaches an affected file.
+        issue = fakes.issue()
+        instance = fakes.instance(
+            filename="other/c.py", callable="c", issue_id=issue.id
+        )
+        frame = fakes.precondition(
+            caller="c", caller_port="root", callee="d", filename="other/c.py"
+        )
+        next_frame = fakes.precondition(
+            caller="d", caller_port="at the beginning of time", filename="lib/d.py"
+        )
+        graph.add_issue_instance_trace_frame_assoc(instance, frame)
+        graph.add_issue_instance_shared_text_assoc(instance, sink)
+        graph.add_trace_frame_leaf_assoc(frame, sink, 1)
+        graph.add_trace_frame_leaf_assoc(next_frame, sink, 0)
+
+        # Issue that doesn't touch the affected files at all.
+        issue = fakes.issue()
+        instance = fakes.instance(
+            filename="other/e.py", callable="e", issue_id=issue.id
+        )
+        frame = fakes.precondition(
+            caller="e", caller_port="root", callee="f", filename="other/e.py"
+        )
+        graph.add_issue_instance_trace_frame_assoc(instance, frame)
+        graph.add_issue_instance_shared_text_assoc(instance, sink)
+        graph.add_trace_frame_leaf_assoc(frame, sink, 0)
+        return graph
+
+    def testFilenameIndex(self):
+        for graph in [TraceGraph(), CompactTraceGraph()]:
+            with self.subTest(graph=type(graph).__name__):
+                self._build(graph)
+                filenames = {
+                    filename.contents: filename.id.local_id
+                    for filename in graph.get_shared_texts_of_kind(
+                        SharedTextKind.FILENAME
+                    )
+                }
+                self.assertEqual(
+                    set(filenames),
+                    {"lib/a.py", "other/b.py", "other/c.py", "lib/d.py", "other/e.py"},
+                )
+                self.assertEqual(
+                    [
+                        graph.get_text(graph._issue_instances[id].callable_id)
+                        for id in graph.get_issue_instance_ids_in_file(
+                            filenames["other/c.py"]
+                        )
+                    ],
+                    ["c"],
+                )
+                self.assertEqual(
+                    list(graph.get_issue_instance_ids_in_file(filenames["lib/d.py"])),
+                    [],
+                )
+                self.assertEqual(
+                    [
+                        graph.get_text(graph.get_trace_frame_from_id(id).caller_id)
+                        for id in graph.get_trace_frame_ids_in_file(
+                            filenames["lib/d.py"]
+                        )
+                    ],
+                    ["d"],
+                )
+
+    def testPopulateFromAffectedFiles(self):
+        for graph in [TraceGraph(), CompactTraceGraph()]:
+            with self.subTest(graph=type(graph).__name__):
+                self._build(graph)
+                trimmed_graph = TrimmedTraceGraph(["lib/"])
+                trimmed_graph.populate_from_trace_graph(graph)
+
+                self.assertEqual(
+                    {
+                        trimmed_graph.get_text(instance.callable_id)
+                        for instance in trimmed_graph.get_issue_instances()
+                    },
+                    {"a", "c"},
+                )
+                self.assertEqual(
+                    {
+                        trimmed_graph.get_text(frame.caller_id)
+                        for frame in trimmed_graph._trace_frames.values()
+                    },
+                    {"a", "b", "c", "d"},
+                )
+
+    def testPopulateFromAffectedIssuesOnly(self):
+        graph = self._build(TraceGraph())
+        trimmed_graph = TrimmedTraceGraph(["lib/"], affected_issues_only=True)
+        trimmed_graph.populate_from_trace_graph(graph)
+
+        self.assertEqual(
+            [
+                trimmed_graph.get_text(instance.callable_id)
+                for instance in trimmed_graph.get_issue_instances()
+            ],
+            ["a"],
+        )
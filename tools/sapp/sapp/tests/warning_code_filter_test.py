@@ -14,3 +14,14 @@ class TestWarningCodeFilter(TestCase):
 
         self.assertEqual(len(output["issues"]), 1)
         self.assertEqual(output["issues"][0], {"code": 6000})
+
+    def test_filter_codes_streaming(self):
+        dict_entries = {
+            "issues": (issue for issue in [{"code": 6000}, {"code": 6001}])
+        }
+        output, _ = Pipeline([self.warning_code_filter]).run(
+            dict_entries, {"streaming": True}
+        )
+
+        self.assertNotIsInstance(output["issues"], list)
+        self.assertEqual(list(output["issues"]), [{"code": 6000}])
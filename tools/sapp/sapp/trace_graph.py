@@ -75,6 +75,12 @@ class TraceGraph(object):
 
         self._issue_instance_fix_info: Dict[int, IssueInstanceFixInfo] = {}
 
+        # Maps the id of a filename to the issue instances and trace frames in
+        # that file, so that the graph can be trimmed to a few files without
+        # scanning all of it.
+        self._file_issue_instances: DefaultDict[int, Set[int]] = defaultdict(set)
+        self._file_trace_frames: DefaultDict[int, Set[int]] = defaultdict(set)
+
         # !!!!! IMPORTANT !!!!!
         # IF YOU ARE ADDING MORE FIELDS/EDGES TO THIS GRAPH, CHECK IF
         # TrimmedTraceGraph NEEDS TO BE UPDATED AS WELL.
@@ -96,6 +102,9 @@ class TraceGraph(object):
             instance.id.local_id not in self._issue_instances
         ), "Instance already exists"
         self._issue_instances[instance.id.local_id] = instance
+        self._file_issue_instances[instance.filename_id.local_id].add(
+            instance.id.local_id
+        )
 
     def get_issue_instances(self) -> Iterable[IssueInstance]:
         return (instance for instance in self._issue_instances.values())
@@ -123,23 +132,31 @@ class TraceGraph(object):
                 return self._shared_texts[contents[content]]
         return None
 
+    def get_shared_texts_of_kind(self, kind: SharedTextKind) -> List[SharedText]:
+        ids = self._shared_text_lookup.get(kind, {}).values()
+        return [self._shared_texts[id] for id in ids]
+
+    def get_issue_instance_ids_in_file(self, filename_id: int) -> Iterable[int]:
+        return self._file_issue_instances.get(filename_id, ())
+
+    def get_trace_frame_ids_in_file(self, filename_id: int) -> Iterable[int]:
+        return self._file_trace_frames.get(filename_id, ())
+
     def has_postconditions_with_caller(self, caller_id: DBID, caller_port: str) -> bool:
         key = (caller_id.local_id, caller_port)
-        post_ids = {
-            tf_id
-            for tf_id in self._trace_frames_map[key]
-            if self._trace_frames[tf_id].kind == TraceKind.POSTCONDITION
-        }
-        return len(post_ids) != 0
+        kind = TraceKind.POSTCONDITION
+        return any(
+            self._trace_frames[tf_id].kind == kind
+            for tf_id in self._trace_frames_map.get(key, ())
+        )
 
     def has_preconditions_with_caller(self, caller_id: DBID, caller_port: str) -> bool:
         key = (caller_id.local_id, caller_port)
-        pre_ids = {
-            tf_id
-            for tf_id in self._trace_frames_map[key]
-            if self._trace_frames[tf_id].kind == TraceKind.PRECONDITION
-        }
-        return len(pre_ids) != 0
+        kind = TraceKind.PRECONDITION
+        return any(
+            self._trace_frames[tf_id].kind == kind
+            for tf_id in self._trace_frames_map.get(key, ())
+        )
 
     def add_trace_annotation(self, annotation: TraceFrameAnnotation) -> None:
         self._trace_annotations[annotation.id.local_id] = annotation
@@ -157,6 +174,9 @@ class TraceGraph(object):
         self._trace_frames_map[key].add(trace_frame.id.local_id)
         self._trace_frames_rev_map[rev_key].add(trace_frame.id.local_id)
         self._trace_frames[trace_frame.id.local_id] = trace_frame
+        self._file_trace_frames[trace_frame.filename_id.local_id].add(
+            trace_frame.id.local_id
+        )
 
     def has_trace_frame_with_caller(self, caller_id: DBID, caller_port: str) -> bool:
         key = (caller_id.local_id, caller_port)
@@ -174,9 +194,21 @@ class TraceGraph(object):
         else:
             return []
 
+    def get_trace_frames_from_callee(
+        self, callee_id: DBID, callee_port: str
+    ) -> List[TraceFrame]:
+        key = (callee_id.local_id, callee_port)
+        return [
+            self._trace_frames[trace_frame_id]
+            for trace_frame_id in self._trace_frames_rev_map.get(key, ())
+        ]
+
     def get_trace_frame_from_id(self, id: int) -> TraceFrame:
         return self._trace_frames[id]
 
+    def get_trace_frames(self) -> Iterable[TraceFrame]:
+        return self._trace_frames.values()
+
     def add_shared_text(self, shared_text: SharedText) -> None:
         assert (
             shared_text.id.local_id not in self._shared_texts
@@ -222,6 +254,12 @@ class TraceGraph(object):
             instance.id.local_id
         )
 
+    def get_issue_instance_trace_frame_ids(self, instance_id: int) -> Iterable[int]:
+        return self._issue_instance_trace_frame_assoc.get(instance_id, ())
+
+    def get_trace_frame_issue_instance_ids(self, trace_frame_id: int) -> Iterable[int]:
+        return self._trace_frame_issue_instance_assoc.get(trace_frame_id, ())
+
     def get_issue_instance_trace_frames(
         self, instance: IssueInstance
     ) -> List[TraceFrame]:
@@ -252,6 +290,9 @@ class TraceGraph(object):
             instance.id.local_id
         )
 
+    def get_issue_instance_shared_text_ids(self, instance_id: int) -> Iterable[int]:
+        return self._issue_instance_shared_text_assoc.get(instance_id, ())
+
     def get_issue_instance_shared_texts(
         self, instance_id: int, kind: SharedTextKind
     ) -> List[SharedText]:
@@ -148,18 +148,28 @@ class TrimmedTraceGraph(TraceGraph):
             return min_depth
         return 0
 
+    def _get_affected_filename_ids(self, graph: TraceGraph) -> List[int]:
+        """Ids of the filenames in graph that are in affected_files. The
+        issues and trace frames of these files are found through the filename
+        index of the graph, so that trimming only visits the affected part of
+        it.
+        """
+        return [
+            filename.id.local_id
+            for filename in graph.get_shared_texts_of_kind(SharedTextKind.FILENAME)
+            if self._is_filename_prefixed_with(filename.contents, self._affected_files)
+        ]
+
     def _populate_affected_issues(self, graph: TraceGraph) -> None:
         """Populates the trimmed graph with issues whose locations are in
         affected_files based on data in the input graph. Since these issues
         exist in the affected files, all traces are copied as well.
         """
-        affected_instance_ids = [
-            instance.id.local_id
-            for instance in graph._issue_instances.values()
-            if self._is_filename_prefixed_with(
-                graph.get_text(instance.filename_id), self._affected_files
-            )
-        ]
+        affected_instance_ids = sorted(
+            instance_id
+            for filename_id in self._get_affected_filename_ids(graph)
+            for instance_id in graph.get_issue_instance_ids_in_file(filename_id)
+        )
 
         for instance_id in affected_instance_ids:
             if instance_id in self._issue_instances:
@@ -196,10 +206,11 @@ class TrimmedTraceGraph(TraceGraph):
         """
 
         initial_trace_frames = [
-            trace_frame
-            for trace_frame in graph._trace_frames.values()
-            if self._is_filename_prefixed_with(
-                graph.get_text(trace_frame.filename_id), self._affected_files
+            graph.get_trace_frame_from_id(trace_frame_id)
+            for trace_frame_id in sorted(
+                trace_frame_id
+                for filename_id in self._get_affected_filename_ids(graph)
+                for trace_frame_id in graph.get_trace_frame_ids_in_file(filename_id)
             )
         ]
 
@@ -207,21 +218,24 @@ class TrimmedTraceGraph(TraceGraph):
             initial_trace_frames,
             graph,
             lambda trace_frame_id: (
-                graph._trace_frame_issue_instance_assoc[trace_frame_id]
+                graph.get_trace_frame_issue_instance_ids(trace_frame_id)
             ),
             lambda trace_frame: (
                 [
-                    graph._trace_frames[trace_frame_id]
-                    for trace_frame_id in graph._trace_frames_rev_map[
-                        (trace_frame.caller_id.local_id, trace_frame.caller_port)
-                    ]
-                    if graph._trace_frames[trace_frame_id].kind == trace_frame.kind
+                    parent
+                    for parent in graph.get_trace_frames_from_callee(
+                        trace_frame.caller_id, trace_frame.caller_port
+                    )
+                    if parent.kind == trace_frame.kind
                 ]
             ),
             lambda instance_id: (self._get_leaf_names(graph, instance_id)),
             lambda trace_frame_id: (
                 self._get_leaf_names_from_pairs(
-                    graph, graph._trace_frame_leaf_assoc[trace_frame_id]
+                    graph,
+                    graph.get_trace_frame_leaf_ids_with_depths(
+                        graph.get_trace_frame_from_id(trace_frame_id)
+                    ),
                 )
             ),
             lambda instance, trace_frame: (
@@ -340,7 +354,7 @@ class TrimmedTraceGraph(TraceGraph):
     def _populate_issue_trace(
         self, graph: TraceGraph, instance_id: int, kind: Optional[TraceKind] = None
     ) -> None:
-        trace_frame_ids = list(graph._issue_instance_trace_frame_assoc[instance_id])
+        trace_frame_ids = list(graph.get_issue_instance_trace_frame_ids(instance_id))
         instance = graph._issue_instances[instance_id]
         filtered_ids = []
         for trace_frame_id in trace_frame_ids:
@@ -369,7 +383,7 @@ class TrimmedTraceGraph(TraceGraph):
             issue_fix_info = graph._issue_instance_fix_info[instance_id]
             self.add_issue_instance_fix_info(instance, issue_fix_info)
 
-        for shared_text_id in graph._issue_instance_shared_text_assoc[instance_id]:
+        for shared_text_id in graph.get_issue_instance_shared_text_ids(instance_id):
             shared_text = graph._shared_texts[shared_text_id]
             if shared_text_id not in self._shared_texts:
                 self.add_shared_text(shared_text)
@@ -402,12 +416,13 @@ class TrimmedTraceGraph(TraceGraph):
         Also copies all the trace_frame-leaf assocs since we don't
         know which ones are needed until we know the issue that reaches it
         """
-        trace_frame_id = trace_frame.id.local_id
         self.add_trace_frame(trace_frame)
         self._populate_shared_text(graph, trace_frame.filename_id)
         self._populate_shared_text(graph, trace_frame.caller_id)
         self._populate_shared_text(graph, trace_frame.callee_id)
-        for (leaf_id, depth) in graph._trace_frame_leaf_assoc[trace_frame_id]:
+        for (leaf_id, depth) in graph.get_trace_frame_leaf_ids_with_depths(
+            trace_frame
+        ):
             leaf = graph._shared_texts[leaf_id]
             if leaf_id not in self._shared_texts:
                 self.add_shared_text(leaf)
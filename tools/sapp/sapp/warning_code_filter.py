@@ -9,6 +9,9 @@ from .pipeline import DictEntries, PipelineStep, Summary
 
 
 class WarningCodeFilter(PipelineStep[DictEntries, DictEntries]):
+    """Drops the parsed issues whose code isn't kept. Parsers given an
+    IssueFilter skip them before building them instead, which is cheaper."""
+
     def __init__(self, codes_to_keep: Set[int]):
         self.codes_to_keep: Set[int] = codes_to_keep
 
@@ -16,11 +19,11 @@ class WarningCodeFilter(PipelineStep[DictEntries, DictEntries]):
         return issue["code"] not in self.codes_to_keep
 
     def run(self, input: DictEntries, summary: Summary) -> Tuple[DictEntries, Summary]:
-        filtered_issues = []
-        for issue in input["issues"]:
-            if self._should_skip_issue(issue):
-                continue
-            filtered_issues.append(issue)
+        filtered_issues = (
+            issue for issue in input["issues"] if not self._should_skip_issue(issue)
+        )
+        if not summary.get("streaming"):
+            filtered_issues = list(filtered_issues)
 
         input["issues"] = filtered_issues
 